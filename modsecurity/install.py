@@ -18,7 +18,7 @@ from pathlib import Path
 # 导入模块
 try:
     from modules.constants import setup_logger, WORK_DIR, NGINX_VERSION
-    from modules.system_detector import detect_os, system_info_summary
+    from modules.system_detector import detect_os, os_info, tool_info
     from modules.repo_manager_ext import check_and_fix_repo_config
     from modules.dependency_installer import install_system_dependencies, init_repo_cache
     from modules.modsecurity_builder import download_and_build_modsecurity
@@ -79,7 +79,7 @@ def parse_arguments():
     parser.add_argument('--no-install-deps', action='store_true', help='跳过依赖安装')
     parser.add_argument('--no-restart', '-n', action='store_true', help='安装后不重启Nginx')
     parser.add_argument('--verbose', '-v', action='store_true', help='输出详细日志')
-    parser.add_argument('--force', '-f', action='store_true', help='强制安装，跳过所有确认')
+    parser.add_argument('--force', '-f', action='store_true', help='强制安装，跳过所有确认并忽略之前记录的安装状态')
     parser.add_argument('--fix-repo', '-r', action='store_true', help='自动修复软件源问题（针对CentOS EOL版本）')
     parser.add_argument('--use-gitee', action='store_true', default=True, help='使用Gitee镜像克隆代码（推荐中国环境使用）')
     parser.add_argument('--no-gitee', action='store_true', help='不使用Gitee镜像，直接从GitHub下载')
@@ -117,7 +117,7 @@ def main():
     
     # 检测系统信息
     logger.info("正在检测系统信息...")
-    sys_info = system_info_summary()
+    sys_info = os_info()
     logger.info(f"系统类型: {sys_info['os_type']}")
     logger.info(f"系统版本: {sys_info['os_version']}")
     logger.info(f"宝塔面板: {'是' if sys_info['is_bt_panel'] else '否'}")
@@ -127,6 +127,9 @@ def main():
         logger.error("不支持的系统类型，只支持CentOS/RHEL和Debian/Ubuntu")
         return 1
     
+    # 系统受支持时才检测Nginx和GCC
+    sys_info.update(tool_info())
+    
     # 检查Nginx
     if not sys_info['nginx_installed']:
         logger.error("未检测到Nginx安装，无法继续")
@@ -184,6 +187,11 @@ def main():
     os.makedirs(work_dir, exist_ok=True)
     logger.info(f"使用工作目录: {work_dir}")
     
+    # 强制安装时不使用之前运行记录的安装状态
+    if args.force:
+        from modules.state_manager import reset_state
+        reset_state()
+    
     # 安装系统依赖
     if not args.no_install_deps:
         logger.info("安装系统依赖...")
@@ -220,7 +228,8 @@ def main():
     logger.info("安装ModSecurity-Nginx连接器...")
     modsec_dir = os.path.join(work_dir, "ModSecurity")
     connector_dir = modules_result["connector_dir"]
-    if not install_nginx_modsecurity(work_dir, modsec_dir, args.verbose):
+    if not install_nginx_modsecurity(work_dir, modsec_dir, args.verbose, nginx_src_tar=modules_result["nginx_src_tar"],
+                                     use_cache=use_cache, cache_dir=cache_dir):
         logger.error("ModSecurity-Nginx连接器安装失败，无法继续")
         return 1
     
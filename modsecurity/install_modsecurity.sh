@@ -31,7 +31,7 @@ FILES=(
     "modules/__init__.py"
     "modules/constants.py"
     "modules/system_detector.py"
-    "modules/repo_manager.py"
+    "modules/_repo_common.py"
     "modules/repo_manager_ext.py"
     "modules/dependency_installer.py"
     "modules/downloader.py"
@@ -42,6 +42,7 @@ FILES=(
     "modules/nginx_integrator.py"
     "modules/config_manager.py"
     "modules/cache_manager.py"
+    "modules/state_manager.py"
 )
 
 # 下载源选项
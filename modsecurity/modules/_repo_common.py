@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+软件源管理公共函数
+供repo_manager_ext使用，本模块不导入repo_manager_ext，避免循环导入
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import logging
+
+logger = logging.getLogger('modsecurity_installer')
+
+_ENABLED_RE = re.compile(r'enabled\s*=\s*1')
+
+# yum镜像源错误，一次扫描同时匹配所有模式
+_YUM_ERR_RE = re.compile(rb'Could not retrieve mirrorlist|Cannot find a valid baseurl')
+
+def test_yum_repo():
+    """测试YUM软件源是否可用
+    
+    Returns:
+        bool: 如果YUM源正常返回True，否则返回False
+    """
+    logger.info("测试YUM软件源配置...")
+    try:
+        # 本地缓存的元数据可能来自已失效的旧镜像，或来自仓库ID相同的旧配置，
+        # 先使缓存过期，保证下面的检查一定会联网访问当前配置的镜像
+        subprocess.run(['yum', 'clean', 'expire-cache'], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, timeout=30)
+        
+        # 联网检查，check-update只下载主元数据，比makecache下载的数据少得多；
+        # 退出码0表示没有可更新的包，100表示有可更新的包，都说明软件源配置可用
+        process = subprocess.run(['yum', '-q', 'check-update'], stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT, timeout=60)
+        
+        # 检查常见错误模式，输出只用于查找固定字符串，不做解码
+        if _YUM_ERR_RE.search(process.stdout):
+            logger.warning("检测到YUM镜像源错误")
+            return False
+        
+        return process.returncode in (0, 100)
+    except subprocess.TimeoutExpired:
+        logger.warning("YUM源测试超时，网络可能存在问题")
+        return False
+    except Exception as e:
+        logger.warning(f"测试YUM源时发生错误: {e}")
+        return False
+
+def disable_fastmirror():
+    """禁用fastmirror插件以提高稳定性
+    
+    Returns:
+        bool: 是否成功禁用
+    """
+    fastmirror_conf = "/etc/yum/pluginconf.d/fastestmirror.conf"
+    if not os.path.exists(fastmirror_conf):
+        return True
+        
+    logger.info("检测到fastmirror插件，尝试禁用...")
+    try:
+        # 备份原配置
+        backup_file = f"{fastmirror_conf}.bak"
+        if not os.path.exists(backup_file):
+            shutil.copy2(fastmirror_conf, backup_file)
+        
+        # 读取并修改配置
+        with open(fastmirror_conf, 'r') as f:
+            content = f.read()
+        
+        # 替换enabled=1为enabled=0
+        content = _ENABLED_RE.sub('enabled=0', content)
+        
+        # 写回配置
+        with open(fastmirror_conf, 'w') as f:
+            f.write(content)
+            
+        logger.info("已成功禁用fastmirror插件")
+        return True
+    except Exception as e:
+        logger.warning(f"禁用fastmirror插件失败: {e}")
+        return False
+
+def scan_repo_dir(repo_dir="/etc/yum.repos.d"):
+    """读取软件源配置目录的条目，供一次修复流程中的各步骤共用
+    
+    Args:
+        repo_dir (str): 软件源配置目录
+        
+    Returns:
+        list: os.DirEntry列表
+    """
+    with os.scandir(repo_dir) as it:
+        return list(it)
+
+def backup_repo_files(entries=None):
+    """备份所有YUM仓库配置文件
+    
+    Args:
+        entries (list, optional): scan_repo_dir()的结果，为None时重新读取目录
+    
+    Returns:
+        bool: 是否成功备份
+    """
+    backup_dir = "/etc/yum.repos.d/original_backup"
+    os.makedirs(backup_dir, exist_ok=True)
+    
+    logger.info(f"备份原始YUM仓库配置到 {backup_dir}")
+    
+    try:
+        # 先一次性读出已备份的文件名，之后判断是否已备份只需查集合
+        with os.scandir(backup_dir) as it:
+            backed_up = {entry.name for entry in it}
+        if entries is None:
+            entries = scan_repo_dir()
+        for entry in entries:
+            # 只在目标文件不存在时复制
+            if (entry.name.endswith(".repo") and entry.name not in backed_up
+                    and entry.is_file(follow_symlinks=False)):
+                shutil.copy2(entry.path, os.path.join(backup_dir, entry.name))
+        return True
+    except Exception as e:
+        logger.error(f"备份YUM仓库配置失败: {e}")
+        return False
+
+def disable_all_repo_files(entries=None):
+    """禁用所有默认的YUM仓库配置文件
+    
+    Args:
+        entries (list, optional): scan_repo_dir()的结果，为None时重新读取目录
+    
+    Returns:
+        bool: 是否成功禁用所有仓库
+    """
+    try:
+        if entries is None:
+            entries = scan_repo_dir()
+        names = {entry.name for entry in entries}
+        pending = [entry for entry in entries
+                   if entry.name.endswith(".repo") and not entry.name.startswith(("aliyun", "tsinghua"))
+                   and f"{entry.name}.disabled" not in names]
+        if not pending:
+            # 之前的运行已经禁用过所有仓库
+            logger.info("没有需要禁用的YUM仓库配置")
+            return True
+        
+        logger.info("临时禁用所有默认YUM仓库配置")
+        for entry in pending:
+            if entry.is_file(follow_symlinks=False):
+                # 源和目标在同一目录，直接改名以禁用仓库
+                os.rename(entry.path, f"{entry.path}.disabled")
+        return True
+    except Exception as e:
+        logger.error(f"禁用YUM仓库配置失败: {e}")
+        return False
@@ -6,20 +6,25 @@
 """
 
 import os
+import hashlib
 import subprocess
 import logging
 import shutil
 import sys
+import tarfile
+import zipfile
 from pathlib import Path
 
 logger = logging.getLogger('modsecurity_installer')
 
-def extract_archive(archive_file, extract_dir):
+def extract_archive(archive_file, extract_dir, set_attrs=True):
     """解压归档文件
     
     Args:
         archive_file (str): 归档文件路径
         extract_dir (str): 解压目录
+        set_attrs (bool): 是否还原tar条目的权限和修改时间；为False时只解压普通文件和目录，
+            省去每个条目的chmod/utime，适合不依赖文件属性的源码包
         
     Returns:
         bool: 是否成功解压
@@ -36,40 +41,167 @@ def extract_archive(archive_file, extract_dir):
         
         logger.info(f"解压 {archive_file} 到 {extract_dir}")
         
-        # 获取归档文件类型
-        file_ext = os.path.splitext(archive_file)[1].lower()
-        
-        # 根据文件类型选择解压命令
-        if archive_file.endswith('.tar.gz') or archive_file.endswith('.tgz'):
-            cmd = f"tar -xzf {archive_file} -C {extract_dir}"
-        elif archive_file.endswith('.tar.bz2') or archive_file.endswith('.tbz2'):
-            cmd = f"tar -xjf {archive_file} -C {extract_dir}"
-        elif archive_file.endswith('.tar'):
-            cmd = f"tar -xf {archive_file} -C {extract_dir}"
+        # 根据文件类型选择解压方式，在进程内解压，不再调用tar/unzip
+        tar_modes = (('.tar.gz', 'r:gz'), ('.tgz', 'r:gz'), ('.tar.bz2', 'r:bz2'), ('.tbz2', 'r:bz2'), ('.tar', 'r:'))
+        tar_mode = next((mode for suffix, mode in tar_modes if archive_file.endswith(suffix)), None)
+        if tar_mode:
+            with tarfile.open(archive_file, tar_mode) as tar:
+                members = tar.getmembers()
+                if not set_attrs:
+                    # 跳过符号链接、设备文件等条目，不还原权限和修改时间
+                    members = _safe_tar_members([m for m in members if m.isfile() or m.isdir()])
+                    extract_options = {'filter': 'data'} if hasattr(tarfile, 'data_filter') else {}
+                    for member in members:
+                        tar.extract(member, extract_dir, set_attrs=False, **extract_options)
+                # 拒绝解压到目录外的路径，支持解压过滤器的Python版本上直接使用data过滤器
+                elif hasattr(tarfile, 'data_filter'):
+                    tar.extractall(extract_dir, filter='data')
+                else:
+                    tar.extractall(extract_dir, members=_safe_tar_members(members))
+            count = len(members)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"解压的条目: {', '.join(m.name for m in members)}")
         elif archive_file.endswith('.zip'):
-            cmd = f"unzip -q {archive_file} -d {extract_dir}"
+            with zipfile.ZipFile(archive_file) as archive:
+                count = _extract_zip(archive, extract_dir)
         else:
             logger.error(f"不支持的归档格式: {archive_file}")
             return False
         
-        # 执行解压命令
-        process = subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        # 检查解压结果
-        if process.returncode == 0:
-            logger.info(f"成功解压 {archive_file}")
-            return True
-        else:
-            logger.error(f"解压失败: {process.stderr.decode() if process.stderr else 'Unknown error'}")
-            return False
-    except subprocess.CalledProcessError as e:
+        logger.info(f"成功解压 {archive_file}，共 {count} 个条目")
+        return True
+    except (tarfile.TarError, zipfile.BadZipFile, OSError) as e:
         logger.error(f"解压文件时发生错误: {e}")
-        logger.debug(f"错误输出: {e.stderr.decode() if e.stderr else 'None'}")
         return False
     except Exception as e:
         logger.error(f"解压文件时发生未知错误: {e}")
         return False
 
+def extract_tar_stream(fileobj, extract_dir, compression='gz'):
+    """从不可回退的文件对象(如HTTP响应)中边读取边解压tar归档
+    
+    Args:
+        fileobj: 提供read()的文件对象
+        extract_dir (str): 解压目录
+        compression (str): 压缩格式，'gz'、'bz2'或''
+        
+    Returns:
+        int: 解压的条目数
+        
+    Raises:
+        tarfile.TarError: 归档损坏或包含不安全的路径
+    """
+    os.makedirs(extract_dir, exist_ok=True)
+    count = 0
+    with tarfile.open(fileobj=fileobj, mode=f"r|{compression}") as tar:
+        # 流式模式下只能顺序访问，逐个检查并解压条目
+        for member in tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extract(member, extract_dir, filter='data')
+            else:
+                tar.extract(_safe_tar_members([member])[0], extract_dir)
+            count += 1
+    return count
+
+def _safe_tar_members(members):
+    """检查tar归档条目，用于不支持解压过滤器的旧版本Python
+    
+    Args:
+        members (list): tarfile.TarInfo列表
+        
+    Returns:
+        list: 原样返回的条目列表
+        
+    Raises:
+        tarfile.TarError: 存在绝对路径、包含..的路径或指向目录外的链接
+    """
+    for member in members:
+        paths = [member.name]
+        if member.issym() or member.islnk():
+            # 符号链接目标相对于链接所在目录
+            paths.append(member.linkname if member.islnk() else
+                         os.path.join(os.path.dirname(member.name), member.linkname))
+        for path in paths:
+            normalized = os.path.normpath(path)
+            if os.path.isabs(path) or normalized == '..' or normalized.startswith('..' + os.sep):
+                raise tarfile.TarError(f"归档条目路径不安全: {member.name}")
+    return members
+
+def _extract_zip(archive, extract_dir):
+    """解压zip归档并恢复文件权限(zipfile默认不保留可执行权限)
+    
+    Args:
+        archive (zipfile.ZipFile): 已打开的zip归档
+        extract_dir (str): 解压目录
+        
+    Returns:
+        int: 解压的条目数
+    """
+    infos = archive.infolist()
+    for info in infos:
+        path = archive.extract(info, extract_dir)
+        mode = (info.external_attr >> 16) & 0o777
+        if mode:
+            os.chmod(path, mode)
+    return len(infos)
+
+
+# 解压完成标记文件，内容为归档文件的SHA-256
+EXTRACTED_SENTINEL = '.extracted_ok'
+
+def archive_sha256(archive_file):
+    """计算归档文件的SHA-256
+    
+    Args:
+        archive_file (str): 归档文件路径
+        
+    Returns:
+        str: 十六进制摘要
+    """
+    sha256 = hashlib.sha256()
+    with open(archive_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def extract_archive_once(archive_file, extract_dir, extracted_dir):
+    """解压归档文件，解压结果已存在且来自同一归档时跳过
+    
+    解压成功后在解压出的目录中写入标记文件记录归档的SHA-256，
+    之后只有标记缺失或归档内容变化时才重新解压
+    
+    Args:
+        archive_file (str): 归档文件路径
+        extract_dir (str): 解压目录
+        extracted_dir (str): 归档解压后生成的顶层目录
+        
+    Returns:
+        bool: 解压结果是否可用
+    """
+    try:
+        sentinel = os.path.join(extracted_dir, EXTRACTED_SENTINEL)
+        digest = archive_sha256(archive_file)
+        try:
+            with open(sentinel, 'r') as f:
+                if f.read().strip() == digest:
+                    logger.info(f"{extracted_dir} 已由相同归档解压，跳过解压")
+                    return True
+        except OSError:
+            pass
+        
+        # 清除不完整或来自旧归档的解压结果
+        if os.path.exists(extracted_dir):
+            shutil.rmtree(extracted_dir)
+        if not extract_archive(archive_file, extract_dir) or not os.path.isdir(extracted_dir):
+            return False
+        
+        with open(sentinel, 'w') as f:
+            f.write(digest)
+        return True
+    except Exception as e:
+        logger.error(f"解压文件时发生未知错误: {e}")
+        return False
+
 
 def create_archive(source_dir, archive_file, archive_type='tar.gz'):
     """创建归档文件
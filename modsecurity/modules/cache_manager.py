@@ -9,9 +9,87 @@ import os
 import shutil
 import logging
 import urllib.parse
+from functools import lru_cache
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 logger = logging.getLogger('modsecurity_installer')
 
+# FICLONE ioctl，在支持reflink的文件系统(XFS/Btrfs)上以写时复制方式复制文件
+_FICLONE = 0x40049409
+_CHUNK_SIZE = 1 << 20
+# 已确认不可用的复制方式，元素为(方式, (源设备号, 目标设备号))
+_unsupported_copy = set()
+
+def fast_copy(src, dst):
+    """复制文件，尽量避免经过用户态的数据拷贝
+    
+    依次尝试reflink(FICLONE，写时复制)、os.copy_file_range、os.sendfile(内核态拷贝)，
+    都不可用时退回普通的分块复制
+    
+    Args:
+        src (str): 源文件
+        dst (str): 目标文件
+    
+    Returns:
+        str: 目标文件路径
+    """
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        src_stat = os.fstat(fsrc.fileno())
+        size = src_stat.st_size
+        # 同一对设备上失败过的方式不再尝试，避免复制大量小文件时每个文件都多出失败的系统调用
+        devices = (src_stat.st_dev, os.fstat(fdst.fileno()).st_dev)
+        copied = size == 0
+        if not copied and fcntl is not None and ('reflink', devices) not in _unsupported_copy:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+                copied = True
+            except OSError:
+                _unsupported_copy.add(('reflink', devices))
+        
+        for name in ('copy_file_range', 'sendfile'):
+            kernel_copy = getattr(os, name, None)
+            if copied or kernel_copy is None or (name, devices) in _unsupported_copy:
+                continue
+            offset = 0
+            try:
+                while offset < size:
+                    if name == 'sendfile':
+                        sent = kernel_copy(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                    else:
+                        sent = kernel_copy(fsrc.fileno(), fdst.fileno(), size - offset, offset, offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                copied = offset == size
+            except OSError:
+                _unsupported_copy.add((name, devices))
+        
+        if not copied:
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, length=_CHUNK_SIZE)
+    shutil.copystat(src, dst)
+    return dst
+
+def reflink_copytree(src, dst):
+    """复制目录树，文件通过fast_copy复制，保留符号链接
+    
+    在支持reflink的文件系统上，复制大型Git仓库几乎不产生数据拷贝，也不占用额外磁盘空间
+    
+    Args:
+        src (str): 源目录
+        dst (str): 目标目录，不能已存在
+    
+    Returns:
+        str: 目标目录路径
+    """
+    return shutil.copytree(src, dst, symlinks=True, copy_function=fast_copy)
+
 def setup_cache_dir(cache_dir):
     """
     设置缓存目录结构
@@ -61,6 +139,7 @@ def clear_cache(cache_dir):
         logger.info(f"缓存目录不存在: {cache_dir}")
         setup_cache_dir(cache_dir)
 
+@lru_cache(maxsize=None)
 def get_git_cache_path(cache_dir, repo_url, branch=None):
     """
     获取Git仓库的缓存路径
@@ -16,7 +16,7 @@ from pathlib import Path
 
 # 导入相关模块
 try:
-    from modules.constants import CLAMAV_CONFIG, MODSEC_DEFAULT_CONFIG
+    from modules.constants import CLAMAV_CONFIG_BYTES, MODSEC_DEFAULT_CONFIG_BYTES
     from modules.system_detector import detect_bt_panel
 except ImportError as e:
     logging.error(f"导入模块时出错: {e}")
@@ -76,8 +76,8 @@ Include {rules_dir}/*.conf
         
         # 创建ModSecurity配置文件
         modsec_conf_path = os.path.join(config_dir, "modsecurity.conf")
-        with open(modsec_conf_path, 'w') as f:
-            f.write(MODSEC_DEFAULT_CONFIG)
+        with open(modsec_conf_path, 'wb') as f:
+            f.write(MODSEC_DEFAULT_CONFIG_BYTES)
         
         logger.info(f"已创建ModSecurity配置文件: {modsec_conf_path}")
         
@@ -258,8 +258,8 @@ SecRule REQUEST_COOKIES|REQUEST_COOKIES_NAMES|REQUEST_HEADERS|REQUEST_HEADERS_NA
         
         # 病毒扫描整合规则
         av_rules_path = os.path.join(rules_dir, "06_clamav.conf")
-        with open(av_rules_path, 'w') as f:
-            f.write(CLAMAV_CONFIG)
+        with open(av_rules_path, 'wb') as f:
+            f.write(CLAMAV_CONFIG_BYTES)
         
         logger.info(f"已创建ClamAV整合规则: {av_rules_path}")
         
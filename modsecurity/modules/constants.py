@@ -6,6 +6,7 @@
 """
 
 import os
+import re
 import sys
 import logging
 
@@ -23,6 +24,8 @@ DEFAULT_LOG_FILE = "modsecurity_install.log"
 DEFAULT_CACHE_DIR = os.path.expanduser("~/.modsecurity_cache")
 CACHE_GIT_DIR = os.path.join(DEFAULT_CACHE_DIR, "git")  # Git仓库缓存目录
 CACHE_FILE_DIR = os.path.join(DEFAULT_CACHE_DIR, "files")  # 文件缓存目录
+INSTALLER_STATE_FILE = os.path.join(DEFAULT_CACHE_DIR, "installer_state.json")  # 安装状态记录
+YUM_CACHE_DIR = "/var/cache/modsec-installer/yum"  # 安装脚本专用的YUM元数据缓存目录
 
 # 宝塔面板路径
 BT_NGINX_PATH = "/www/server/nginx"
@@ -177,6 +180,26 @@ SecRule FILES_TMPNAMES "@inspectFile /usr/bin/clamdscan" \
     "id:1010,phase:2,t:none,block,msg:'已检测到恶意软件/病毒',tag:'VIRUS',severity:'2'"
 """
 
+# 预先编码的配置内容，写文件时无需每次重新编码，并保证以UTF-8写入
+MODSEC_DEFAULT_CONFIG_BYTES = MODSEC_DEFAULT_CONFIG.encode('utf-8')
+CLAMAV_CONFIG_BYTES = CLAMAV_CONFIG.encode('utf-8')
+
+# EPEL仓库配置改写规则(改用阿里云镜像并禁用metalink)
+_EPEL_BASEURL_RE = re.compile(r'^#baseurl=http://download\.fedoraproject\.org/pub/epel', re.M)
+_EPEL_METALINK_RE = re.compile(r'^metalink', re.M)
+
+def rewrite_epel_repo(text):
+    """将EPEL仓库配置改写为使用阿里云镜像
+    
+    Args:
+        text (str): epel*.repo文件内容
+        
+    Returns:
+        str: 改写后的内容
+    """
+    text = _EPEL_BASEURL_RE.sub('baseurl=https://mirrors.aliyun.com/epel', text)
+    return _EPEL_METALINK_RE.sub('#metalink', text)
+
 # 初始化日志记录器
 def setup_logger(log_file=None, verbose=False):
     """
@@ -206,8 +229,8 @@ def setup_logger(log_file=None, verbose=False):
     if log_file:
         # 确保日志目录存在
         log_dir = os.path.dirname(log_file)
-        if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
         
         file_handler = logging.FileHandler(log_file)
         file_handler.setLevel(level)
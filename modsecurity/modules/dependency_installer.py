@@ -6,96 +6,258 @@
 """
 
 import os
+import re
 import sys
+import fcntl
+import glob
+import hashlib
 import subprocess
 import logging
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 # 导入相关模块
 try:
-    from modules.constants import DEPENDENCIES
-    from modules.system_detector import detect_os
-    from modules.repo_manager_ext import test_yum_repo, fix_centos_yum_mirrors
+    from modules.constants import DEPENDENCIES, DEFAULT_BUILD_DIR, YUM_CACHE_DIR, rewrite_epel_repo
+    from modules.downloader import download_file
+    from modules.state_manager import load_state, update_state
 except ImportError as e:
     logging.error(f"导入模块时出错: {e}")
     sys.exit(1)
 
 logger = logging.getLogger('modsecurity_installer')
 
-def install_epel_repo(version="7"):
+def _detect_os():
+    """检测操作系统类型和版本
+    
+    system_detector在首次调用时才导入，减少导入本模块的开销；
+    detect_os本身会缓存检测结果
+    
+    Returns:
+        tuple: (系统类型, 版本号)
+    """
+    from modules.system_detector import detect_os
+    return detect_os()
+
+# 所有YUM调用使用专用的元数据缓存目录，清理和重建缓存不影响系统全局的YUM缓存
+YUM_CMD = ['yum', f'--setopt=cachedir={YUM_CACHE_DIR}']
+
+# 各系统包管理器命令表，按系统类型一次选定，调用处无需再区分系统分支
+PACKAGE_MANAGERS = {
+    'rhel': {
+        'name': 'YUM',
+        'install': YUM_CMD + ['install', '-y', '--skip-broken'],
+        'refresh': [YUM_CMD + ['clean', 'all'], YUM_CMD + ['makecache']],
+    },
+    'debian': {
+        'name': 'APT',
+        'install': ['apt-get', 'install', '-y'],
+        'refresh': [['apt-get', 'update']],
+    },
+}
+
+# YUM软件包组展开后的包，便于通过rpm -q逐包检查是否已安装
+_GROUP_EXPAND = {
+    '@development': ('gcc', 'gcc-c++', 'make', 'autoconf', 'automake', 'libtool'),
+}
+
+# rpm -q / yum install输出解析
+_NOT_INSTALLED_RE = re.compile(r'^package (\S+) is not installed', re.M)
+_NO_PACKAGE_RE = re.compile(r'No package (\S+) available')
+
+# 安装脚本的进程间锁文件
+PKG_LOCK_FILE = "/var/lock/modsec-installer.lock" if os.path.isdir("/var/lock") else "/tmp/modsec-installer.lock"
+
+# devtoolset-7的GCC所在目录
+DEVTOOLSET_BIN = "/opt/rh/devtoolset-7/root/usr/bin"
+
+# 阿里云镜像上的EPEL安装包
+EPEL_RELEASE_URLS = {
+    "7": "https://mirrors.aliyun.com/epel/epel-release-latest-7.noarch.rpm",
+    "8": "https://mirrors.aliyun.com/epel/epel-release-latest-8.noarch.rpm"
+}
+
+def _run_streaming(cmd, check=True, timeout=None, on_line=None):
+    """运行命令并将输出逐行写入DEBUG日志
+    
+    stdout和stderr合并到同一个管道中逐行读取，不在内存中缓存完整输出
+    (yum makecache的输出可达数MB)
+    
+    Args:
+        cmd (str|list): 要执行的命令，字符串时通过shell执行
+        check (bool): 返回码非0时是否抛出CalledProcessError
+        timeout (int): 超时时间(秒)，为None时不限制
+        on_line (callable): 每读到一行输出时调用，用于在不缓存输出的情况下解析输出
+        
+    Returns:
+        subprocess.Popen: 已结束的进程对象
+    """
+    process = subprocess.Popen(cmd, shell=isinstance(cmd, str),
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               universal_newlines=True, errors='replace', bufsize=1)
+    
+    def _pump():
+        for line in process.stdout:
+            line = line.rstrip()
+            logger.debug(line)
+            if on_line:
+                on_line(line)
+    
+    reader = threading.Thread(target=_pump, daemon=True)
+    reader.start()
+    try:
+        process.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+        reader.join(5)
+        raise
+    reader.join()
+    
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, cmd)
+    return process
+
+def prefetch_epel_rpm(version="7"):
+    """预先下载EPEL安装包
+    
+    下载不需要YUM锁，可以与软件源修复、缓存重建等YUM操作并行进行
+    
+    Args:
+        version (str): CentOS版本号
+        
+    Returns:
+        str: 本地RPM文件路径，失败或无需下载时返回空字符串
+    """
+    url = EPEL_RELEASE_URLS.get(version)
+    if not url:
+        return ""
+    
+    rpm_path = os.path.join(DEFAULT_BUILD_DIR, os.path.basename(url))
+    if download_file(url, rpm_path, timeout=60, retries=2):
+        return rpm_path
+    return ""
+
+def get_gcc_version():
+    """获取当前GCC版本号
+    
+    Returns:
+        str: GCC版本号，如'4.8.5'，未安装GCC时返回空字符串
+    """
+    # -dumpfullversion在GCC 7+上输出完整版本号，旧版本忽略它并由-dumpversion输出
+    try:
+        return subprocess.run(['gcc', '-dumpfullversion', '-dumpversion'], timeout=5,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout.decode().strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def _gcc_major(version=None):
+    """获取GCC主版本号
+    
+    Args:
+        version (str): GCC版本号，为None时检测当前GCC
+        
+    Returns:
+        int: 主版本号，无法确定时返回0
+    """
+    if version is None:
+        version = get_gcc_version()
+    try:
+        return int(version.split('.')[0])
+    except ValueError:
+        return 0
+
+def use_aliyun_epel_mirror():
+    """将已安装的EPEL仓库配置改写为阿里云镜像
+    
+    Returns:
+        bool: 是否成功改写所有配置文件
+    """
+    success = True
+    for repo_file in glob.glob('/etc/yum.repos.d/epel*.repo'):
+        try:
+            with open(repo_file, 'r') as f:
+                content = f.read()
+            new_content = rewrite_epel_repo(content)
+            if new_content != content:
+                with open(repo_file, 'w') as f:
+                    f.write(new_content)
+        except (IOError, OSError) as e:
+            logger.warning(f"改写EPEL仓库配置{repo_file}失败: {e}")
+            success = False
+    return success
+
+def install_epel_repo(version="7", rpm_path=None):
     """安装EPEL仓库以提供额外的依赖包
     
     Args:
         version (str): CentOS版本号
+        rpm_path (str): 预先下载的EPEL安装包路径，为None时经由文件缓存下载，下载失败再直接从镜像URL安装
         
     Returns:
         bool: 是否成功安装EPEL仓库
     """
+    state_key = f"epel_{version}"
+    if load_state().get(state_key):
+        logger.info("EPEL仓库已在之前的运行中安装，跳过")
+        return True
+    
     logger.info("尝试安装EPEL仓库以提供额外的依赖包...")
     
     # 检查是否已安装EPEL
-    epel_installed = False
-    try:
-        process = subprocess.run("yum repolist | grep -i epel", shell=True, check=True, 
-                              stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        epel_installed = True
+    repolist = subprocess.run(YUM_CMD + ['repolist'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    if 'epel' in repolist.stdout.decode('utf-8', errors='replace').lower():
         logger.info("EPEL仓库已安装")
+        update_state(**{state_key: True})
         return True
-    except subprocess.CalledProcessError:
-        logger.info("EPEL仓库未安装，将安装")
+    logger.info("EPEL仓库未安装，将安装")
+    
+    # 未预先下载时，先经由文件缓存获取安装包，重复运行时无需再次下载
+    if not rpm_path and version in EPEL_RELEASE_URLS:
+        rpm_path = prefetch_epel_rpm(version)
     
     # 安装EPEL仓库
     try:
         if version == "7":
             # CentOS 7使用阿里云镜像安装EPEL
             logger.info("尝试从阿里云镜像安装CentOS 7的EPEL...")
-            cmd = "yum install -y https://mirrors.aliyun.com/epel/epel-release-latest-7.noarch.rpm"
-            process = subprocess.run(cmd, shell=True, check=True, 
-                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _run_streaming(YUM_CMD + ['install', '-y', rpm_path or EPEL_RELEASE_URLS['7']])
             
             # 替换为国内镜像源
-            subprocess.run("sed -i 's|^#baseurl=http://download.fedoraproject.org/pub/epel|baseurl=https://mirrors.aliyun.com/epel|g' /etc/yum.repos.d/epel*.repo", 
-                         shell=True, check=True)
-            subprocess.run("sed -i 's|^metalink|#metalink|g' /etc/yum.repos.d/epel*.repo", 
-                         shell=True, check=True)
+            use_aliyun_epel_mirror()
             
             logger.info("CentOS 7 EPEL仓库安装成功(阿里云镜像)")
+            update_state(**{state_key: True})
             return True
         elif version == "8":
             # CentOS 8使用阿里云镜像安装EPEL
             logger.info("尝试从阿里云镜像安装CentOS 8的EPEL...")
-            cmd = "yum install -y https://mirrors.aliyun.com/epel/epel-release-latest-8.noarch.rpm"
-            process = subprocess.run(cmd, shell=True, check=True, 
-                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _run_streaming(YUM_CMD + ['install', '-y', rpm_path or EPEL_RELEASE_URLS['8']])
             
             # 替换为国内镜像源
-            subprocess.run("sed -i 's|^#baseurl=http://download.fedoraproject.org/pub/epel|baseurl=https://mirrors.aliyun.com/epel|g' /etc/yum.repos.d/epel*.repo", 
-                         shell=True, check=True)
-            subprocess.run("sed -i 's|^metalink|#metalink|g' /etc/yum.repos.d/epel*.repo", 
-                         shell=True, check=True)
+            use_aliyun_epel_mirror()
             
             logger.info("CentOS 8 EPEL仓库安装成功(阿里云镜像)")
+            update_state(**{state_key: True})
             return True
         else:
             # 其他版本使用官方源
             logger.info(f"尝试安装CentOS {version}的EPEL仓库...")
-            cmd = "yum install -y epel-release"
-            process = subprocess.run(cmd, shell=True, check=True, 
-                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _run_streaming(YUM_CMD + ['install', '-y', 'epel-release'])
             logger.info(f"CentOS {version} EPEL仓库安装成功(官方源)")
+            update_state(**{state_key: True})
             return True
     except subprocess.CalledProcessError as e:
         logger.error(f"安装EPEL仓库失败: {e}")
-        output = e.stdout.decode() if e.stdout else "" + e.stderr.decode() if e.stderr else ""
-        logger.debug(f"错误输出: {output}")
         
         # 如果失败，尝试从官方源安装
         try:
             logger.warning("从阿里云安装失败，尝试官方源...")
-            cmd = "yum install -y epel-release"
-            process = subprocess.run(cmd, shell=True, check=True, 
-                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            _run_streaming(YUM_CMD + ['install', '-y', 'epel-release'])
             logger.info(f"CentOS {version} EPEL仓库安装成功(官方源)")
+            update_state(**{state_key: True})
             return True
         except subprocess.CalledProcessError as e:
             logger.error(f"安装EPEL仓库失败: {e}")
@@ -113,19 +275,49 @@ def install_newer_gcc(distro_family):
     Returns:
         bool: 是否成功安装
     """
+    installed = _install_newer_gcc(distro_family)
+    if installed:
+        # 可用的GCC可能已改变(新安装或加入PATH)，清除缓存的GCC版本检查结果
+        from modules.system_detector import check_gcc_version
+        check_gcc_version.cache_clear()
+    return installed
+
+def _install_newer_gcc(distro_family):
+    """安装支持C++17的更高版本GCC，由install_newer_gcc调用
+    
+    Args:
+        distro_family (str): 系统类型
+    
+    Returns:
+        bool: 是否成功安装
+    """
+    if _gcc_major() >= 7:
+        logger.info("当前GCC版本已不低于7，跳过安装")
+        return True
+    
+    # 之前的运行已安装devtoolset-7时，只需加入PATH
+    if distro_family == 'rhel' and os.path.exists(os.path.join(DEVTOOLSET_BIN, "gcc")):
+        logger.info("devtoolset-7已安装，添加到环境...")
+        os.environ["PATH"] = DEVTOOLSET_BIN + ":" + os.environ["PATH"]
+        return True
+    
     logger.info("尝试安装支持C++17的GCC版本...")
     
     try:
         if distro_family == 'debian':
             # 对于Ubuntu/Debian，添加toolchain PPA
             logger.info("为Ubuntu/Debian添加toolchain PPA...")
-            subprocess.run("apt update", shell=True, check=True)
-            subprocess.run("apt install -y software-properties-common", shell=True, check=True)
-            subprocess.run("add-apt-repository -y ppa:ubuntu-toolchain-r/test", shell=True, check=True)
-            subprocess.run("apt update", shell=True, check=True)
-            subprocess.run("apt install -y gcc-7 g++-7", shell=True, check=True)
+            # 非交互模式并跳过推荐包；add-apt-repository添加PPA后会自动刷新软件列表，无需再次update
+            env = {**os.environ, 'DEBIAN_FRONTEND': 'noninteractive'}
+            subprocess.run(['apt-get', 'update'], env=env, check=True)
+            subprocess.run(['apt-get', 'install', '-y', '--no-install-recommends',
+                            'software-properties-common'], env=env, check=True)
+            subprocess.run(['add-apt-repository', '-y', 'ppa:ubuntu-toolchain-r/test'], env=env, check=True)
+            subprocess.run(['apt-get', 'install', '-y', '--no-install-recommends',
+                            'gcc-7', 'g++-7'], env=env, check=True)
             # 设置GCC-7为默认版本
-            subprocess.run("update-alternatives --install /usr/bin/gcc gcc /usr/bin/gcc-7 60 --slave /usr/bin/g++ g++ /usr/bin/g++-7", shell=True, check=True)
+            subprocess.run(['update-alternatives', '--install', '/usr/bin/gcc', 'gcc', '/usr/bin/gcc-7', '60',
+                            '--slave', '/usr/bin/g++', 'g++', '/usr/bin/g++-7'], check=True)
             logger.info("已安装并设置GCC-7为默认版本")
             return True
         elif distro_family == 'rhel':
@@ -133,18 +325,18 @@ def install_newer_gcc(distro_family):
             logger.info("为CentOS/RHEL安装开发者工具集...")
             if os.path.exists("/etc/centos-release"):
                 # CentOS
-                subprocess.run("yum install -y centos-release-scl", shell=True, check=True)
-                subprocess.run("yum install -y devtoolset-7-gcc devtoolset-7-gcc-c++", shell=True, check=True)
+                subprocess.run(YUM_CMD + ['install', '-y', 'centos-release-scl'], check=True)
+                subprocess.run(YUM_CMD + ['install', '-y', 'devtoolset-7-gcc', 'devtoolset-7-gcc-c++'], check=True)
                 # 添加到环境变量
                 logger.info("添加devtoolset-7到环境...")
-                os.environ["PATH"] = "/opt/rh/devtoolset-7/root/usr/bin:" + os.environ["PATH"]
+                os.environ["PATH"] = DEVTOOLSET_BIN + ":" + os.environ["PATH"]
                 # 创建一个提示用户如何永久启用的消息
                 logger.info("\n要在当前会话中启用GCC 7，请运行: source scl_source enable devtoolset-7")
                 logger.info("要永久启用，请将以上命令添加到您的~/.bashrc文件中\n")
                 return True
             else:
                 # RHEL
-                subprocess.run("yum install -y gcc gcc-c++ make", shell=True, check=True)
+                subprocess.run(YUM_CMD + ['install', '-y', 'gcc', 'gcc-c++', 'make'], check=True)
                 logger.warning("对于RHEL系统，可能需要手动安装更高版本的GCC以支持C++17")
                 return True
     except subprocess.CalledProcessError as e:
@@ -172,6 +364,8 @@ def check_and_fix_dependency_repos(os_version):
     
     logger.info("检查YUM软件源配置...")
     
+    from modules.repo_manager_ext import test_yum_repo, fix_centos_yum_mirrors
+    
     # 测试软件源是否可用
     if test_yum_repo():
         logger.info("软件源配置正常，无需修复")
@@ -186,17 +380,14 @@ def init_repo_cache():
     Returns:
         bool: 是否成功初始化
     """
-    os_type, _ = detect_os()
+    manager = PACKAGE_MANAGERS.get(_detect_os()[0])
+    if not manager:
+        return True
     
     try:
-        if os_type == 'rhel':
-            logger.info("清理并重建YUM缓存...")
-            subprocess.run("yum clean all", shell=True, check=True)
-            subprocess.run("yum makecache", shell=True, check=True)
-        elif os_type == 'debian':
-            logger.info("更新APT缓存...")
-            subprocess.run("apt update", shell=True, check=True)
-        
+        logger.info(f"更新{manager['name']}软件源缓存...")
+        for cmd in manager['refresh']:
+            subprocess.run(cmd, check=True)
         return True
     except subprocess.CalledProcessError as e:
         logger.error(f"初始化软件源缓存失败: {e}")
@@ -208,6 +399,25 @@ def init_repo_cache():
 # 保持向后兼容
 init_repos_cache = init_repo_cache
 
+def _yum_cache_fresh(ttl=3600):
+    """检查YUM元数据缓存是否足够新
+    
+    Args:
+        ttl (int): 缓存有效期(秒)
+        
+    Returns:
+        bool: 最新的repomd.xml在有效期内返回True，否则返回False
+    """
+    files = glob.glob(os.path.join(YUM_CACHE_DIR, '**', 'repomd.xml'), recursive=True)
+    if not files:
+        return False
+    
+    try:
+        newest = max(os.path.getmtime(f) for f in files)
+    except OSError:
+        return False
+    return time.time() - newest < ttl
+
 def clean_yum_transactions():
     """清理YUM未完成的事务
     
@@ -219,27 +429,35 @@ def clean_yum_transactions():
     try:
         # 安装yum-utils包
         logger.info("安装 yum-utils 工具包...")
-        subprocess.run("yum install -y yum-utils", shell=True, check=False, 
-                      stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        _run_streaming(YUM_CMD + ['install', '-y', 'yum-utils'], check=False)
         
         # 清理YUM缓存和相关环境 - 非常强力的清理方式
+        yum = " ".join(YUM_CMD)
+        clean_cmd = f"{yum} clean all"
+        makecache_cmd = f"{yum} makecache"
         cleanup_commands = [
             "yum-complete-transaction --cleanup-only",
             "yum history new",  # 创建新的历史事务
-            "yum clean all",     # 清理所有缓存
+            clean_cmd,           # 清理所有缓存
             "rm -f /var/lib/rpm/__db*",  # 清除RPM数据库锁
             "rpm --rebuilddb",   # 重建 RPM数据库
-            "yum makecache"      # 重建缓存
+            makecache_cmd        # 重建缓存
         ]
         
-        for cmd in cleanup_commands:
-            logger.info(f"运行: {cmd}")
-            try:
-                subprocess.run(cmd, shell=True, check=False,
-                              stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=60)
-            except Exception as subcmd_err:
-                logger.warning(f"运行{cmd}时发生错误: {subcmd_err}")
-                # 继续尝试其他命令，不返回错误
+        # 元数据缓存刚刚重建过时，跳过代价高昂的清理和重新下载
+        if _yum_cache_fresh():
+            logger.info("YUM缓存新鲜，跳过清理和重建缓存")
+            cleanup_commands = [cmd for cmd in cleanup_commands
+                                if cmd not in (clean_cmd, makecache_cmd)]
+        
+        # 用分号连接，在同一个shell中依次执行，某条命令失败不影响后续命令
+        script = "; ".join(cleanup_commands)
+        logger.info(f"运行: {script}")
+        try:
+            _run_streaming(['bash', '-c', script], check=False, timeout=300)
+        except Exception as subcmd_err:
+            logger.warning(f"运行清理命令时发生错误: {subcmd_err}")
+            # 清理失败不返回错误
         
         return True
     except Exception as e:
@@ -257,29 +475,159 @@ def install_single_package(package_name, os_type="rhel"):
         bool: 是否成功安装
     """
     try:
-        if os_type == 'rhel':
-            cmd = f"yum install -y --skip-broken {package_name}"
-        else:
-            cmd = f"apt-get install -y {package_name}"
-            
-        subprocess.run(cmd, shell=True, check=True,
-                     stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=120)
+        cmd = PACKAGE_MANAGERS[os_type]['install'] + [package_name]
+        _run_streaming(cmd, timeout=120)
         return True
     except Exception as e:
         logger.warning(f"安装{package_name}失败: {e}")
         return False
 
+def _normalize_dependencies(deps):
+    """展开软件包组并去除重复的依赖项
+    
+    Args:
+        deps (list): 依赖包列表，可包含'@组名'
+        
+    Returns:
+        list: 去重后的依赖包列表，保持原有顺序
+    """
+    expanded = []
+    for pkg in deps:
+        expanded.extend(_GROUP_EXPAND.get(pkg, (pkg,)))
+    return list(dict.fromkeys(expanded))
+
+def _dependencies_sha(deps):
+    """计算依赖列表的摘要，依赖列表变化时使安装状态失效
+    
+    Args:
+        deps (list): 依赖包列表
+        
+    Returns:
+        str: SHA1摘要
+    """
+    return hashlib.sha1("\n".join(sorted(deps)).encode('utf-8')).hexdigest()
+
+def _package_names(deps):
+    """去掉依赖项中的附加参数，只保留包名
+    
+    Args:
+        deps (list): 依赖包列表
+        
+    Returns:
+        list: 包名列表
+    """
+    return [pkg.split()[0] for pkg in deps]
+
+def _packages_installed(deps, os_type="rhel"):
+    """一次性检查所有依赖包是否均已安装
+    
+    Args:
+        deps (list): 依赖包列表
+        os_type (str): 操作系统类型 ('rhel' 或 'debian')
+        
+    Returns:
+        bool: 所有依赖包均已安装时返回True
+    """
+    if os_type == 'rhel':
+        return not _missing_rpm_packages(deps)
+    try:
+        return subprocess.run(['dpkg', '-s'] + _package_names(deps),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+    except OSError:
+        return False
+
+def _missing_rpm_packages(packages):
+    """通过一次rpm -q调用找出尚未安装的RPM包
+    
+    Args:
+        packages (list): 依赖包列表
+        
+    Returns:
+        list: 未安装的依赖项，保持原有顺序
+    """
+    if not packages:
+        return []
+    names = _package_names(packages)
+    try:
+        result = subprocess.run(['rpm', '-q'] + names,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError as e:
+        logger.warning(f"检查已安装的包失败: {e}")
+        return list(packages)
+    not_installed = set(_NOT_INSTALLED_RE.findall(result.stdout.decode('utf-8', errors='replace')))
+    return [pkg for pkg, name in zip(packages, names) if name in not_installed]
+
+@contextmanager
+def _pkg_lock(lock_file=PKG_LOCK_FILE):
+    """持有安装脚本的进程间文件锁
+    
+    多个安装进程同时运行时，后启动的进程在此等待，而不是在YUM/APT锁上报错失败
+    
+    Args:
+        lock_file (str): 锁文件路径
+    """
+    try:
+        fd = os.open(lock_file, os.O_CREAT | os.O_RDWR, 0o644)
+    except OSError as e:
+        logger.warning(f"无法创建锁文件{lock_file}，不加锁继续: {e}")
+        yield
+        return
+    
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logger.info("另一个安装进程正在安装依赖，等待其完成...")
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
 def install_system_dependencies():
     """安装ModSecurity所需的系统依赖
     
+    整个过程持有进程间文件锁，并发运行的安装进程依次执行
+    
+    Returns:
+        bool: 是否成功安装所有依赖
+    """
+    with _pkg_lock():
+        return _install_system_dependencies()
+
+def _install_system_dependencies():
+    """安装ModSecurity所需的系统依赖(调用方需持有_pkg_lock)
+    
     Returns:
         bool: 是否成功安装所有依赖
     """
-    os_type, os_version = detect_os()
+    os_type, os_version = _detect_os()
+    
+    # 依赖列表未变化且所有包仍已安装时，跳过软件源修复和依赖安装
+    deps = _normalize_dependencies(DEPENDENCIES.get(os_type, []))
+    deps_sha = _dependencies_sha(deps)
+    if (os_type in DEPENDENCIES and load_state().get('deps_sha') == deps_sha
+            and _packages_installed(deps, os_type)):
+        logger.info("系统依赖已在之前的运行中安装，跳过")
+        # 之前的运行安装的devtoolset-7仍需加入PATH，保证本次使用与首次运行相同的编译器；
+        # devtoolset-7已存在时install_newer_gcc只会修改PATH，不会安装任何包
+        if os_type == 'rhel' and os.path.exists(os.path.join(DEVTOOLSET_BIN, "gcc")):
+            install_newer_gcc('rhel')
+        return True
+    
+    # YUM操作持有排他锁只能串行执行，但EPEL安装包下载、GCC版本检测和已安装包检查不依赖YUM，
+    # 在后台线程中与软件源修复、缓存重建并行进行
+    epel_future = gcc_future = missing_future = None
+    if os_type == 'rhel':
+        executor = ThreadPoolExecutor(max_workers=3)
+        epel_future = executor.submit(prefetch_epel_rpm, os_version)
+        gcc_future = executor.submit(get_gcc_version)
+        missing_future = executor.submit(_missing_rpm_packages, deps)
     
     # 先检查和修复软件源配置
     if os_type == 'rhel':
         logger.info("修复软件源配置...")
+        from modules.repo_manager_ext import fix_centos_yum_mirrors
         fix_centos_yum_mirrors()
         # 无论成功与否都继续
     
@@ -288,24 +636,35 @@ def install_system_dependencies():
     
     # 对于CentOS/RHEL，强制清理事务
     if os_type == 'rhel':
+        # 清理过程会重建RPM数据库，必须先等已安装包检查完成
+        try:
+            missing_deps = missing_future.result()
+        except Exception as e:
+            logger.warning(f"检查已安装的包失败: {e}")
+            missing_deps = list(deps)
+        
         logger.info("强制清理YUM状态...")
         clean_yum_transactions()
     
     # 对于CentOS/RHEL，安装EPEL仓库
     if os_type == 'rhel':
-        install_epel_repo(os_version) # 即使失败也继续
+        try:
+            epel_rpm = epel_future.result()
+        except Exception as e:
+            logger.warning(f"预下载EPEL安装包失败: {e}")
+            epel_rpm = ""
+        executor.shutdown(wait=False)
+        install_epel_repo(os_version, epel_rpm or None) # 即使失败也继续
         
         # 检查GCC版本，如果过低则安装新版本
         # 尤其是CentOS 7上默认GCC 4.8.5不支持C++11/14特性
         logger.info("检查GCC版本...")
         try:
-            gcc_ver_cmd = "gcc --version | head -n1 | awk '{print $3}'"
-            gcc_version = subprocess.run(gcc_ver_cmd, shell=True, check=True,
-                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout.decode().strip()
+            gcc_version = gcc_future.result()
             
             logger.info(f"检测到GCC版本: {gcc_version}")
             # 如果是CentOS 7或者GCC版本过低，安装新版本
-            if os_version.startswith('7') or gcc_version.startswith('4.'):
+            if os_version.startswith('7') or _gcc_major(gcc_version) < 7:
                 logger.warning(f"GCC版本 {gcc_version} 太旧，不支持现代C++特性")
                 logger.info("安装新版本GCC编译器...")
                 install_newer_gcc('rhel')
@@ -317,47 +676,48 @@ def install_system_dependencies():
     
     # 使用强化的包安装方法
     if os_type in DEPENDENCIES:
-        deps = DEPENDENCIES.get(os_type, [])
         
-        # 采用逻个安装策略，避免YUM事务问题
+        # 单个YUM事务批量安装，只对批量安装失败的包逐个重试
         if os_type == 'rhel':
-            logger.info("采用逐个安装策略，最大限度避免YUM事务冲突...")
-            
-            # 先检查已有依赖
-            success_count = 0
             total_deps = len(deps)
             
+            # 只安装后台rpm -q检查中缺失的包
+            missing = missing_deps
             for pkg in deps:
-                # 检查包是否已安装
-                check_cmd = f"rpm -q {pkg.split()[0]} 2>/dev/null || echo 'not installed'"
-                result = subprocess.run(check_cmd, shell=True, stdout=subprocess.PIPE).stdout.decode('utf-8').strip()
-                
-                if 'not installed' in result:
-                    logger.info(f"安装依赖: {pkg}")
-                    if install_single_package(pkg, os_type):
-                        success_count += 1
-                    # 不要中断安装过程，继续下一个包
-                else:
+                if pkg not in missing:
                     logger.info(f"包 {pkg} 已安装，跳过")
-                    success_count += 1
-                    
-                # 在每个包安装后清理缓存
-                subprocess.run("yum clean all", shell=True, check=False, 
-                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             
-            # 最后一次尝试批量安装任何尚未安装的包
-            logger.info("最后一次检查所有依赖包...")
-            try:
-                # 使用--skip-broken的可能性大一些
-                deps_str = " ".join(deps)
-                cmd = f"yum install -y --skip-broken {deps_str}"
-                subprocess.run(cmd, shell=True, check=False,
-                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=180)
-            except Exception as final_e:
-                logger.warning(f"最终依赖检查时发生错误: {final_e}")
+            if missing:
+                logger.info(f"批量安装依赖: {' '.join(missing)}")
+                try:
+                    # 使用--skip-broken的可能性大一些
+                    def _report_unavailable(line):
+                        match = _NO_PACKAGE_RE.search(line)
+                        if match:
+                            logger.warning(f"软件源中没有可用的包: {match.group(1)}")
+                    
+                    _run_streaming(PACKAGE_MANAGERS['rhel']['install'] + missing, check=False,
+                                   timeout=600, on_line=_report_unavailable)
+                except Exception as batch_e:
+                    logger.warning(f"批量安装依赖时发生错误: {batch_e}")
+                
+                # 批量事务中失败的包再逐个重试
+                for pkg in _missing_rpm_packages(missing):
+                    logger.info(f"单独安装依赖: {pkg}")
+                    install_single_package(pkg, os_type)
+                    # 不要中断安装过程，继续下一个包
                 
+                missing = _missing_rpm_packages(missing)
+            
+            success_count = total_deps - len(missing)
             success_rate = (success_count / total_deps) * 100
             logger.info(f"依赖安装既成: {success_count}/{total_deps} ({success_rate:.1f}%)")
+            if missing:
+                logger.warning(f"以下依赖未能安装: {' '.join(missing)}")
+            
+            # 全部安装成功时记录状态，下次运行可直接跳过
+            if not missing:
+                update_state(deps_sha=deps_sha)
             
             # 只要大部分关键包安装成功就认为安装成功
             return success_count >= (total_deps * 0.8)
@@ -365,9 +725,10 @@ def install_system_dependencies():
         elif os_type == 'debian':
             logger.info(f"安装Debian/Ubuntu依赖...")
             try:
-                deps_str = " ".join(deps)
-                cmd = f"apt-get update && apt-get install -y {deps_str}"
-                subprocess.run(cmd, shell=True, check=True)
+                for cmd in PACKAGE_MANAGERS['debian']['refresh']:
+                    subprocess.run(cmd, check=True)
+                subprocess.run(PACKAGE_MANAGERS['debian']['install'] + deps, check=True)
+                update_state(deps_sha=deps_sha)
                 logger.info("依赖安装成功")
                 return True
             except Exception as e:
@@ -390,7 +751,7 @@ if __name__ == "__main__":
     logger = setup_logger()
     
     # 测试系统依赖安装
-    os_type, os_version = detect_os()
+    os_type, os_version = _detect_os()
     logger.info(f"检测到系统: {os_type} {os_version}")
     
     # 测试软件源修复
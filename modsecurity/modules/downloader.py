@@ -6,18 +6,28 @@
 """
 
 import os
+import re
+import errno
+import hashlib
+import email.utils
+import functools
 import subprocess
 import logging
 import time
 import shutil
 import sys
+import socket
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
 logger = logging.getLogger('modsecurity_installer')
 
 # 尝试导入缓存管理模块
 try:
     try:
-        from modules.cache_manager import get_file_cache_path, cache_file_exists
+        from modules.cache_manager import get_file_cache_path, cache_file_exists, fast_copy
         from modules.constants import DEFAULT_CACHE_DIR, MODSEC_VERSION, NGINX_VERSION, OWASP_CRS_VERSION
     except ImportError as e:
         logging.error(f"导入模块时出错: {e}")
@@ -27,10 +37,246 @@ except ImportError:
     logger.warning("缓存管理模块导入失败，将禁用文件缓存功能")
     _cache_support = False
 
-def download_file(url, target_file, timeout=180, retries=3, delay=2, use_cache=True, cache_dir=None, version=None):
+# 同时进行的下载数上限，多个线程调用download_file时共享
+MAX_CONCURRENT_DOWNLOADS = 4
+_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_DOWNLOADS)
+
+# 多镜像竞速下载时，每个镜像比前一个晚开始的秒数
+MIRROR_HEAD_START = 0.1
+
+# aria2c支持单文件多连接分段下载，存在时优先使用
+_ARIA2C = shutil.which("aria2c")
+
+# 按优先级排列的版本推断规则: (URL关键字, 版本号, 是否要求URL中包含该版本号)
+_VERSION_RULES = (
+    ('modsecurity', lambda: MODSEC_VERSION, True),
+    ('nginx', lambda: NGINX_VERSION, True),
+    ('coreruleset', lambda: OWASP_CRS_VERSION, False),
+    ('crs', lambda: OWASP_CRS_VERSION, False),
+)
+_VERSION_RE = re.compile('|'.join(rule[0] for rule in _VERSION_RULES), re.I)
+
+# os.link失败时可以改为复制的错误码
+_LINK_FALLBACK_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOTSUP)
+
+# 进程内HTTP下载设置，urllib自动跟随重定向
+_opener = urllib.request.build_opener()
+_USER_AGENT = "Mozilla/5.0 (compatible; modsecurity-installer)"
+_CHUNK_SIZE = 1 << 20
+_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+def _infer_version(url):
+    """从URL推断文件版本，用于组织缓存目录
+    
+    Args:
+        url (str): 下载URL
+        
+    Returns:
+        str: 版本号，无法推断时返回'latest'
+    """
+    found = {match.lower() for match in _VERSION_RE.findall(url)}
+    if found:
+        for key, get_version, version_in_url in _VERSION_RULES:
+            if key in found:
+                version = get_version()
+                if not version_in_url or version in url:
+                    return version
+    return "latest"
+
+def _build_aria2c_cmd(url, target_file, timeout):
+    """构建aria2c多连接下载命令
+    
+    Args:
+        url (str): 下载URL
+        target_file (str): 目标文件路径
+        timeout (int): 超时时间(秒)
+        
+    Returns:
+        list: 命令参数列表
+    """
+    return [_ARIA2C, "-x8", "-s8", "--min-split-size=1M", "--allow-overwrite=true",
+            "--auto-file-renaming=false", "--connect-timeout=30", f"--timeout={timeout}",
+            "--console-log-level=warn", "-d", os.path.dirname(os.path.abspath(target_file)),
+            "-o", os.path.basename(target_file), url]
+
+def _fetch_url(url, target_file, timeout, headers=None):
+    """在进程内通过HTTP下载文件，流式写入磁盘
+    
+    Args:
+        url (str): 下载URL
+        target_file (str): 目标文件路径
+        timeout (int): 网络操作超时时间(秒)
+        headers (dict): 额外的请求头，如条件请求的If-None-Match
+        
+    Returns:
+        http.client.HTTPMessage: 响应头
+    """
+    request_headers = {'User-Agent': _USER_AGENT}
+    if headers:
+        request_headers.update(headers)
+    request = urllib.request.Request(url, headers=request_headers)
+    with _opener.open(request, timeout=timeout) as response, open(target_file, 'wb') as f:
+        shutil.copyfileobj(response, f, length=_CHUNK_SIZE)
+        return response.headers
+
+def _cpu_has_sha_extensions():
+    """检查CPU是否支持SHA指令扩展(x86的SHA-NI或ARM的SHA2)
+    
+    Returns:
+        bool: 是否支持
+    """
+    try:
+        with open('/proc/cpuinfo', 'r') as f:
+            for line in f:
+                if line.startswith(('flags', 'Features')):
+                    flags = line.split(':', 1)[-1].split()
+                    return 'sha_ni' in flags or 'sha2' in flags
+    except (IOError, OSError):
+        pass
+    return False
+
+# 缓存完整性校验使用的摘要算法：CPU有SHA指令时SHA256更快，否则BLAKE2b更快
+_DIGEST_ALGORITHM = 'sha256' if _cpu_has_sha_extensions() else 'blake2b'
+
+def _file_digest(path, algorithm=_DIGEST_ALGORITHM):
+    """按1MiB分块计算文件摘要，复用同一个缓冲区读取
+    
+    Args:
+        path (str): 文件路径
+        algorithm (str): hashlib算法名称
+        
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.new(algorithm)
+    buf = bytearray(_CHUNK_SIZE)
+    view = memoryview(buf)
+    with open(path, 'rb', buffering=0) as f:
+        while True:
+            size = f.readinto(buf)
+            if not size:
+                break
+            digest.update(view[:size])
+    return digest.hexdigest()
+
+def _sha256_matches(path, expected_sha256, digest=None):
+    """检查文件的SHA256是否与期望值一致
+    
+    Args:
+        path (str): 文件路径
+        expected_sha256 (str): 期望的SHA256摘要，为空时不检查
+        digest (str): 已按_DIGEST_ALGORITHM计算好的摘要，算法为SHA256时直接复用
+        
+    Returns:
+        bool: 一致或无需检查时返回True
+    """
+    if not expected_sha256:
+        return True
+    if digest is None or _DIGEST_ALGORITHM != 'sha256':
+        digest = _file_digest(path, 'sha256')
+    return digest == expected_sha256.lower()
+
+def _read_sidecar(path):
+    """读取缓存文件旁的元数据文件(摘要/.etag)
+    
+    Args:
+        path (str): 元数据文件路径
+        
+    Returns:
+        str: 文件内容，不存在时返回空字符串
+    """
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return ""
+
+def _write_sidecar(path, value):
+    """写入缓存文件旁的元数据文件，值为空时删除
+    
+    Args:
+        path (str): 元数据文件路径
+        value (str): 要写入的内容
+    """
+    try:
+        if value:
+            with open(path, 'w') as f:
+                f.write(value)
+        elif os.path.exists(path):
+            os.remove(path)
+    except (IOError, OSError) as e:
+        logger.debug(f"写入缓存元数据{path}失败: {e}")
+
+def _link_or_copy(src, dst):
+    """将文件硬链接到目标路径，跨文件系统等无法链接时复制
+    
+    Args:
+        src (str): 源文件
+        dst (str): 目标文件
+    """
+    tmp_dst = dst + ".tmp"
+    if os.path.lexists(tmp_dst):
+        os.remove(tmp_dst)
+    try:
+        os.link(src, tmp_dst)
+    except OSError as e:
+        # 只有无法建立硬链接(跨文件系统、不支持或链接数超限)时才复制，其他错误照常抛出
+        if e.errno not in _LINK_FALLBACK_ERRNOS:
+            raise
+        logger.debug(f"无法硬链接{src}，改为复制: {e}")
+        fast_copy(src, tmp_dst)
+    os.replace(tmp_dst, dst)
+
+def _valid_cache_entry(cache_file, expected_sha256=None):
+    """检查缓存文件是否完整可用
+    
+    缓存文件的摘要需与写入缓存时记录的一致，指定了期望的SHA256时还需与之一致
+    
+    Args:
+        cache_file (str): 缓存文件路径
+        expected_sha256 (str): 期望的SHA256摘要
+        
+    Returns:
+        bool: 缓存是否可用
+    """
+    if not os.path.exists(cache_file) or os.path.getsize(cache_file) == 0:
+        return False
+    recorded = _read_sidecar(f"{cache_file}.{_DIGEST_ALGORITHM}")
+    if not recorded:
+        return False
+    actual = _file_digest(cache_file)
+    if actual != recorded or not _sha256_matches(cache_file, expected_sha256, actual):
+        logger.warning(f"缓存文件校验失败，将重新下载: {cache_file}")
+        return False
+    return True
+
+def record_file_digest(path):
+    """在文件旁记录其摘要，供verify_file_digest校验
+    
+    Args:
+        path (str): 文件路径
+    """
+    _write_sidecar(f"{path}.{_DIGEST_ALGORITHM}", _file_digest(path))
+
+def verify_file_digest(path):
+    """检查文件是否与record_file_digest记录的摘要一致
+    
+    没有摘要记录(如旧版本留下或下载中断的文件)时视为不完整
+    
+    Args:
+        path (str): 文件路径
+        
+    Returns:
+        bool: 文件是否完整可用
+    """
+    return _valid_cache_entry(path)
+
+def download_file(url, target_file, timeout=180, retries=3, delay=2, use_cache=True, cache_dir=None, version=None,
+                  expected_sha256=None):
     """下载文件，支持缓存系统
     
-    按照类型/版本/文件名的结构缓存下载文件
+    按照类型/版本/文件名的结构缓存下载文件，缓存文件旁记录摘要和ETag。
+    命中缓存时先校验摘要，无法固定版本的文件(latest)再用条件请求确认服务端未更新
     
     Args:
         url (str): 下载URL
@@ -41,6 +287,7 @@ def download_file(url, target_file, timeout=180, retries=3, delay=2, use_cache=T
         use_cache (bool): 是否使用缓存
         cache_dir (str): 缓存目录，如为None则使用默认缓存目录
         version (str): 文件版本，如为None则根据文件名自动推断
+        expected_sha256 (str): 期望的SHA256摘要，下载或缓存的文件不一致时视为失败
         
     Returns:
         bool: 是否成功下载
@@ -48,25 +295,16 @@ def download_file(url, target_file, timeout=180, retries=3, delay=2, use_cache=T
     try:
         # 创建目标目录
         target_dir = os.path.dirname(target_file)
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
+        if target_dir:
+            os.makedirs(target_dir, exist_ok=True)
             
         # 计算版本信息（如果未提供）
         if version is None:
-            # 尝试从 URL 或文件名推断版本
-            file_name = os.path.basename(url)
-            if 'modsecurity' in url.lower() and MODSEC_VERSION in url:
-                version = MODSEC_VERSION
-            elif 'nginx' in url.lower() and NGINX_VERSION in url:
-                version = NGINX_VERSION
-            elif 'coreruleset' in url.lower() or 'crs' in url.lower():
-                version = OWASP_CRS_VERSION
-            else:
-                # 如果无法推断，使用通用版本标记
-                version = "latest"
+            version = _infer_version(url)
                 
         # 检查缓存
         cache_file = None
+        conditional_headers = None
         if _cache_support and use_cache:
             # 如果未提供缓存目录，使用默认目录
             if cache_dir is None:
@@ -75,84 +313,107 @@ def download_file(url, target_file, timeout=180, retries=3, delay=2, use_cache=T
             # 获取缓存文件路径
             cache_file = get_file_cache_path(cache_dir, url, version)
             
-            # 检查缓存是否存在
-            if os.path.exists(cache_file) and os.path.getsize(cache_file) > 0:
-                logger.info(f"使用缓存文件: {cache_file}")
-                
-                # 从缓存复制到目标文件
-                try:
-                    shutil.copy2(cache_file, target_file)
-                    logger.info(f"成功从缓存复制文件 ({os.path.getsize(target_file)} 字节)")
-                    return True
-                except Exception as e:
-                    logger.warning(f"从缓存复制文件失败: {e}")
-                    # 如果复制失败，尝试直接下载
+            # 检查缓存是否存在且完整
+            if _valid_cache_entry(cache_file, expected_sha256):
+                if version != "latest" or expected_sha256:
+                    # 版本固定的文件内容不会变化，直接使用缓存
+                    try:
+                        _link_or_copy(cache_file, target_file)
+                        logger.info(f"使用缓存文件: {cache_file} ({os.path.getsize(target_file)} 字节)")
+                        return True
+                    except Exception as e:
+                        logger.warning(f"从缓存复制文件失败: {e}")
+                        # 如果复制失败，尝试直接下载
+                else:
+                    # 无法固定版本，向服务端确认缓存是否仍是最新
+                    conditional_headers = {
+                        'If-Modified-Since': email.utils.formatdate(os.path.getmtime(cache_file), usegmt=True)
+                    }
+                    etag = _read_sidecar(cache_file + ".etag")
+                    if etag:
+                        conditional_headers['If-None-Match'] = etag
                     
         # 如果缓存不可用或缓存复制失败，执行下载
         logger.info(f"下载 {url} 到 {target_file}")
         
+        # 先下载到.part临时文件，完成后原子替换，中断的下载不会留下残缺的目标文件
+        part_file = target_file + ".part"
         attempt = 0
         while attempt < retries:
+            attempt += 1
+            response_headers = None
             try:
-                attempt += 1
-                
-                # 构建curl命令，添加超时和重试参数
-                cmd = f"curl -L --connect-timeout 30 --retry 3 --max-time {timeout} -o {target_file} {url}"
-                process = subprocess.run(cmd, shell=True, check=True, 
-                                        stdout=subprocess.PIPE, 
-                                        stderr=subprocess.PIPE,
-                                        timeout=timeout + 30)  # 给subprocess的超时稍微长一点
+                with _semaphore:
+                    if _ARIA2C and not conditional_headers:
+                        subprocess.run(_build_aria2c_cmd(url, part_file, timeout), check=True,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       timeout=timeout + 30)  # 给subprocess的超时稍微长一点
+                    else:
+                        response_headers = _fetch_url(url, part_file, timeout, conditional_headers)
                 
                 # 验证文件是否存在且大小大于0
-                if os.path.exists(target_file) and os.path.getsize(target_file) > 0:
-                    file_size = os.path.getsize(target_file)
-                    logger.info(f"成功下载文件 ({file_size} 字节)")
-                    
-                    # 如果缓存支持并启用，将文件保存到缓存
-                    if _cache_support and use_cache and cache_file:
-                        try:
-                            # 确保缓存目录存在
-                            cache_dir = os.path.dirname(cache_file)
-                            if not os.path.exists(cache_dir):
-                                os.makedirs(cache_dir, exist_ok=True)
+                if os.path.exists(part_file) and os.path.getsize(part_file) > 0:
+                    file_digest = _file_digest(part_file)
+                    if not _sha256_matches(part_file, expected_sha256, file_digest):
+                        logger.warning(f"下载文件SHA256不匹配 (尝试 {attempt}/{retries})")
+                    else:
+                        os.replace(part_file, target_file)
+                        logger.info(f"成功下载文件 ({os.path.getsize(target_file)} 字节)")
+                        
+                        # 如果缓存支持并启用，将文件保存到缓存
+                        if _cache_support and use_cache and cache_file:
+                            try:
+                                # 确保缓存目录存在
+                                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
                                 
-                            # 将文件复制到缓存
-                            shutil.copy2(target_file, cache_file)
-                            logger.info(f"文件已保存到缓存: {cache_file}")
-                        except Exception as e:
-                            logger.warning(f"保存文件到缓存失败: {e}")
-                            # 保存到缓存失败不影响整体成功
-                    
-                    return True
+                                # 将文件链接到缓存，并记录摘要和ETag
+                                _link_or_copy(target_file, cache_file)
+                                _write_sidecar(f"{cache_file}.{_DIGEST_ALGORITHM}", file_digest)
+                                _write_sidecar(cache_file + ".etag",
+                                               response_headers.get('ETag', '') if response_headers else '')
+                                logger.info(f"文件已保存到缓存: {cache_file}")
+                            except Exception as e:
+                                logger.warning(f"保存文件到缓存失败: {e}")
+                                # 保存到缓存失败不影响整体成功
+                        
+                        return True
                 else:
                     logger.warning(f"下载文件结果异常: 文件为空或不存在")
-                    if attempt < retries:
-                        logger.info(f"将在 {delay} 秒后进行第 {attempt+1}/{retries} 次尝试")
-                        time.sleep(delay)
-                    continue
-                
+            except urllib.error.HTTPError as e:
+                if e.code == 304 and conditional_headers:
+                    # 服务端确认缓存仍是最新
+                    _link_or_copy(cache_file, target_file)
+                    logger.info(f"服务端文件未更新，使用缓存文件: {cache_file}")
+                    return True
+                logger.warning(f"下载文件失败 (尝试 {attempt}/{retries}): HTTP {e.code}")
+                # 只有服务端临时错误才值得重试，404等错误直接放弃
+                if e.code not in _RETRY_STATUS:
+                    return False
             except subprocess.CalledProcessError as e:
                 logger.warning(f"下载文件失败 (尝试 {attempt}/{retries}): {e}")
                 if e.stderr:
-                    logger.debug(f"错误输出: {e.stderr.decode()}")
-                
-                if attempt < retries:
-                    logger.info(f"将在 {delay} 秒后进行第 {attempt+1}/{retries} 次尝试")
-                    time.sleep(delay)
-                    # 尝试使用不同的时间参数
-                    timeout = timeout + 30
-                else:
-                    return False
-                    
-            except subprocess.TimeoutExpired:
+                    logger.debug(f"错误输出: {e.stderr.decode(errors='replace')}")
+            except (subprocess.TimeoutExpired, socket.timeout):
                 logger.warning(f"下载文件超时 (尝试 {attempt}/{retries})")
-                if attempt < retries:
-                    logger.info(f"将在 {delay} 秒后进行第 {attempt+1}/{retries} 次尝试")
-                    time.sleep(delay)
-                    # 尝试使用更长的超时时间
-                    timeout = timeout + 60
-                else:
-                    return False
+                # 尝试使用更长的超时时间
+                timeout = timeout + 30
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"下载文件失败 (尝试 {attempt}/{retries}): {e}")
+            finally:
+                if os.path.exists(part_file):
+                    os.remove(part_file)
+            
+            if attempt < retries:
+                logger.info(f"将在 {delay} 秒后进行第 {attempt+1}/{retries} 次尝试")
+                time.sleep(delay)
+                # 指数退避
+                delay = delay * 2
+        
+        # 无法确认缓存是否最新时（如网络不可用），仍使用校验通过的缓存
+        if conditional_headers:
+            _link_or_copy(cache_file, target_file)
+            logger.warning(f"无法向服务端确认缓存是否最新，使用缓存文件: {cache_file}")
+            return True
         
         return False
     except Exception as e:
@@ -160,6 +421,115 @@ def download_file(url, target_file, timeout=180, retries=3, delay=2, use_cache=T
         return False
 
 
+def download_and_extract(url, extract_dir, timeout=180):
+    """下载tar.gz归档并在下载的同时解压，不在磁盘上保存归档文件
+    
+    不经过文件缓存，适用于禁用缓存的场景；失败时调用方应退回download_file后再解压
+    
+    Args:
+        url (str): 归档文件URL
+        extract_dir (str): 解压目录
+        timeout (int): 网络操作超时时间(秒)
+        
+    Returns:
+        bool: 是否成功下载并解压
+    """
+    import tarfile
+    from modules.archive_handler import extract_tar_stream
+    
+    logger.info(f"下载并解压 {url} 到 {extract_dir}")
+    request = urllib.request.Request(url, headers={'User-Agent': _USER_AGENT})
+    try:
+        with _semaphore, _opener.open(request, timeout=timeout) as response:
+            count = extract_tar_stream(response, extract_dir, compression='gz')
+        logger.info(f"成功下载并解压 {url}，共 {count} 个条目")
+        return True
+    except (urllib.error.URLError, socket.timeout, tarfile.TarError, OSError) as e:
+        logger.warning(f"下载并解压失败: {e}")
+        return False
+
+def _discard(path):
+    """删除文件，文件不存在时忽略"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def race_fetch(attempts, head_start=MIRROR_HEAD_START, discard=_discard):
+    """按优先级错开启动多个获取任务，采用最先成功的结果
+    
+    任务按顺序错开head_start秒启动，等待期间有正在进行的任务失败时立即启动下一个。
+    每个任务写入各自的临时路径，落选任务的临时路径在其完成后由discard删除。
+    文件下载和Git仓库克隆共用这一竞速逻辑
+    
+    Args:
+        attempts (list): (标识, 临时路径, 无参数的获取函数)元组列表，获取函数返回是否成功
+        head_start (float): 相邻任务启动的间隔秒数
+        discard (callable): 删除落选任务临时路径的函数
+        
+    Returns:
+        tuple: 成功任务的(标识, 临时路径)，均失败时返回None
+    """
+    attempts = list(attempts)
+    if not attempts:
+        return None
+    
+    executor = ThreadPoolExecutor(max_workers=len(attempts))
+    futures = {}
+    pending = set()
+    winner = None
+    try:
+        for index, (key, scratch, fetch) in enumerate(attempts):
+            future = executor.submit(fetch)
+            futures[future] = (key, scratch)
+            pending.add(future)
+            if index < len(attempts) - 1:
+                # 只等待尚未完成的任务，已失败的任务不会让后续任务跳过错开等待
+                done, pending = wait(pending, timeout=head_start, return_when=FIRST_COMPLETED)
+                winner = next((futures[future] for future in done if future.result()), None)
+                if winner:
+                    break
+                if not done:
+                    logger.info(f"{key} 未能在{head_start}秒内完成，同时尝试下一个来源")
+        
+        while winner is None and pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((futures[future] for future in done if future.result()), None)
+    finally:
+        # 落选的任务无法中途取消，完成后删除其临时路径
+        for future, (key, scratch) in futures.items():
+            if winner is None or scratch != winner[1]:
+                future.add_done_callback(lambda _, path=scratch: discard(path))
+        executor.shutdown(wait=False)
+    return winner
+
+def download_from_mirrors(urls, target_file, head_start=MIRROR_HEAD_START, **kwargs):
+    """从多个镜像竞速下载同一文件，采用最先成功的结果
+    
+    每个镜像下载到各自的临时文件，成功者改名为目标文件；
+    只有第一个镜像读写缓存，避免多个线程同时写入同一缓存文件
+    
+    Args:
+        urls (list): 按优先级排列的下载URL
+        target_file (str): 目标文件路径
+        head_start (float): 相邻镜像启动的间隔秒数
+        **kwargs: 传递给download_file的其他参数
+        
+    Returns:
+        str: 下载成功的URL，均失败时返回None
+    """
+    attempts = []
+    for index, url in enumerate(urls):
+        options = kwargs if index == 0 else dict(kwargs, use_cache=False)
+        candidate = f"{target_file}.candidate-{index}"
+        attempts.append((url, candidate, functools.partial(download_file, url, candidate, **options)))
+    
+    winner = race_fetch(attempts, head_start)
+    if winner is None:
+        return None
+    os.replace(winner[1], target_file)
+    return winner[0]
+
 def is_url_accessible(url, timeout=10):
     """检查URL是否可访问
     
@@ -171,23 +541,36 @@ def is_url_accessible(url, timeout=10):
         bool: URL是否可访问
     """
     try:
-        # 使用curl检查URL可访问性
-        cmd = f"curl -s -I --connect-timeout {timeout} {url}"
-        result = subprocess.run(cmd, shell=True, check=False, 
-                               stdout=subprocess.PIPE, 
-                               stderr=subprocess.PIPE,
-                               timeout=timeout+5)
-        
-        # 检查状态码
-        if result.returncode == 0:
-            return True
-        else:
-            logger.debug(f"URL {url} 访问失败，状态码: {result.returncode}")
-            return False
+        # 发送HEAD请求，自动跟随重定向
+        request = urllib.request.Request(url, method='HEAD', headers={'User-Agent': _USER_AGENT})
+        with _opener.open(request, timeout=timeout) as response:
+            status = response.getcode()
+            return status is None or status < 400
+    except urllib.error.HTTPError as e:
+        logger.debug(f"URL {url} 访问失败，状态码: {e.code}")
+        return False
     except Exception as e:
         logger.debug(f"检查URL {url} 可访问性时发生错误: {e}")
         return False
 
+def check_urls(urls, timeout=10):
+    """并行检查多个URL是否可访问
+    
+    Args:
+        urls (list): 要检查的URL列表
+        timeout (int): 超时时间(秒)
+        
+    Returns:
+        dict: URL到是否可访问的映射
+    """
+    urls = list(urls)
+    if not urls:
+        return {}
+    
+    with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+        results = executor.map(lambda url: is_url_accessible(url, timeout), urls)
+        return dict(zip(urls, results))
+
 
 # 测试函数
 if __name__ == "__main__":
@@ -208,8 +591,7 @@ if __name__ == "__main__":
     ]
     
     logger.info("测试URL可访问性:")
-    for url in test_urls:
-        result = is_url_accessible(url)
+    for url, result in check_urls(test_urls).items():
         logger.info(f"{url}: {'可访问' if result else '不可访问'}")
     
     # 测试文件下载
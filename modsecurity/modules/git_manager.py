@@ -6,20 +6,36 @@ Git仓库管理模块
 """
 
 import os
+import re
 import subprocess
 import logging
 import time
 import shutil
 import sys
+import tempfile
+import threading
+import functools
+from functools import lru_cache
+
+try:
+    from modules.downloader import race_fetch
+except ImportError as e:
+    logging.error(f"导入模块时出错: {e}")
+    sys.exit(1)
 
-# 尝试导入缓存管理器
-    
 logger = logging.getLogger('modsecurity_installer')
 
+# 非详细模式下丢弃git的标准输出，只保留标准错误用于记录失败原因；详细模式直接输出到终端
+_QUIET = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.PIPE}
+_LOUD = {}
+
+# 没有缓存时，主要仓库先行克隆的秒数，超时未成功则同时克隆备用仓库
+ALTERNATE_REPO_HEAD_START = 10
+
 # 从缓存管理器导入缓存相关函数
 try:
     try:
-        from modules.cache_manager import get_git_cache_path
+        from modules.cache_manager import get_git_cache_path, reflink_copytree
         from modules.constants import DEFAULT_CACHE_DIR
     except ImportError as e:
         logging.error(f"导入模块时出错: {e}")
@@ -30,6 +46,9 @@ try:
             import hashlib
             repo_hash = hashlib.md5(repo_url.encode()).hexdigest()
             return os.path.join(cache_dir, "git", repo_hash)
+        
+        def reflink_copytree(src, dst):
+            return shutil.copytree(src, dst, symlinks=True)
             
         DEFAULT_CACHE_DIR = os.path.expanduser("~/.modsecurity_cache")
     _cache_support = True
@@ -37,9 +56,154 @@ except ImportError:
     logger.warning("缓存管理模块导入失败，将禁用缓存功能")
     _cache_support = False
 
+def _fast_rmtree(path):
+    """删除目录树，先改名再在后台线程中删除，调用方无需等待大量unlink完成
+    
+    后台线程不是守护线程，进程退出前会等待删除完成，不会留下临时目录
+    
+    Args:
+        path (str): 要删除的目录
+    """
+    # 在同一目录下创建唯一的临时目录，把要删除的目录移入其中，保证改名不跨文件系统
+    parent, name = os.path.split(os.path.normpath(path))
+    trash_path = None
+    try:
+        trash_path = tempfile.mkdtemp(prefix=f"{name}.trash.", dir=parent or '.')
+        os.rename(path, os.path.join(trash_path, name))
+    except OSError:
+        shutil.rmtree(path, ignore_errors=True)
+        if trash_path:
+            shutil.rmtree(trash_path, ignore_errors=True)
+        return
+    threading.Thread(target=shutil.rmtree, args=(trash_path,), kwargs={'ignore_errors': True}).start()
+
+@lru_cache(maxsize=1)
+def _git_version():
+    """获取Git版本号
+    
+    Returns:
+        tuple: 版本号元组，如(2, 39)，无法确定时返回(0,)
+    """
+    try:
+        output = subprocess.run(['git', '--version'], stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, universal_newlines=True).stdout
+        match = re.search(r'(\d+)\.(\d+)', output)
+        return tuple(int(part) for part in match.groups()) if match else (0,)
+    except OSError:
+        return (0,)
+
+def _supports_parallel_submodules():
+    """Git是否支持并行获取子模块(git clone/submodule update --jobs，Git 2.9+)"""
+    return _git_version() >= (2, 9)
+
+def _supports_shallow_submodules():
+    """Git是否支持浅克隆子模块(--shallow-submodules，Git 2.9+)"""
+    return _git_version() >= (2, 9)
+
+def _supports_partial_clone():
+    """Git是否支持部分克隆(--filter=blob:none，Git 2.19+)"""
+    return _git_version() >= (2, 19)
+
+def _supports_worktree():
+    """Git是否支持git worktree(Git 2.5+)"""
+    return _git_version() >= (2, 5)
+
+def _jobs_option(jobs=None):
+    """生成并行获取子模块的--jobs参数
+    
+    git clone --jobs需要Git 2.9+，旧版本(如CentOS 7自带的1.8)返回空列表
+    
+    Args:
+        jobs (int): 并行数量，默认为CPU核数
+        
+    Returns:
+        list: 形如['--jobs=4']的参数列表，不支持时为空列表
+    """
+    if not _supports_parallel_submodules():
+        return []
+    return [f"--jobs={jobs or os.cpu_count() or 1}"]
+
+def _build_clone_argv(repo_url, target_dir, depth=None, branch=None, recursive=True, filter_='blob:none', jobs=None):
+    """生成克隆仓库的命令参数列表
+    
+    Git版本支持时附加部分克隆过滤器和--shallow-submodules以减少下载量
+    
+    Args:
+        repo_url (str): 仓库URL
+        target_dir (str): 目标目录
+        depth (int): 克隆深度，为None时完整克隆
+        branch (str): 分支名，可选
+        recursive (bool): 是否递归克隆子模块
+        filter_ (str): 部分克隆过滤器，为None时不使用部分克隆
+        jobs (int): 并行获取子模块的数量
+        
+    Returns:
+        list: git clone命令参数列表
+    """
+    argv = ['git', 'clone']
+    if recursive:
+        argv += ['--recursive', *_jobs_option(jobs)]
+        # 子模块只浅克隆最新提交
+        if _supports_shallow_submodules():
+            argv.append('--shallow-submodules')
+    # 部分克隆推迟下载检出用不到的历史文件内容
+    if filter_ and _supports_partial_clone():
+        argv.append(f"--filter={filter_}")
+    if depth:
+        argv.append(f"--depth={depth}")
+    if branch:
+        argv += ['-b', branch]
+    return argv + ['--', repo_url, target_dir]
+
+def _update_submodules(repo_dir, verbose=False, timeout=None, jobs=None):
+    """一次性初始化并递归更新所有子模块，多个子模块并行获取
+    
+    Args:
+        repo_dir (str): Git仓库目录
+        verbose (bool): 是否显示详细输出
+        timeout (int): 命令超时时间(秒)
+        jobs (int): 并行数量，默认为CPU核数
+    """
+    _invalidate_submodule_cache(repo_dir)
+    cmd = ['git', 'submodule', 'update', '--init', '--recursive', *_jobs_option(jobs)]
+    subprocess.run(cmd, cwd=repo_dir, check=True,
+                  **(_LOUD if verbose else _QUIET),
+                  timeout=timeout)
+
+# 子模块检查结果缓存，键为(仓库目录, .git/modules修改时间)
+_submodule_status_cache = {}
+
+def _submodule_cache_key(repo_dir):
+    """生成子模块检查结果的缓存键
+    
+    Args:
+        repo_dir (str): Git仓库目录
+        
+    Returns:
+        tuple: (仓库绝对路径, .git/modules的修改时间，不存在时为None)
+    """
+    modules_dir = os.path.join(repo_dir, '.git', 'modules')
+    try:
+        mtime = os.path.getmtime(modules_dir)
+    except OSError:
+        mtime = None
+    return (os.path.abspath(repo_dir), mtime)
+
+def _invalidate_submodule_cache(repo_dir):
+    """清除指定仓库的子模块检查结果缓存
+    
+    Args:
+        repo_dir (str): Git仓库目录
+    """
+    repo_path = os.path.abspath(repo_dir)
+    for key in [key for key in _submodule_status_cache if key[0] == repo_path]:
+        del _submodule_status_cache[key]
+
 def check_submodules_initialized(repo_dir, verbose=False):
     """检查Git仓库的子模块是否已经完全初始化
     
+    同一进程内结果按仓库目录和.git/modules修改时间缓存，避免重复执行git submodule status
+    
     Args:
         repo_dir (str): Git仓库目录
         verbose (bool): 是否显示详细输出
@@ -47,28 +211,26 @@ def check_submodules_initialized(repo_dir, verbose=False):
     Returns:
         bool: 如果所有子模块都已初始化则返回True，否则返回False
     """
+    cache_key = _submodule_cache_key(repo_dir)
+    if cache_key in _submodule_status_cache:
+        return _submodule_status_cache[cache_key]
+    
     try:
-        # 保存当前目录
-        original_dir = os.getcwd()
-        os.chdir(repo_dir)
-        
         # 检查是否有子模块配置
-        if not os.path.exists('.gitmodules'):
+        if not os.path.exists(os.path.join(repo_dir, '.gitmodules')):
             # 没有子模块配置文件，视为已初始化
-            os.chdir(original_dir)
+            _submodule_status_cache[cache_key] = True
             return True
             
         # 使用git submodule status检查子模块状态
-        submodule_status = subprocess.run("git submodule status", shell=True, check=True,
+        submodule_status = subprocess.run(['git', 'submodule', 'status'], cwd=repo_dir, check=True,
                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
                                 timeout=5, universal_newlines=True).stdout
         
-        # 返回原始目录
-        os.chdir(original_dir)
-        
         # 检查是否有未初始化的子模块 ('-' 开头表示未初始化)
-        needs_init = any(line.strip().startswith('-') for line in submodule_status.split('\n') if line.strip())
+        needs_init = any(line.startswith('-') for line in map(str.lstrip, submodule_status.splitlines()))
         
+        _submodule_status_cache[cache_key] = not needs_init
         if needs_init:
             logger.info("检测到未初始化的子模块")
             return False
@@ -77,14 +239,141 @@ def check_submodules_initialized(repo_dir, verbose=False):
             return True
             
     except Exception as e:
-        # 确保恢复原始目录
-        if 'original_dir' in locals():
-            os.chdir(original_dir)
         logger.warning(f"检查子模块状态时出错: {e}")
         # 出错时保守起见返回False，建议初始化
         return False
 
-def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, timeout=180, cache_dir=None, use_cache=True):
+def _materialize_from_cache(cache_repo_path, target_dir, verbose=False):
+    """从缓存仓库生成目标目录
+    
+    没有子模块的仓库通过git worktree检出，与缓存共享对象存储，只写出工作区文件；
+    有子模块的仓库(worktree不共享子模块，需要重新联网获取)或旧版Git不支持worktree时复制整个仓库
+    
+    Args:
+        cache_repo_path (str): 缓存仓库路径
+        target_dir (str): 目标目录
+        verbose (bool): 是否显示详细输出
+    """
+    if _supports_worktree() and not os.path.exists(os.path.join(cache_repo_path, '.gitmodules')):
+        try:
+            # 清理已被删除的目标目录留下的worktree记录
+            subprocess.run(['git', '-C', cache_repo_path, 'worktree', 'prune'],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            subprocess.run(['git', '-C', cache_repo_path, 'worktree', 'add', '--detach', '--force',
+                           target_dir, 'HEAD'], check=True,
+                          **(_LOUD if verbose else _QUIET))
+            logger.info(f"使用git worktree从缓存检出: {target_dir}")
+            return
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning(f"git worktree检出失败，改为复制缓存仓库: {e}")
+            if os.path.exists(target_dir):
+                _fast_rmtree(target_dir)
+    
+    # 使用文件复制实现克隆
+    reflink_copytree(cache_repo_path, target_dir)
+
+def _ensure_submodules(target_dir, repo_url, verbose=False, timeout=None, jobs=None):
+    """确保仓库的子模块已初始化，未初始化时一次性初始化并更新
+    
+    Args:
+        target_dir (str): Git仓库目录
+        repo_url (str): 仓库URL，重新克隆时使用
+        verbose (bool): 是否显示详细输出
+        timeout (int): 命令超时时间(秒)
+        jobs (int): 并行获取子模块的数量
+    """
+    try:
+        # 检查子模块是否已经初始化
+        if check_submodules_initialized(target_dir, verbose):
+            logger.info("子模块已完全初始化，跳过重复初始化")
+        else:
+            logger.info("初始化和更新子模块")
+            _update_submodules(target_dir, verbose, timeout=timeout, jobs=jobs)
+    except Exception as e:
+        logger.warning(f"子模块更新失败，将执行递归克隆: {e}")
+        
+        # 如果子模块更新失败，清除目录并执行一次完整的网络克隆
+        if os.path.exists(target_dir):
+            _fast_rmtree(target_dir)
+        _invalidate_submodule_cache(target_dir)
+        
+        subprocess.run(_build_clone_argv(repo_url, target_dir, jobs=jobs), check=True,
+                      **(_LOUD if verbose else _QUIET),
+                      timeout=timeout)
+
+def _cache_fetch_marker(cache_repo_path):
+    """获取记录缓存仓库最近一次联网更新时间的标记文件路径
+    
+    标记文件放在.git目录内，不会出现在工作区，也不会被复制到目标目录
+    
+    Args:
+        cache_repo_path (str): 缓存仓库路径
+        
+    Returns:
+        str: 标记文件路径
+    """
+    return os.path.join(cache_repo_path, '.git', 'modsec_last_fetch')
+
+def _mark_cache_fetched(cache_repo_path):
+    """记录缓存仓库刚从远程更新过
+    
+    Args:
+        cache_repo_path (str): 缓存仓库路径
+    """
+    try:
+        with open(_cache_fetch_marker(cache_repo_path), 'a'):
+            pass
+        os.utime(_cache_fetch_marker(cache_repo_path), None)
+    except OSError as e:
+        logger.debug(f"记录缓存更新时间失败: {e}")
+
+def _cache_recently_fetched(cache_repo_path, cache_ttl):
+    """判断缓存仓库距上次联网更新是否未超过cache_ttl秒
+    
+    Args:
+        cache_repo_path (str): 缓存仓库路径
+        cache_ttl (int): 缓存有效期(秒)
+        
+    Returns:
+        bool: 缓存仍然新鲜时返回True
+    """
+    try:
+        return time.time() - os.path.getmtime(_cache_fetch_marker(cache_repo_path)) < cache_ttl
+    except OSError:
+        return False
+
+def _backup_to_cache(target_dir, cache_repo_path, repo_url, verbose=False):
+    """将已克隆的仓库备份到缓存
+    
+    完整克隆且没有子模块的仓库使用git clone --local生成缓存，同一文件系统上对象文件以硬链接共享；
+    浅克隆仓库(git会忽略--local并退化为普通传输，不会硬链接)、有子模块的仓库(本地克隆不会带上已初始化的子模块)
+    或本地克隆失败时复制整个仓库，复制时支持reflink的文件系统会共享数据块
+    
+    Args:
+        target_dir (str): 已克隆的仓库目录
+        cache_repo_path (str): 缓存仓库路径
+        repo_url (str): 仓库原始URL，用于恢复缓存仓库的origin
+        verbose (bool): 是否显示详细输出
+    """
+    is_shallow = os.path.exists(os.path.join(target_dir, '.git', 'shallow'))
+    if not is_shallow and not os.path.exists(os.path.join(target_dir, '.gitmodules')):
+        try:
+            subprocess.run(['git', 'clone', '--local', '--', target_dir, cache_repo_path], check=True,
+                          **(_LOUD if verbose else _QUIET))
+            # 本地克隆的origin指向目标目录，改回原始URL以便后续联网更新缓存
+            subprocess.run(['git', 'remote', 'set-url', 'origin', repo_url], cwd=cache_repo_path, check=True,
+                          **_QUIET)
+            _mark_cache_fetched(cache_repo_path)
+            return
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning(f"本地克隆到缓存失败，改为复制仓库: {e}")
+            if os.path.exists(cache_repo_path):
+                _fast_rmtree(cache_repo_path)
+    reflink_copytree(target_dir, cache_repo_path)
+    _mark_cache_fetched(cache_repo_path)
+
+def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, timeout=180, cache_dir=None, use_cache=True,
+                   jobs=None, cache_ttl=3600):
     """从 Git 仓库克隆代码，支持缓存系统
     
     Args:
@@ -96,6 +385,8 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
         timeout (int): 命令超时时间(秒)
         cache_dir (str): 缓存目录，如为None则使用默认缓存目录
         use_cache (bool): 是否使用缓存，默认为是
+        jobs (int): 并行获取子模块的数量，默认为CPU核数
+        cache_ttl (int): 缓存有效期(秒)，距上次联网更新未超过该时间时直接使用缓存，不再联网更新
         
     Returns:
         bool: 是否成功克隆
@@ -104,7 +395,9 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
         # 如果目录已存在则移除
         if os.path.exists(target_dir):
             logger.info(f"目录已存在，清除: {target_dir}")
-            shutil.rmtree(target_dir)
+            _fast_rmtree(target_dir)
+        # 目标目录将被重新生成，之前的子模块检查结果不再有效
+        _invalidate_submodule_cache(target_dir)
         
         # 检查是否可以使用缓存
         if _cache_support and use_cache:
@@ -120,26 +413,24 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
                 
                 # 更新缓存仓库
                 try:
-                    original_dir = os.getcwd()
-                    os.chdir(cache_repo_path)
-                    
-                    # 重置以避免本地修改冲突
-                    subprocess.run("git reset --hard HEAD", shell=True, check=True,
-                                  stdout=subprocess.PIPE if not verbose else None,
-                                  stderr=subprocess.PIPE if not verbose else None)
-                    
-                    # 尝试更新仓库，如果失败也不中断
-                    try:
-                        logger.info("尝试更新缓存仓库...")
-                        subprocess.run("git pull", shell=True, check=True,
-                                     stdout=subprocess.PIPE if not verbose else None,
-                                     stderr=subprocess.PIPE if not verbose else None,
-                                     timeout=30)
-                    except Exception as e:
-                        logger.warning(f"更新缓存仓库失败，使用现有缓存: {e}")
+                    # 只获取最新提交并直接重置到该提交，同时丢弃本地修改，避免git pull的合并流程
+                    reset_target = 'HEAD'
+                    if _cache_recently_fetched(cache_repo_path, cache_ttl):
+                        logger.info(f"缓存仓库在{cache_ttl}秒内已更新，跳过联网更新")
+                    else:
+                        try:
+                            logger.info("尝试更新缓存仓库...")
+                            subprocess.run(['git', 'fetch', '--depth=1', 'origin', branch or 'HEAD'], check=True,
+                                         cwd=cache_repo_path,
+                                         **(_LOUD if verbose else _QUIET),
+                                         timeout=30)
+                            reset_target = 'FETCH_HEAD'
+                            _mark_cache_fetched(cache_repo_path)
+                        except Exception as e:
+                            logger.warning(f"更新缓存仓库失败，使用现有缓存: {e}")
                     
-                    # 返回到原始目录
-                    os.chdir(original_dir)
+                    subprocess.run(['git', 'reset', '--hard', reset_target], check=True, cwd=cache_repo_path,
+                                  **(_LOUD if verbose else _QUIET))
                     
                     # 从缓存复制到目标目录
                     logger.info(f"从缓存复制到目标目录: {target_dir}")
@@ -147,53 +438,15 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
                     # 创建目标目录的父目录
                     os.makedirs(os.path.dirname(target_dir), exist_ok=True)
                     
-                    # 浅克隆仓库不支持 --local 参数，所以使用文件复制然后更新子模块
-                    logger.info(f"使用直接文件复制写入缓存目录")
-                    
                     # 先清除目标目录
                     if os.path.exists(target_dir):
-                        shutil.rmtree(target_dir)
+                        _fast_rmtree(target_dir)
                         
-                    # 使用文件复制实现克隆
-                    shutil.copytree(cache_repo_path, target_dir, symlinks=True)
+                    # 从缓存仓库生成目标目录
+                    _materialize_from_cache(cache_repo_path, target_dir, verbose)
                     
                     # 检查子模块状态并智能决定是否需要初始化
-                    try:
-                        # 切换到克隆目录
-                        original_dir = os.getcwd()
-                        os.chdir(target_dir)
-                        
-                        # 检查子模块是否已经初始化
-                        if check_submodules_initialized(target_dir, verbose):
-                            logger.info("缓存中的子模块已完全初始化，跳过重复初始化")
-                        else:
-                            # 需要初始化子模块
-                            logger.info(f"初始化和更新子模块")
-                            subprocess.run("git submodule init", shell=True, check=True,
-                                        stdout=subprocess.PIPE if not verbose else None,
-                                        stderr=subprocess.PIPE if not verbose else None)
-                            subprocess.run("git submodule update", shell=True, check=True,
-                                        stdout=subprocess.PIPE if not verbose else None,
-                                        stderr=subprocess.PIPE if not verbose else None)
-                        
-                        # 返回原始目录
-                        os.chdir(original_dir)
-                    except Exception as e:
-                        logger.warning(f"子模块更新失败，将执行递归克隆: {e}")
-                        # 返回原始目录
-                        if 'original_dir' in locals():
-                            os.chdir(original_dir)
-                        
-                        # 如果子模块更新失败，清除目录并执行一次完整的网络克隆
-                        if os.path.exists(target_dir):
-                            shutil.rmtree(target_dir)
-                        
-                        # 执行递归克隆
-                        clone_cmd = f"git clone --recursive {repo_url} {target_dir}"
-                        subprocess.run(clone_cmd, shell=True, check=True,
-                                    stdout=subprocess.PIPE if not verbose else None,
-                                    stderr=subprocess.PIPE if not verbose else None,
-                                    timeout=timeout)
+                    _ensure_submodules(target_dir, repo_url, verbose, timeout, jobs=jobs)
                     
                     # 检查是否成功
                     if os.path.exists(os.path.join(target_dir, '.git')):
@@ -210,18 +463,15 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
                 os.makedirs(os.path.dirname(cache_repo_path), exist_ok=True)
                 
                 # 克隆到缓存目录，递归克隆所有子模块
-                cache_cmd = f"git clone --recursive --depth={depth}"
-                if branch:
-                    cache_cmd += f" -b {branch}"
-                cache_cmd += f" {repo_url} {cache_repo_path}"
+                cache_cmd = _build_clone_argv(repo_url, cache_repo_path, depth, branch, jobs=jobs)
                 
                 try:
                     # 克隆到缓存目录
                     logger.info(f"先克隆到缓存目录: {cache_repo_path}")
-                    subprocess.run(cache_cmd, shell=True, check=True,
-                                stdout=subprocess.PIPE if not verbose else None,
-                                stderr=subprocess.PIPE if not verbose else None,
+                    subprocess.run(cache_cmd, check=True,
+                                **(_LOUD if verbose else _QUIET),
                                 timeout=timeout)
+                    _mark_cache_fetched(cache_repo_path)
                     
                     # 从缓存中复制到目标目录
                     logger.info(f"从缓存复制到目标目录: {target_dir}")
@@ -232,48 +482,13 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
                     
                     # 先清除目标目录
                     if os.path.exists(target_dir):
-                        shutil.rmtree(target_dir)
+                        _fast_rmtree(target_dir)
                         
-                    # 使用文件复制实现克隆
-                    shutil.copytree(cache_repo_path, target_dir, symlinks=True)
+                    # 从缓存仓库生成目标目录
+                    _materialize_from_cache(cache_repo_path, target_dir, verbose)
                     
                     # 检查子模块状态并智能决定是否需要初始化
-                    try:
-                        # 切换到克隆目录
-                        original_dir = os.getcwd()
-                        os.chdir(target_dir)
-                        
-                        # 检查子模块是否已经初始化
-                        if check_submodules_initialized(target_dir, verbose):
-                            logger.info("缓存中的子模块已完全初始化，跳过重复初始化")
-                        else:
-                            # 需要初始化子模块
-                            logger.info(f"初始化和更新子模块")
-                            subprocess.run("git submodule init", shell=True, check=True,
-                                        stdout=subprocess.PIPE if not verbose else None,
-                                        stderr=subprocess.PIPE if not verbose else None)
-                            subprocess.run("git submodule update", shell=True, check=True,
-                                        stdout=subprocess.PIPE if not verbose else None,
-                                        stderr=subprocess.PIPE if not verbose else None)
-                        
-                        # 返回原始目录
-                        os.chdir(original_dir)
-                    except Exception as e:
-                        logger.warning(f"子模块更新失败，将执行递归克隆: {e}")
-                        # 返回原始目录
-                        if 'original_dir' in locals():
-                            os.chdir(original_dir)
-                        
-                        # 如果子模块更新失败，清除目录并执行一次完整的网络克隆
-                        if os.path.exists(target_dir):
-                            shutil.rmtree(target_dir)
-                        
-                        # 执行递归克隆
-                        clone_cmd = f"git clone --recursive {repo_url} {target_dir}"
-                        subprocess.run(clone_cmd, shell=True, check=True,
-                                    stdout=subprocess.PIPE if not verbose else None,
-                                    stderr=subprocess.PIPE if not verbose else None,
-                                    timeout=timeout)
+                    _ensure_submodules(target_dir, repo_url, verbose, timeout, jobs=jobs)
                     
                     # 检查是否成功
                     if os.path.exists(os.path.join(target_dir, '.git')):
@@ -286,47 +501,16 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
                     # 如果创建缓存失败，继续使用普通方式克隆
         
         # 如果缓存不可用或者缓存操作失败，执行普通克隆，并递归克隆子模块
-        cmd = f"git clone --recursive --depth={depth}"
-        if branch:
-            cmd += f" -b {branch}"
-        cmd += f" {repo_url} {target_dir}"
+        cmd = _build_clone_argv(repo_url, target_dir, depth, branch, jobs=jobs)
         
         logger.info(f"从 {repo_url} 直接克隆到 {target_dir}")
         
         # 执行克隆命令
-        subprocess.run(cmd, shell=True, check=True,
-                     stdout=subprocess.PIPE if not verbose else None,
-                     stderr=subprocess.PIPE if not verbose else None,
+        subprocess.run(cmd, check=True,
+                     **(_LOUD if verbose else _QUIET),
                      timeout=timeout)
+        # git clone --recursive成功返回(check=True)即表示子模块已初始化和更新，无需再次检查
         
-        # 就算使用 --recursive 参数，也显式执行子模块初始化和更新
-        # 这样可以确保子模块正确初始化
-        try:
-            # 切换到克隆目录
-            original_dir = os.getcwd()
-            os.chdir(target_dir)
-            
-            # 检查子模块是否已经初始化
-            if check_submodules_initialized(target_dir, verbose):
-                logger.info("子模块已完全初始化，跳过重复初始化")
-            else:
-                # 更新子模块
-                logger.info(f"显式初始化和更新子模块")
-                subprocess.run("git submodule init", shell=True, check=True,
-                            stdout=subprocess.PIPE if not verbose else None,
-                            stderr=subprocess.PIPE if not verbose else None)
-                subprocess.run("git submodule update", shell=True, check=True,
-                            stdout=subprocess.PIPE if not verbose else None,
-                            stderr=subprocess.PIPE if not verbose else None)
-            
-            # 返回原始目录
-            os.chdir(original_dir)
-        except Exception as e:
-            logger.warning(f"子模块更新失败: {e}")
-            # 返回原始目录
-            if 'original_dir' in locals():
-                os.chdir(original_dir)
-                
         # 如果启用了缓存，将已克隆和初始化子模块的仓库备份到缓存
         if _cache_support and use_cache and os.path.exists(target_dir) and os.path.exists(os.path.join(target_dir, '.git')):
             try:
@@ -335,14 +519,14 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
                 # 如果缓存已存在，先删除
                 if os.path.exists(cache_repo_path):
                     logger.info(f"更新现有缓存: {cache_repo_path}")
-                    shutil.rmtree(cache_repo_path)
+                    _fast_rmtree(cache_repo_path)
                 
                 # 创建缓存目录的父目录
                 os.makedirs(os.path.dirname(cache_repo_path), exist_ok=True)
                 
-                # 将已初始化子模块的仓库复制到缓存
+                # 将已初始化子模块的仓库备份到缓存
                 logger.info(f"将已初始化的仓库备份到缓存: {cache_repo_path}")
-                shutil.copytree(target_dir, cache_repo_path, symlinks=True)
+                _backup_to_cache(target_dir, cache_repo_path, repo_url, verbose)
             except Exception as e:
                 logger.warning(f"备份到缓存失败: {e}")
         
@@ -364,7 +548,7 @@ def clone_git_repo(repo_url, target_dir, verbose=False, depth=2, branch=None, ti
         logger.error(f"克隆仓库时发生未知错误: {e}")
         return False
 
-def init_git_submodules(repo_dir, verbose=False, timeout=180, retry=2, use_cache=True, cache_dir=None):
+def init_git_submodules(repo_dir, verbose=False, timeout=180, retry=2, use_cache=True, cache_dir=None, jobs=None):
     """初始化并更新Git子模块，支持缓存
     
     Args:
@@ -374,6 +558,7 @@ def init_git_submodules(repo_dir, verbose=False, timeout=180, retry=2, use_cache
         retry (int): 失败重试次数
         use_cache (bool): 是否使用缓存
         cache_dir (str): 缓存目录路径，如为None则使用默认目录
+        jobs (int): 并行获取子模块的数量，默认为CPU核数
         
     Returns:
         bool: 是否成功初始化
@@ -393,19 +578,8 @@ def init_git_submodules(repo_dir, verbose=False, timeout=180, retry=2, use_cache
         # 尝试多次，因为子模块可能较多
         for attempt in range(retry + 1):
             try:
-                # 初始化子模块
-                init_cmd = f"cd {repo_dir} && git submodule init"
-                subprocess.run(init_cmd, shell=True, check=True, 
-                              stdout=subprocess.PIPE if not verbose else None, 
-                              stderr=subprocess.PIPE if not verbose else None,
-                              timeout=timeout)
-                
-                # 更新子模块
-                update_cmd = f"cd {repo_dir} && git submodule update"
-                subprocess.run(update_cmd, shell=True, check=True, 
-                              stdout=subprocess.PIPE if not verbose else None, 
-                              stderr=subprocess.PIPE if not verbose else None,
-                              timeout=timeout)
+                # 初始化并并行更新子模块
+                _update_submodules(repo_dir, verbose, timeout=timeout, jobs=jobs)
                 
                 logger.info("成功初始化和更新Git子模块")
                 return True
@@ -429,10 +603,42 @@ def init_git_submodules(repo_dir, verbose=False, timeout=180, retry=2, use_cache
         logger.error(f"初始化Git子模块时发生未知错误: {e}")
         return False
 
-def try_alternate_repo(primary_url, fallback_url, target_dir, verbose=False, cache_dir=None, use_cache=True):
+def _race_clone(primary_url, fallback_url, target_dir, verbose=False, head_start=ALTERNATE_REPO_HEAD_START, depth=2):
+    """同时从主要仓库和备用仓库克隆，采用先完成的结果
+    
+    主要仓库先行克隆，head_start秒内未成功则同时开始克隆备用仓库；
+    两者分别克隆到临时目录，成功者改名为目标目录，落选者完成后在后台删除
+    
+    Args:
+        primary_url (str): 主要仓库URL
+        fallback_url (str): 备用仓库URL
+        target_dir (str): 目标目录
+        verbose (bool): 是否显示详细输出
+        head_start (int): 主要仓库先行的秒数
+        depth (int): Git克隆深度
+        
+    Returns:
+        str: 克隆成功的仓库URL，均失败时返回None
+    """
+    attempts = [
+        (url, scratch, functools.partial(clone_git_repo, url, scratch, verbose, depth=depth, use_cache=False))
+        for url, scratch in ((primary_url, f"{target_dir}.primary"), (fallback_url, f"{target_dir}.fallback"))
+    ]
+    winner = race_fetch(attempts, head_start, discard=_fast_rmtree)
+    
+    if winner is None:
+        return None
+    if os.path.exists(target_dir):
+        _fast_rmtree(target_dir)
+    os.rename(winner[1], target_dir)
+    return winner[0]
+
+def try_alternate_repo(primary_url, fallback_url, target_dir, verbose=False, cache_dir=None, use_cache=True,
+                       depth=2, parallel_fallback=True):
     """先尝试主要仓库，失败时使用备用仓库
     
-    特别适合中国环境：先尝试Gitee，失败后使用GitHub
+    特别适合中国环境：先尝试Gitee，失败后使用GitHub。
+    已有缓存或parallel_fallback为False时依次尝试；否则主要仓库先行，一段时间内未成功则与备用仓库同时克隆
     
     Args:
         primary_url (str): 主要仓库URL (通常是Gitee)
@@ -441,23 +647,49 @@ def try_alternate_repo(primary_url, fallback_url, target_dir, verbose=False, cac
         verbose (bool): 是否显示详细输出
         cache_dir (str): 缓存目录，如为None则使用默认缓存目录
         use_cache (bool): 是否使用缓存
+        depth (int): Git克隆深度，不需要历史记录的仓库可传入1
+        parallel_fallback (bool): 没有缓存时是否与备用仓库竞速克隆
         
     Returns:
         bool: 是否成功克隆
     """
-    logger.info(f"尝试从主要仓库克隆: {primary_url}")
-    success = clone_git_repo(primary_url, target_dir, verbose, cache_dir=cache_dir, use_cache=use_cache)
+    cache_repo_path = None
+    if _cache_support and use_cache:
+        if cache_dir is None:
+            cache_dir = DEFAULT_CACHE_DIR
+        cache_repo_path = get_git_cache_path(cache_dir, primary_url)
     
-    if not success:
-        logger.warning(f"从主要仓库克隆失败，尝试备用仓库: {fallback_url}")
-        success = clone_git_repo(fallback_url, target_dir, verbose, cache_dir=cache_dir, use_cache=use_cache)
+    if not parallel_fallback or cache_repo_path is None or os.path.exists(cache_repo_path):
+        logger.info(f"尝试从主要仓库克隆: {primary_url}")
+        success = clone_git_repo(primary_url, target_dir, verbose, depth=depth, cache_dir=cache_dir,
+                                 use_cache=use_cache)
         
-        if success:
-            logger.info(f"从备用仓库克隆成功: {fallback_url}")
-        else:
-            logger.error("所有仓库克隆尝试均失败")
+        if not success:
+            logger.warning(f"从主要仓库克隆失败，尝试备用仓库: {fallback_url}")
+            success = clone_git_repo(fallback_url, target_dir, verbose, depth=depth, cache_dir=cache_dir,
+                                     use_cache=use_cache)
             
-    return success
+            if success:
+                logger.info(f"从备用仓库克隆成功: {fallback_url}")
+            else:
+                logger.error("所有仓库克隆尝试均失败")
+                
+        return success
+    
+    logger.info(f"尝试从主要仓库克隆: {primary_url}")
+    winner = _race_clone(primary_url, fallback_url, target_dir, verbose, depth=depth)
+    if winner is None:
+        logger.error("所有仓库克隆尝试均失败")
+        return False
+    logger.info(f"从仓库克隆成功: {winner}")
+    
+    # 将克隆结果备份到缓存，下次直接使用缓存
+    try:
+        os.makedirs(os.path.dirname(cache_repo_path), exist_ok=True)
+        _backup_to_cache(target_dir, cache_repo_path, winner, verbose)
+    except Exception as e:
+        logger.warning(f"备份到缓存失败: {e}")
+    return True
 
 # 测试函数
 if __name__ == "__main__":
@@ -11,25 +11,277 @@ import logging
 import shutil
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # 导入相关模块
 try:
-    from modules.system_detector import check_gcc_version
+    from modules.system_detector import check_gcc_version, get_build_jobs
     from modules.git_manager import clone_git_repo, init_git_submodules, try_alternate_repo
-    from modules.constants import MODSEC_VERSION, GIT_REPOS
+    from modules.dependency_installer import YUM_CMD
+    from modules.constants import MODSEC_VERSION, GIT_REPOS, DEFAULT_CACHE_DIR
 except ImportError as e:
     logging.error(f"导入模块时出错: {e}")
     sys.exit(1)
 
 logger = logging.getLogger('modsecurity_installer')
 
-def build_modsecurity(build_dir, verbose=False, max_retries=2):
+# 非详细模式下构建命令(autogen/configure/make)的输出直接丢弃，不在内存中缓存数MB的编译日志，
+# 需要查看时使用--verbose重新运行
+_QUIET = {'stdout': subprocess.DEVNULL, 'stderr': subprocess.DEVNULL}
+_LOUD = {}
+
+DEVTOOLSET7_GCC = '/opt/rh/devtoolset-7/root/usr/bin/gcc'
+
+@lru_cache(maxsize=1)
+def _detect_centos7():
+    """检测是否为CentOS 7系统，结果在进程内缓存
+    
+    Returns:
+        bool: 是否为CentOS 7
+    """
+    try:
+        with open('/etc/centos-release', 'r') as f:
+            release_info = f.read().strip().lower()
+        return 'centos' in release_info and '7.' in release_info
+    except OSError:
+        return False
+
+@lru_cache(maxsize=1)
+def _detect_devtoolset7():
+    """检测devtoolset-7的GCC是否可用，安装devtoolset-7后需调用cache_clear()重新检测
+    
+    Returns:
+        bool: devtoolset-7是否可用
+    """
+    return os.path.exists(DEVTOOLSET7_GCC)
+
+@lru_cache(maxsize=1)
+def _query_libmaxminddb_version():
+    """查询已安装的libmaxminddb及其开发包版本，安装或更新后需调用cache_clear()重新查询
+    
+    Returns:
+        str: rpm -q输出的已安装包名和版本(每行一个)，均未安装时返回空字符串
+    """
+    try:
+        result = subprocess.run(['rpm', '-q', 'libmaxminddb', 'libmaxminddb-devel'],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                universal_newlines=True)
+    except OSError:
+        return ""
+    # 任一包未安装时rpm -q返回非零并输出"package ... is not installed"，
+    # 但已安装包的版本仍会输出，因此按行过滤而不依赖返回码
+    installed = [line.strip() for line in result.stdout.splitlines()
+                 if line.strip() and 'is not installed' not in line]
+    return "\n".join(installed)
+
+def _toolchain_cmd(argv, use_devtoolset):
+    """需要使用devtoolset-7时在命令前加上scl enable前缀
+    
+    Args:
+        argv (list): 命令及参数
+        use_devtoolset (bool): 是否通过devtoolset-7运行
+        
+    Returns:
+        list: 实际执行的命令及参数
+    """
+    if use_devtoolset:
+        return ['scl', 'enable', 'devtoolset-7', '--'] + argv
+    return argv
+
+def _run_autoreconf(src_dir, verbose=False):
+    """从configure.ac生成构建系统
+    
+    优先使用autoreconf -fi在一个进程内完成aclocal/autoconf/automake，
+    系统没有autoreconf时逐个运行这三个命令
+    
+    Args:
+        src_dir (str): 包含configure.ac的目录
+        verbose (bool): 是否输出详细信息
+        
+    Raises:
+        subprocess.CalledProcessError: 命令执行失败
+    """
+    if shutil.which('autoreconf'):
+        cmds = [['autoreconf', '-fi']]
+    else:
+        cmds = [['aclocal'], ['autoconf'], ['automake', '--add-missing']]
+    for cmd in cmds:
+        subprocess.run(cmd, check=True, cwd=src_dir, **(_LOUD if verbose else _QUIET))
+
+def _ccache_env(cache_dir=None):
+    """生成编译使用的环境变量，系统安装了ccache时通过ccache调用编译器
+    
+    ccache按源文件和编译参数缓存目标文件，重试编译或重新安装时可直接复用
+    
+    Args:
+        cache_dir (str): 缓存根目录，ccache缓存放在其下的ccache目录，如为None则使用默认目录
+        
+    Returns:
+        dict: 编译命令使用的环境变量
+    """
+    env = os.environ.copy()
+    if not shutil.which('ccache'):
+        return env
+    
+    ccache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, 'ccache')
+    try:
+        os.makedirs(ccache_dir, exist_ok=True)
+        env.update(CC='ccache gcc', CXX='ccache g++', CCACHE_DIR=ccache_dir)
+        # 限制缓存大小
+        subprocess.run(['ccache', '-M', '2G'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        logger.info(f"使用ccache编译缓存: {ccache_dir}")
+    except OSError as e:
+        logger.warning(f"启用ccache失败，使用普通编译: {e}")
+        env = os.environ.copy()
+    return env
+
+def _yum_install(packages):
+    """在一个yum事务中安装多个软件包，整体失败时再逐个安装
+    
+    Args:
+        packages (list): 软件包列表
+        
+    Returns:
+        set: 安装失败的软件包
+    """
+    try:
+        subprocess.run(YUM_CMD + ['install', '-y'] + packages, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        return set()
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.warning(f"批量安装 {' '.join(packages)} 失败，改为逐个安装: {e}")
+    
+    failed = set()
+    for package in packages:
+        try:
+            subprocess.run(YUM_CMD + ['install', '-y', package], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.error(f"安装 {package} 失败: {e}")
+            failed.add(package)
+    return failed
+
+BUILD_STATE_FILE = '.build_state'
+# 构建成功标记，内容为libmodsecurity.so的修改时间
+BUILD_OK_FILE = '.modsec_build_ok'
+
+def _so_mtime(so_path):
+    """获取libmodsecurity.so的修改时间
+    
+    Args:
+        so_path (str): libmodsecurity.so路径
+        
+    Returns:
+        int: 修改时间(秒)，文件不存在时返回None
+    """
+    try:
+        return int(os.stat(so_path).st_mtime)
+    except OSError:
+        return None
+
+def _build_ok(build_dir, so_path):
+    """检查构建成功标记是否与当前的libmodsecurity.so一致
+    
+    Args:
+        build_dir (str): 构建目录
+        so_path (str): libmodsecurity.so路径
+        
+    Returns:
+        bool: 之前已成功构建且产物未变化时返回True
+    """
+    try:
+        with open(os.path.join(build_dir, BUILD_OK_FILE), 'r') as f:
+            recorded = f.read().strip()
+    except OSError:
+        return False
+    mtime = _so_mtime(so_path)
+    return mtime is not None and recorded == str(mtime)
+
+def _mark_build_ok(build_dir, mtime):
+    """写入构建成功标记
+    
+    Args:
+        build_dir (str): 构建目录
+        mtime (int): libmodsecurity.so的修改时间
+    """
+    try:
+        with open(os.path.join(build_dir, BUILD_OK_FILE), 'w') as f:
+            f.write(str(mtime))
+    except OSError as e:
+        logger.debug(f"写入构建成功标记失败: {e}")
+
+def _read_build_state(build_dir):
+    """读取构建目录中记录的最近一次成功完成的构建步骤
+    
+    Args:
+        build_dir (str): 构建目录
+        
+    Returns:
+        str: 'autogen'、'configure'或'make'，没有记录或对应产物已失效时返回None
+    """
+    try:
+        with open(os.path.join(build_dir, BUILD_STATE_FILE), 'r') as f:
+            state = f.read().strip()
+    except OSError:
+        return None
+    # 记录的步骤完成后其产物(configure脚本或config.status)已被清理时，记录无效
+    required = 'configure' if state == 'autogen' else 'config.status'
+    if not os.path.exists(os.path.join(build_dir, required)):
+        return None
+    return state or None
+
+def _prep_build_system(build_dir, verbose=False):
+    """运行autogen.sh或build.sh生成构建系统，成功后记录构建状态
+    
+    只依赖主仓库的源文件，可以与子模块的获取同时进行
+    
+    Args:
+        build_dir (str): 构建目录
+        verbose (bool): 是否输出详细信息
+        
+    Returns:
+        bool: 是否成功生成构建系统
+    """
+    for script in ('autogen.sh', 'build.sh'):
+        if os.path.exists(os.path.join(build_dir, script)):
+            try:
+                logger.info(f"使用 ./{script} 生成构建系统")
+                subprocess.run([f"./{script}"], cwd=build_dir, check=True,
+                               **(_LOUD if verbose else _QUIET))
+                _write_build_state(build_dir, 'autogen')
+                return True
+            except (subprocess.CalledProcessError, OSError) as e:
+                logger.warning(f"预先生成构建系统失败，将在构建时重试: {e}")
+                return False
+    return False
+
+def _write_build_state(build_dir, phase):
+    """记录最近一次成功完成的构建步骤，phase为None时清除记录
+    
+    Args:
+        build_dir (str): 构建目录
+        phase (str): 'autogen'、'configure'、'make'或None
+    """
+    state_file = os.path.join(build_dir, BUILD_STATE_FILE)
+    try:
+        if phase is None:
+            if os.path.exists(state_file):
+                os.remove(state_file)
+        else:
+            with open(state_file, 'w') as f:
+                f.write(phase)
+    except OSError as e:
+        logger.debug(f"记录构建状态失败: {e}")
+
+def build_modsecurity(build_dir, verbose=False, max_retries=2, cache_dir=None):
     """构建ModSecurity核心库
     
     Args:
         build_dir (str): 构建目录
         verbose (bool): 是否输出详细信息
         max_retries (int): 最大重试次数
+        cache_dir (str): 缓存目录路径，用于存放ccache编译缓存，如为None则使用默认目录
         
     Returns:
         bool: 是否成功构建
@@ -40,73 +292,62 @@ def build_modsecurity(build_dir, verbose=False, max_retries=2):
             logger.error(f"构建目录不存在: {build_dir}")
             return False
         
-        # 切换到构建目录
-        os.chdir(build_dir)
+        # 之前已成功构建且产物未变化时直接返回，跳过所有环境检测
+        so_path = os.path.join(build_dir, 'src', '.libs', 'libmodsecurity.so')
+        if _build_ok(build_dir, so_path):
+            logger.info("ModSecurity已经构建完成，跳过构建步骤")
+            return True
         
         # 检查编译器版本及 CentOS 7 环境
-        is_centos7 = False
         devtoolset_available = False
         maxminddb_updated = False
         
         # 检查是否是 CentOS 7 环境
-        try:
-            if os.path.exists('/etc/centos-release'):
-                with open('/etc/centos-release', 'r') as f:
-                    release_info = f.read().strip().lower()
-                    if 'centos' in release_info and '7.' in release_info:
-                        is_centos7 = True
-                        logger.info("检测到 CentOS 7 环境")
+        is_centos7 = _detect_centos7()
+        if is_centos7:
+            logger.info("检测到 CentOS 7 环境")
             
             # 检查是否安装了 devtoolset-7
-            if is_centos7 and os.path.exists('/opt/rh/devtoolset-7/root/usr/bin/gcc'):
-                devtoolset_available = True
+            devtoolset_available = _detect_devtoolset7()
+            if devtoolset_available:
                 logger.info("检测到 devtoolset-7 可用，将使用 GCC 7 进行编译")
-        except Exception as e:
-            logger.warning(f"检测系统环境时出错: {e}")
         
-        # 如果是 CentOS 7 但没有 devtoolset-7，尝试安装
-        if is_centos7 and not devtoolset_available:
-            try:
+        # 在 CentOS 7 环境下安装 devtoolset-7(如缺少)并升级 libmaxminddb 库
+        if is_centos7:
+            # 查看当前安装的libmaxminddb版本
+            libmaxmind_current = _query_libmaxminddb_version()
+            if libmaxmind_current:
+                logger.info(f"当前安装的libmaxminddb版本: {libmaxmind_current}")
+            
+            # EPEL仓库提供更新的libmaxminddb，SCL仓库提供devtoolset-7
+            repo_packages = ['epel-release']
+            packages = ['libmaxminddb', 'libmaxminddb-devel']
+            if not devtoolset_available:
                 logger.warning("在 CentOS 7 上需要 GCC 7 及以上版本编译 ModSecurity")
                 logger.info("尝试安装 devtoolset-7...")
-                # 安装 SCL 和 devtoolset-7
-                subprocess.run("yum install -y centos-release-scl", shell=True, check=True,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                subprocess.run("yum install -y devtoolset-7-gcc devtoolset-7-gcc-c++", shell=True, check=True,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                if os.path.exists('/opt/rh/devtoolset-7/root/usr/bin/gcc'):
+                repo_packages.insert(0, 'centos-release-scl')
+                packages = ['devtoolset-7-gcc', 'devtoolset-7-gcc-c++'] + packages
+            
+            # 仓库包安装后才能从对应仓库解析软件包，因此分两次事务安装
+            logger.info("在CentOS 7上升级libmaxminddb库以解决兼容性问题...")
+            _yum_install(repo_packages)
+            failed = _yum_install(packages)
+            
+            if not devtoolset_available:
+                _detect_devtoolset7.cache_clear()
+                if _detect_devtoolset7():
                     devtoolset_available = True
+                    check_gcc_version.cache_clear()
                     logger.info("成功安装 devtoolset-7")
                 else:
                     logger.warning("无法安装 devtoolset-7，编译可能会失败")
-            except Exception as e:
-                logger.error(f"安装 devtoolset-7 失败: {e}")
-                
-        # 在 CentOS 7 环境下升级 libmaxminddb 库
-        if is_centos7:
-            try:
-                logger.info("在CentOS 7上升级libmaxminddb库以解决兼容性问题...")
-                
-                # 查看当前安装的libmaxminddb版本
-                version_check = subprocess.run("rpm -qa | grep libmaxminddb", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                libmaxmind_current = version_check.stdout.decode('utf-8').strip()
-                if libmaxmind_current:
-                    logger.info(f"当前安装的libmaxminddb版本: {libmaxmind_current}")
-                
-                # 安装EPEL仓库，它提供更新的libmaxminddb
-                logger.info("安装EPEL仓库...")
-                subprocess.run("yum install -y epel-release", shell=True, check=True,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                # 现在安装或更新libmaxminddb
-                logger.info("安装/更新libmaxminddb...")
-                subprocess.run("yum install -y libmaxminddb libmaxminddb-devel", shell=True, check=True,
-                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
+            
+            if failed.intersection(('libmaxminddb', 'libmaxminddb-devel')):
+                logger.warning("无法安装或更新libmaxminddb库")
+            else:
                 # 再次检查安装的版本
-                version_check = subprocess.run("rpm -qa | grep libmaxminddb", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                libmaxmind_new = version_check.stdout.decode('utf-8').strip()
+                _query_libmaxminddb_version.cache_clear()
+                libmaxmind_new = _query_libmaxminddb_version()
                 
                 if libmaxmind_new and (not libmaxmind_current or libmaxmind_new != libmaxmind_current):
                     logger.info(f"成功升级libmaxminddb至: {libmaxmind_new}")
@@ -117,9 +358,6 @@ def build_modsecurity(build_dir, verbose=False, max_retries=2):
                         maxminddb_updated = True
                     else:
                         logger.warning("无法安装或更新libmaxminddb库")
-                
-            except Exception as e:
-                logger.warning(f"升级libmaxminddb库失败: {e}")
         
         # 标准 GCC 版本检查
         gcc_version = check_gcc_version()
@@ -129,138 +367,134 @@ def build_modsecurity(build_dir, verbose=False, max_retries=2):
             logger.warning("无法检测GCC版本，构建可能会失败")
         
         # 检查是否已经编译过
-        if os.path.exists(os.path.join(build_dir, 'src', '.libs', 'libmodsecurity.so')):
+        so_mtime = _so_mtime(so_path)
+        if so_mtime is not None:
             logger.info("ModSecurity已经构建完成，跳过构建步骤")
+            _mark_build_ok(build_dir, so_mtime)
             return True
             
         logger.info("开始构建ModSecurity...")
+        build_env = _ccache_env(cache_dir)
+        use_devtoolset = is_centos7 and devtoolset_available
         
-        # 执行构建步骤
+        # 执行构建步骤，phase记录当前所处的步骤，失败后据此决定重试从哪一步开始
+        build_state = _read_build_state(build_dir)
+        resume_make = build_state in ('configure', 'make')
+        skip_autogen = build_state == 'autogen'
         for attempt in range(max_retries + 1):
+            phase = None
             try:
-                # 步骤1: 生成构建系统
-                logger.info("步骤1: 生成构建系统")
+                # 上次已成功配置(config.status存在)时直接从编译步骤继续，保留已编译的目标文件
+                if resume_make:
+                    logger.info("已完成配置，跳过构建系统生成和配置步骤，直接继续编译")
+                else:
+                    if skip_autogen:
+                        logger.info("构建系统已生成，跳过步骤1")
+                    else:
+                        # 步骤1: 生成构建系统
+                        phase = 'autogen'
+                        logger.info("步骤1: 生成构建系统")
                 
-                # 检测可用的构建系统脚本
-                build_scripts = [
-                    "./autogen.sh",  # 最常用的方式
-                    "./build.sh",    # 有些仓库使用build.sh
-                    "./configure.ac" # 如果存在configure.ac，可以手动生成
-                ]
+                        # 检测可用的构建系统脚本
+                        build_scripts = [
+                            "./autogen.sh",  # 最常用的方式
+                            "./build.sh",    # 有些仓库使用build.sh
+                            "./configure.ac" # 如果存在configure.ac，可以手动生成
+                        ]
                 
-                build_script = None
-                for script in build_scripts:
-                    if os.path.exists(script.replace("./", "")):
-                        build_script = script
-                        break
+                        build_script = None
+                        for script in build_scripts:
+                            if os.path.exists(os.path.join(build_dir, script.replace("./", ""))):
+                                build_script = script
+                                break
                 
-                if not build_script and os.path.exists("configure"):
-                    logger.info("找到预配置的configure脚本，跳过构建系统生成步骤")
-                    # 如果已经有configure脚本，可以直接跳过这一步骤
-                    pass
-                elif build_script == "./autogen.sh" or build_script == "./build.sh":
-                    logger.info(f"使用 {build_script} 生成构建系统")
-                    cmd = build_script
-                    subprocess.run(cmd, shell=True, check=True,
-                                  stdout=subprocess.PIPE if not verbose else None,
-                                  stderr=subprocess.PIPE if not verbose else None)
-                elif build_script == "./configure.ac":
-                    logger.info("使用autoconf/automake生成构建系统")
-                    # 如果只有configure.ac，需要手动运行autoconf
-                    cmds = [
-                        "aclocal",
-                        "autoconf",
-                        "automake --add-missing"
-                    ]
-                    for cmd in cmds:
-                        try:
-                            subprocess.run(cmd, shell=True, check=True,
-                                          stdout=subprocess.PIPE if not verbose else None,
-                                          stderr=subprocess.PIPE if not verbose else None)
-                        except subprocess.CalledProcessError:
-                            logger.warning(f"运行 {cmd} 失败，尝试继续")
-                else:
-                    logger.warning("未找到标准构建脚本，尝试直接运行configure")
-                    # 如果无法找到构建脚本，我们尝试直接运行configure
-                    if not os.path.exists("configure"):
-                        logger.error("无法找到configure脚本，尝试git子模块方式")
-                        # 尝试一个备用方案 - 用git子模块编译
-                        try:
-                            subprocess.run("git submodule init && git submodule update", shell=True, check=True,
-                                          stdout=subprocess.PIPE if not verbose else None,
-                                          stderr=subprocess.PIPE if not verbose else None)
-                            if os.path.exists("./bindings/autoconf/configure.ac"):
-                                os.chdir("./bindings/autoconf")
-                                subprocess.run("aclocal && autoconf && automake --add-missing", shell=True, check=True,
-                                              stdout=subprocess.PIPE if not verbose else None,
-                                              stderr=subprocess.PIPE if not verbose else None)
-                                os.chdir(build_dir)  # 返回原工作目录
-                            else:
-                                logger.error("构建系统初始化失败，无法找到构建脚本")
-                                return False
-                        except subprocess.CalledProcessError as e:
-                            logger.error(f"初始化git子模块失败: {e}")
-                            return False
+                        if not build_script and os.path.exists(os.path.join(build_dir, "configure")):
+                            logger.info("找到预配置的configure脚本，跳过构建系统生成步骤")
+                            # 如果已经有configure脚本，可以直接跳过这一步骤
+                            pass
+                        elif build_script == "./autogen.sh" or build_script == "./build.sh":
+                            logger.info(f"使用 {build_script} 生成构建系统")
+                            cmd = build_script
+                            subprocess.run(cmd, shell=True, check=True, cwd=build_dir,
+                                          **(_LOUD if verbose else _QUIET))
+                        elif build_script == "./configure.ac":
+                            logger.info("使用autoconf/automake生成构建系统")
+                            # 如果只有configure.ac，需要手动运行autoconf
+                            try:
+                                _run_autoreconf(build_dir, verbose)
+                            except subprocess.CalledProcessError as e:
+                                logger.warning(f"运行 {' '.join(e.cmd)} 失败，尝试继续")
+                        else:
+                            logger.warning("未找到标准构建脚本，尝试直接运行configure")
+                            # 如果无法找到构建脚本，我们尝试直接运行configure
+                            if not os.path.exists(os.path.join(build_dir, "configure")):
+                                logger.error("无法找到configure脚本，尝试git子模块方式")
+                                # 尝试一个备用方案 - 用git子模块编译
+                                try:
+                                    # 一次性初始化并并行更新子模块
+                                    if not init_git_submodules(build_dir, verbose=verbose, use_cache=False):
+                                        logger.error("初始化git子模块失败")
+                                        return False
+                                    autoconf_dir = os.path.join(build_dir, "bindings", "autoconf")
+                                    if os.path.exists(os.path.join(autoconf_dir, "configure.ac")):
+                                        _run_autoreconf(autoconf_dir, verbose)
+                                    else:
+                                        logger.error("构建系统初始化失败，无法找到构建脚本")
+                                        return False
+                                except subprocess.CalledProcessError as e:
+                                    logger.error(f"初始化git子模块失败: {e}")
+                                    return False
                 
-                # 步骤2: 配置
-                logger.info("步骤2: 配置构建选项")
+                    # 步骤2: 配置
+                    phase = 'configure'
+                    logger.info("步骤2: 配置构建选项")
                 
-                # 在CentOS 7环境下使用devtoolset-7
-                if is_centos7:
-                    # 如果成功升级了libmaxminddb，则不需要特殊编译选项
-                    if maxminddb_updated:
+                    # 在CentOS 7环境下使用devtoolset-7，libmaxminddb升级失败时添加-fpermissive编译选项作为备选方案
+                    configure_cmd = ['./configure']
+                    if is_centos7:
                         if devtoolset_available:
-                            logger.info("在CentOS 7环境下使用devtoolset-7进行编译，已升级libmaxminddb库")
-                            configure_cmd = "scl enable devtoolset-7 -- ./configure"
-                        else:
+                            logger.info("在CentOS 7环境下使用devtoolset-7进行编译")
+                        if maxminddb_updated:
                             logger.info("使用已升级的libmaxminddb库进行编译")
-                            configure_cmd = "./configure"
-                    # 如果升级失败，则使用-fpermissive编译选项作为备选方案
-                    else:
-                        if devtoolset_available:
-                            logger.info("在CentOS 7环境下使用devtoolset-7进行编译，并添加-fpermissive编译选项作为备选方案")
-                            configure_cmd = "scl enable devtoolset-7 -- ./configure CXXFLAGS=\"-fpermissive\" CFLAGS=\"-fpermissive\""
                         else:
                             logger.info("在CentOS 7环境下添加-fpermissive编译选项作为备选方案")
-                            configure_cmd = "./configure CXXFLAGS=\"-fpermissive\" CFLAGS=\"-fpermissive\""
-                else:
-                    configure_cmd = "./configure"
+                            configure_cmd += ['CXXFLAGS=-fpermissive', 'CFLAGS=-fpermissive']
+                    configure_cmd = _toolchain_cmd(configure_cmd, use_devtoolset)
                 
-                logger.info(f"运行配置命令: {configure_cmd}")
-                configure_process = subprocess.run(configure_cmd, shell=True, check=True, executable='/bin/bash',
-                                                 stdout=subprocess.PIPE if not verbose else None,
-                                                 stderr=subprocess.PIPE if not verbose else None)
+                    logger.info(f"运行配置命令: {' '.join(configure_cmd)}")
+                    configure_process = subprocess.run(configure_cmd, check=True, cwd=build_dir,
+                                                     env=build_env,
+                                                     **(_LOUD if verbose else _QUIET))
+                    _write_build_state(build_dir, 'configure')
                 
                 # 步骤3: 编译
+                phase = 'make'
                 logger.info("步骤3: 编译ModSecurity")
                 
                 # 在CentOS 7环境下使用devtoolset-7进行编译
-                if is_centos7 and devtoolset_available:
-                    make_cmd = "scl enable devtoolset-7 -- make -j$(nproc)"
-                else:
-                    make_cmd = "make -j$(nproc)"
-                    
-                logger.info(f"运行编译命令: {make_cmd}")
-                make_process = subprocess.run(make_cmd, shell=True, check=True, executable='/bin/bash',
-                                           stdout=subprocess.PIPE if not verbose else None,
-                                           stderr=subprocess.PIPE if not verbose else None)
+                make_cmd = _toolchain_cmd(['make', f"-j{get_build_jobs()}"], use_devtoolset)
+                
+                logger.info(f"运行编译命令: {' '.join(make_cmd)}")
+                make_process = subprocess.run(make_cmd, check=True, env=build_env, cwd=build_dir,
+                                           **(_LOUD if verbose else _QUIET))
                 
                 # 检查编译结果
-                if os.path.exists(os.path.join(build_dir, 'src', '.libs', 'libmodsecurity.so')):
+                so_mtime = _so_mtime(so_path)
+                if so_mtime is not None:
                     logger.info("ModSecurity成功编译")
+                    _write_build_state(build_dir, 'make')
+                    _mark_build_ok(build_dir, so_mtime)
                     return True
                 else:
                     logger.warning("编译过程完成，但未找到libmodsecurity.so文件")
                     if attempt < max_retries:
                         logger.info(f"尝试重新编译 (尝试 {attempt+1}/{max_retries+1})")
                         # 清理构建文件
-                        if is_centos7 and devtoolset_available:
-                            clean_cmd = "scl enable devtoolset-7 -- make clean"
-                        else:
-                            clean_cmd = "make clean"
-                            
-                        logger.info(f"运行清理命令: {clean_cmd}")
-                        subprocess.run(clean_cmd, shell=True, check=False, executable='/bin/bash')
+                        clean_cmd = _toolchain_cmd(['make', 'clean'], use_devtoolset)
+                        logger.info(f"运行清理命令: {' '.join(clean_cmd)}")
+                        subprocess.run(clean_cmd, check=False, cwd=build_dir)
+                        _write_build_state(build_dir, None)
+                        resume_make = skip_autogen = False
                         time.sleep(2)
                     else:
                         logger.error("所有编译尝试失败")
@@ -268,13 +502,19 @@ def build_modsecurity(build_dir, verbose=False, max_retries=2):
                 
             except subprocess.CalledProcessError as e:
                 logger.error(f"构建ModSecurity时出错: {e}")
-                if e.stderr:
-                    logger.debug(f"错误输出: {e.stderr.decode()}")
+                if not verbose:
+                    logger.info("使用 --verbose 重新运行可查看完整的构建输出")
                 
                 if attempt < max_retries:
                     logger.info(f"尝试重新构建 (尝试 {attempt+1}/{max_retries+1})")
-                    # 尝试清理并重新开始
-                    subprocess.run("make clean", shell=True, check=False)
+                    # 编译失败且配置有效时只需重新make，保留已编译的目标文件；配置失败时清理后重新开始
+                    resume_make = phase == 'make' and os.path.exists(os.path.join(build_dir, 'config.status'))
+                    skip_autogen = False
+                    if phase == 'configure':
+                        subprocess.run(_toolchain_cmd(['make', 'clean'], use_devtoolset), cwd=build_dir,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    if not resume_make:
+                        _write_build_state(build_dir, None)
                     time.sleep(2)
                 else:
                     logger.error("所有构建尝试失败")
@@ -308,27 +548,44 @@ def download_and_build_modsecurity(build_dir, verbose=False, use_gitee=True, use
         # ModSecurity目标目录
         modsec_dir = os.path.join(build_dir, "ModSecurity")
         
+        # 重新克隆会删除已有目录及其中的构建成功标记，因此在克隆前检查上次的构建是否仍然有效
+        so_path = os.path.join(modsec_dir, 'src', '.libs', 'libmodsecurity.so')
+        if _build_ok(modsec_dir, so_path):
+            logger.info("ModSecurity已经构建完成，跳过下载和构建步骤")
+            return True
+        
         # 确定要使用的存储库源
         repo_source = "gitee" if use_gitee else "github"
         
-        # 尝试从主仓库克隆
-        logger.info(f"尝试从{repo_source}克隆ModSecurity...")
-        main_repo_url = GIT_REPOS[repo_source]["modsecurity"]
-        fallback_repo_url = GIT_REPOS["github" if use_gitee else "gitee"]["modsecurity"]
-        
-        if not try_alternate_repo(main_repo_url, fallback_repo_url, modsec_dir, verbose, 
-                           cache_dir=cache_dir, use_cache=use_cache):
-            logger.error("无法克隆ModSecurity仓库，构建失败")
-            return False
+        # 上次构建中途退出时保留已有的源码树，build_modsecurity从记录的步骤继续，不重新克隆
+        resume = _read_build_state(modsec_dir) is not None
+        if resume:
+            logger.info(f"检测到未完成的构建，继续使用已有的源码: {modsec_dir}")
+        else:
+            # 尝试从主仓库克隆
+            logger.info(f"尝试从{repo_source}克隆ModSecurity...")
+            main_repo_url = GIT_REPOS[repo_source]["modsecurity"]
+            fallback_repo_url = GIT_REPOS["github" if use_gitee else "gitee"]["modsecurity"]
+            
+            if not try_alternate_repo(main_repo_url, fallback_repo_url, modsec_dir, verbose, 
+                               cache_dir=cache_dir, use_cache=use_cache):
+                logger.error("无法克隆ModSecurity仓库，构建失败")
+                return False
         
-        # 初始化子模块
+        # 初始化子模块，同时生成构建系统(autogen只需主仓库源文件，可与子模块的网络获取重叠)；
+        # 继续上次的构建时子模块已初始化则直接返回，构建系统也已生成
         logger.info("初始化ModSecurity子模块...")
-        if not init_git_submodules(modsec_dir, verbose=verbose, cache_dir=cache_dir, use_cache=use_cache):
-            logger.warning("无法初始化ModSecurity子模块，尝试继续构建")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            submodules_future = executor.submit(init_git_submodules, modsec_dir, verbose=verbose,
+                                                cache_dir=cache_dir, use_cache=use_cache)
+            if not resume:
+                executor.submit(_prep_build_system, modsec_dir, verbose)
+            if not submodules_future.result():
+                logger.warning("无法初始化ModSecurity子模块，尝试继续构建")
         
         # 构建ModSecurity
         logger.info("开始构建ModSecurity...")
-        if not build_modsecurity(modsec_dir, verbose):
+        if not build_modsecurity(modsec_dir, verbose, cache_dir=cache_dir):
             logger.error("ModSecurity构建失败")
             return False
         
@@ -11,11 +11,14 @@ import logging
 import shutil
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # 导入相关模块
 try:
     from modules.git_manager import clone_git_repo, try_alternate_repo
-    from modules.downloader import download_file
+    from modules.downloader import download_file, download_and_extract
+    from modules.archive_handler import extract_archive_once
+    from modules.system_detector import get_build_jobs, paths_exist
     from modules.constants import GIT_REPOS, MODSEC_CONNECTOR_VERSION, OWASP_CRS_VERSION, NGINX_DOWNLOAD_URL, DEFAULT_CACHE_DIR
 except ImportError as e:
     logging.error(f"导入模块时出错: {e}")
@@ -23,6 +26,40 @@ except ImportError as e:
 
 logger = logging.getLogger('modsecurity_installer')
 
+def _fetch_nginx_source(build_dir, nginx_version, use_cache=True, cache_dir=None):
+    """下载并解压Nginx源码
+    
+    禁用缓存时直接从HTTP响应流式解压，不落盘保存归档；
+    否则(或流式解压失败时)先下载到缓存和构建目录，再解压
+    
+    Args:
+        build_dir (str): 构建目录
+        nginx_version (str): Nginx版本
+        use_cache (bool): 是否使用缓存
+        cache_dir (str): 缓存目录路径
+        
+    Returns:
+        str: 出错时的错误信息，成功时返回空字符串
+    """
+    nginx_dir = os.path.join(build_dir, f"nginx-{nginx_version}")
+    if not use_cache:
+        if download_and_extract(NGINX_DOWNLOAD_URL, build_dir, timeout=180) and os.path.isdir(nginx_dir):
+            return ""
+        logger.info("流式解压失败，改为下载后解压")
+    
+    nginx_tar = os.path.join(build_dir, f"nginx-{nginx_version}.tar.gz")
+    if not download_file(NGINX_DOWNLOAD_URL, nginx_tar, timeout=180, retries=3,
+                         use_cache=use_cache, cache_dir=cache_dir, version=nginx_version):
+        return f"Nginx 源码下载失败: {nginx_tar}"
+    
+    # 检查下载是否成功
+    if not os.path.exists(nginx_tar) or os.path.getsize(nginx_tar) < 1000:
+        return f"Nginx 源码下载失败或文件损坏: {nginx_tar}"
+    
+    if not extract_archive_once(nginx_tar, build_dir, nginx_dir):
+        return f"Nginx 源码解压失败: {nginx_dir}"
+    return ""
+
 def download_modules(build_dir, nginx_version, verbose=False, use_gitee=True, use_cache=True, cache_dir=None):
     """下载 ModSecurity 相关模块
     
@@ -41,7 +78,8 @@ def download_modules(build_dir, nginx_version, verbose=False, use_gitee=True, us
             'message': str,
             'connector_dir': str,
             'crs_dir': str,
-            'nginx_dir': str
+            'nginx_dir': str,
+            'nginx_src_tar': str  # 下载的Nginx源码包，流式解压时为空
         }
     """
     result = {
@@ -49,83 +87,62 @@ def download_modules(build_dir, nginx_version, verbose=False, use_gitee=True, us
         'message': '',
         'connector_dir': '',
         'crs_dir': '',
-        'nginx_dir': ''
+        'nginx_dir': '',
+        'nginx_src_tar': ''
     }
     
     try:
         # 确保构建目录存在
         if not os.path.exists(build_dir):
-            os.makedirs(build_dir)
+            os.makedirs(build_dir, exist_ok=True)
         
         # 确定要使用的仓库源
         repo_source = "gitee" if use_gitee else "github"
+        fallback_source = "github" if use_gitee else "gitee"
         logger.info(f"使用 {repo_source} 作为主要代码源")
         
-        # 下载 ModSecurity-Nginx 连接器
         connector_dir = os.path.join(build_dir, "ModSecurity-nginx")
-        logger.info(f"下载 ModSecurity-Nginx 连接器...")
-        
-        main_connector_url = GIT_REPOS[repo_source]["connector"]
-        fallback_connector_url = GIT_REPOS["github" if use_gitee else "gitee"]["connector"]
-        
-        if not try_alternate_repo(main_connector_url, fallback_connector_url, connector_dir, verbose, 
-                               cache_dir=cache_dir, use_cache=use_cache):
-            result['message'] = "无法下载 ModSecurity-Nginx 连接器"
-            logger.error(result['message'])
-            return result
-        
-        logger.info(f"ModSecurity-Nginx 连接器下载成功: {connector_dir}")
-        result['connector_dir'] = connector_dir
-        
-        # 下载 OWASP ModSecurity 核心规则集
         crs_dir = os.path.join(build_dir, "owasp-modsecurity-crs")
-        logger.info(f"下载 OWASP ModSecurity 核心规则集...")
-        
-        main_crs_url = GIT_REPOS[repo_source]["crs"]
-        fallback_crs_url = GIT_REPOS["github" if use_gitee else "gitee"]["crs"]
-        
-        if not try_alternate_repo(main_crs_url, fallback_crs_url, crs_dir, verbose,
-                              cache_dir=cache_dir, use_cache=use_cache):
-            result['message'] = "无法下载 OWASP ModSecurity 核心规则集"
-            logger.error(result['message'])
-            return result
-        
-        logger.info(f"OWASP ModSecurity 核心规则集下载成功: {crs_dir}")
-        result['crs_dir'] = crs_dir
-        
-        # 下载 Nginx 源码
-        logger.info(f"下载 Nginx {nginx_version} 源码...")
-        nginx_tar = os.path.join(build_dir, f"nginx-{nginx_version}.tar.gz")
-        # 直接使用已定义的完整URL
-        nginx_url = NGINX_DOWNLOAD_URL
-        
-        # 使用缓存支持的下载函数
-        if not download_file(nginx_url, nginx_tar, timeout=180, retries=3, 
-                         use_cache=use_cache, cache_dir=cache_dir, version=nginx_version):
-            result['message'] = f"Nginx 源码下载失败: {nginx_tar}"
-            logger.error(result['message'])
-            return result
-            
-        # 检查下载是否成功
-        if not os.path.exists(nginx_tar) or os.path.getsize(nginx_tar) < 1000:
-            result['message'] = f"Nginx 源码下载失败或文件损坏: {nginx_tar}"
-            logger.error(result['message'])
-            return result
-        
-        # 解压 Nginx 源码
         nginx_dir = os.path.join(build_dir, f"nginx-{nginx_version}")
-        extract_cmd = f"tar -xzf {nginx_tar} -C {build_dir}"
-        subprocess.run(extract_cmd, shell=True, check=True,
-                      stdout=subprocess.PIPE if not verbose else None,
-                      stderr=subprocess.PIPE if not verbose else None)
         
-        if not os.path.exists(nginx_dir):
-            result['message'] = f"Nginx 源码解压失败: {nginx_dir}"
-            logger.error(result['message'])
-            return result
+        # 连接器、CRS规则集和Nginx源码互不依赖，同时下载，总耗时取决于最慢的一项；
+        # 连接器和规则集不需要历史记录，只浅克隆最新提交(--depth=1隐含--single-branch)
+        logger.info("下载 ModSecurity-Nginx 连接器、OWASP ModSecurity 核心规则集和 Nginx 源码...")
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            connector_future = executor.submit(
+                try_alternate_repo, GIT_REPOS[repo_source]["connector"], GIT_REPOS[fallback_source]["connector"],
+                connector_dir, verbose, cache_dir=cache_dir, use_cache=use_cache, depth=1)
+            crs_future = executor.submit(
+                try_alternate_repo, GIT_REPOS[repo_source]["crs"], GIT_REPOS[fallback_source]["crs"],
+                crs_dir, verbose, cache_dir=cache_dir, use_cache=use_cache, depth=1)
+            nginx_future = executor.submit(_fetch_nginx_source, build_dir, nginx_version,
+                                           use_cache=use_cache, cache_dir=cache_dir)
+            
+            if not connector_future.result():
+                result['message'] = "无法下载 ModSecurity-Nginx 连接器"
+                logger.error(result['message'])
+                return result
+            logger.info(f"ModSecurity-Nginx 连接器下载成功: {connector_dir}")
+            result['connector_dir'] = connector_dir
+            
+            if not crs_future.result():
+                result['message'] = "无法下载 OWASP ModSecurity 核心规则集"
+                logger.error(result['message'])
+                return result
+            logger.info(f"OWASP ModSecurity 核心规则集下载成功: {crs_dir}")
+            result['crs_dir'] = crs_dir
+            
+            error = nginx_future.result()
+            if error:
+                result['message'] = error
+                logger.error(result['message'])
+                return result
         
         logger.info(f"Nginx 源码下载并解压成功: {nginx_dir}")
         result['nginx_dir'] = nginx_dir
+        nginx_tar = os.path.join(build_dir, f"nginx-{nginx_version}.tar.gz")
+        if os.path.exists(nginx_tar):
+            result['nginx_src_tar'] = nginx_tar
         
         # 所有模块下载成功
         result['success'] = True
@@ -138,6 +155,22 @@ def download_modules(build_dir, nginx_version, verbose=False, use_gitee=True, us
         return result
 
 
+def _check_dirs(dirs):
+    """同时检查多个目录是否存在，记录所有缺失的目录
+    
+    Args:
+        dirs (list): (目录路径, 目录名称)元组列表
+        
+    Returns:
+        bool: 是否全部存在
+    """
+    missing = [(dir_path, dir_name) for (dir_path, dir_name), exists
+               in zip(dirs, paths_exist(dir_path for dir_path, _ in dirs)) if not exists]
+    for dir_path, dir_name in missing:
+        logger.error(f"{dir_name}目录不存在: {dir_path}")
+    return not missing
+
+
 def configure_modules(modsec_dir, connector_dir, crs_dir, nginx_dir, verbose=False):
     """配置 ModSecurity 相关模块
     
@@ -153,15 +186,13 @@ def configure_modules(modsec_dir, connector_dir, crs_dir, nginx_dir, verbose=Fal
     """
     try:
         # 检查目录是否存在
-        for dir_path, dir_name in [
+        if not _check_dirs([
             (modsec_dir, "ModSecurity"),
             (connector_dir, "ModSecurity-Nginx连接器"),
             (crs_dir, "OWASP CRS规则集"),
             (nginx_dir, "Nginx源码")
-        ]:
-            if not os.path.exists(dir_path):
-                logger.error(f"{dir_name}目录不存在: {dir_path}")
-                return False
+        ]):
+            return False
         
         # 配置CRS规则集
         logger.info("配置CRS规则集...")
@@ -176,9 +207,8 @@ def configure_modules(modsec_dir, connector_dir, crs_dir, nginx_dir, verbose=Fal
         
         # 检查Nginx配置选项
         logger.info("检查Nginx配置选项...")
-        nginx_configure_cmd = f"cd {nginx_dir} && ./configure --help"
         try:
-            process = subprocess.run(nginx_configure_cmd, shell=True, check=True,
+            process = subprocess.run(['./configure', '--help'], check=True, cwd=nginx_dir,
                                    stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE)
             
@@ -197,6 +227,27 @@ def configure_modules(modsec_dir, connector_dir, crs_dir, nginx_dir, verbose=Fal
         return False
 
 
+def _run_logged(cmd, cwd, log_file, verbose=False):
+    """执行命令，非详细模式下将输出写入日志文件
+    
+    Args:
+        cmd (list): 命令及参数
+        cwd (str): 工作目录
+        log_file (str): 日志文件路径
+        verbose (bool): 是否直接显示输出
+        
+    Raises:
+        subprocess.CalledProcessError: 命令执行失败
+    """
+    if verbose:
+        # 直接显示输出
+        subprocess.run(cmd, check=True, cwd=cwd)
+    else:
+        # 将输出重定向到日志文件
+        with open(log_file, 'w') as log:
+            subprocess.run(cmd, check=True, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+
+
 def compile_nginx_with_modsecurity(nginx_dir, modsec_dir, connector_dir, verbose=False):
     """编译带有ModSecurity模块的Nginx
     
@@ -211,51 +262,29 @@ def compile_nginx_with_modsecurity(nginx_dir, modsec_dir, connector_dir, verbose
     """
     try:
         # 检查目录是否存在
-        for dir_path, dir_name in [
+        if not _check_dirs([
             (nginx_dir, "Nginx源码"),
             (modsec_dir, "ModSecurity"),
             (connector_dir, "ModSecurity-Nginx连接器")
-        ]:
-            if not os.path.exists(dir_path):
-                logger.error(f"{dir_name}目录不存在: {dir_path}")
-                return False
+        ]):
+            return False
         
         logger.info("配置并编译带有ModSecurity模块的Nginx...")
         
         # 配置Nginx
         logger.info("步骤1: 配置Nginx")
-        configure_cmd = f"cd {nginx_dir} && ./configure --add-module={connector_dir}"
+        configure_cmd = ['./configure', f"--add-module={os.path.abspath(connector_dir)}"]
         
         # 确保编译日志可用于调试
         log_file = os.path.join(os.path.dirname(nginx_dir), "nginx_configure.log")
-        
-        if verbose:
-            # 直接显示输出
-            proc = subprocess.run(configure_cmd, shell=True, check=True)
-        else:
-            # 将输出重定向到日志文件
-            proc = subprocess.run(
-                f"{configure_cmd} > {log_file} 2>&1",
-                shell=True, 
-                check=True
-            )
+        _run_logged(configure_cmd, nginx_dir, log_file, verbose)
         
         # 编译Nginx
         logger.info("步骤2: 编译Nginx")
-        compile_cmd = f"cd {nginx_dir} && make -j$(nproc)"
+        compile_cmd = ['make', f"-j{get_build_jobs()}"]
         
         compile_log = os.path.join(os.path.dirname(nginx_dir), "nginx_compile.log")
-        
-        if verbose:
-            # 直接显示输出
-            proc = subprocess.run(compile_cmd, shell=True, check=True)
-        else:
-            # 将输出重定向到日志文件
-            proc = subprocess.run(
-                f"{compile_cmd} > {compile_log} 2>&1",
-                shell=True, 
-                check=True
-            )
+        _run_logged(compile_cmd, nginx_dir, compile_log, verbose)
         
         # 检查编译结果
         nginx_binary = os.path.join(nginx_dir, "objs", "nginx")
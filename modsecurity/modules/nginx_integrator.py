@@ -7,24 +7,32 @@ Nginx集成模块
 
 import os
 import re
+import shlex
 import shutil
 import subprocess
 import logging
 import sys
 import time
 import tempfile
+from functools import lru_cache
 from pathlib import Path
 
 # 导入相关模块
 try:
-    from modules.constants import MODSEC_VERSION, MODSEC_CONNECTOR_VERSION, MODSEC_CONNECTOR_URL
-    from modules.system_detector import get_nginx_info, detect_bt_panel
+    from modules.constants import (MODSEC_VERSION, MODSEC_CONNECTOR_VERSION, MODSEC_CONNECTOR_URL,
+                                   MODSEC_CONNECTOR_GITEE_URL, MODSEC_CONNECTOR_GITHUB_URL)
+    from modules.downloader import download_file, download_from_mirrors, record_file_digest, verify_file_digest
+    from modules.archive_handler import extract_archive
+    from modules.system_detector import get_nginx_info, detect_bt_panel, get_build_jobs, paths_exist
 except ImportError as e:
     logging.error(f"导入模块时出错: {e}")
     sys.exit(1)
 
 logger = logging.getLogger('modsecurity_installer')
 
+_CONFIG_ARGS_RE = re.compile(r'configure arguments:\s*(.*)')
+_NGINX_VERSION_RE = re.compile(r'(\d+\.\d+\.\d+)')
+
 def download_connector(build_dir):
     """下载ModSecurity-Nginx连接器
     
@@ -38,12 +46,18 @@ def download_connector(build_dir):
     if not os.path.exists(build_dir):
         os.makedirs(build_dir)
     
-    # 连接器文件名
+    # 已解压出非空的连接器目录时，跳过下载和解压
+    connector_dir = os.path.join(build_dir, f"ModSecurity-nginx-{MODSEC_CONNECTOR_VERSION}")
+    if os.path.isdir(connector_dir) and os.listdir(connector_dir):
+        logger.info(f"连接器已解压: {connector_dir}")
+        return connector_dir
+    
+    # 连接器文件名，下载完成时在旁边记录摘要
     connector_name = f"ModSecurity-nginx-v{MODSEC_CONNECTOR_VERSION}.tar.gz"
     connector_path = os.path.join(build_dir, connector_name)
     
-    # 如果文件已存在，不需要下载
-    if os.path.exists(connector_path):
+    # 如果文件已存在且与下载时的摘要一致，不需要下载；没有摘要记录的文件可能不完整，重新下载
+    if verify_file_digest(connector_path):
         logger.info(f"连接器已下载: {connector_path}")
     else:
         # 定义下载URL优先级列表
@@ -54,30 +68,15 @@ def download_connector(build_dir):
             MODSEC_CONNECTOR_GITHUB_URL
         ]
         
-        # 依次尝试每个URL
-        download_success = False
-        for url in download_urls:
-            try:
-                logger.info(f"尝试从 {url} 下载连接器...")
-                cmd = f"curl -L --connect-timeout 30 --retry 3 -o {connector_path} {url}"
-                subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                download_success = True
-                logger.info(f"下载连接器成功: {url}")
-                break
-            except subprocess.CalledProcessError as e:
-                logger.warning(f"从 {url} 下载连接器失败: {e}，尝试下一个URL")
-                continue
-        
-        # 如果所有URL都失败了
-        if not download_success:
+        # 同时从各个地址下载，Gitee响应慢时不必等到超时再切换到GitHub
+        logger.info(f"尝试从 {', '.join(download_urls)} 下载连接器...")
+        # 连接器URL中的版本号无法被自动推断，显式指定后缓存命中时无需再向服务端确认
+        url = download_from_mirrors(download_urls, connector_path, retries=3, version=MODSEC_CONNECTOR_VERSION)
+        if not url:
             logger.error(f"从所有源下载连接器均失败")
             return ""
-    
-    # 解压连接器
-    connector_dir = os.path.join(build_dir, f"ModSecurity-nginx-{MODSEC_CONNECTOR_VERSION}")
-    if os.path.exists(connector_dir):
-        logger.info(f"连接器已解压: {connector_dir}")
-        return connector_dir
+        logger.info(f"下载连接器成功: {url}")
+        record_file_digest(connector_path)
     
     # 验证下载文件
     if not os.path.exists(connector_path) or os.path.getsize(connector_path) == 0:
@@ -85,31 +84,15 @@ def download_connector(build_dir):
         return ""
         
     try:
-        # 在解压前验证tar文件
-        logger.info(f"验证tar文件完整性: {connector_path}")
-        verify_cmd = f"tar -tf {connector_path} > /dev/null"
-        try:
-            subprocess.run(verify_cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        except subprocess.CalledProcessError as e:
-            logger.error(f"文件损坏或不是有效的tar归档文件: {e}")
+        # 在进程内解压，损坏或不是有效tar归档的文件会在打开时失败
+        logger.info(f"解压连接器到: {build_dir}")
+        # 连接器源码不依赖文件属性，跳过每个条目的chmod/utime
+        if not extract_archive(connector_path, build_dir, set_attrs=False):
+            logger.error(f"文件损坏或不是有效的tar归档文件: {connector_path}")
             # 删除损坏的文件
             os.remove(connector_path)
             return ""
         
-        logger.info(f"解压连接器到: {build_dir}")
-        # 使用verbose模式后重定向到文件，以便排错
-        cmd = f"tar -xvzf {connector_path} -C {build_dir} > {build_dir}/extract.log 2>&1"
-        subprocess.run(cmd, shell=True, check=True)
-        
-        # 输出解压结果
-        logger.info(f"连接器解压输出:")
-        try:
-            with open(f"{build_dir}/extract.log", "r") as f:
-                extract_output = f.read()
-                logger.info(extract_output)
-        except Exception as e:
-            logger.warning(f"无法读取解压日志: {e}")
-        
         # 验证目录存在
         if os.path.exists(connector_dir):
             # 验证目录内容
@@ -121,8 +104,11 @@ def download_connector(build_dir):
                 logger.error(f"连接器解压后目录为空: {connector_dir}")
                 return ""
         else:
-            # 尝试检查目录是否使用了不同的命名格式
-            potential_dirs = [f for f in os.listdir(build_dir) if os.path.isdir(os.path.join(build_dir, f)) and 'modsecurity' in f.lower() and 'nginx' in f.lower()]
+            # 尝试检查目录是否使用了不同的命名格式，scandir的目录项自带文件类型，无需逐个stat
+            with os.scandir(build_dir) as it:
+                entries = list(it)
+            potential_dirs = [e.name for e in entries if e.is_dir(follow_symlinks=False)
+                              and 'modsecurity' in e.name.lower() and 'nginx' in e.name.lower()]
             
             if potential_dirs:
                 alt_dir = os.path.join(build_dir, potential_dirs[0])
@@ -131,11 +117,8 @@ def download_connector(build_dir):
             else:
                 logger.error(f"连接器解压后目录不存在: {connector_dir}")
                 # 列出所有解压出的目录信息以便调试
-                logger.info(f"build_dir中的内容: {os.listdir(build_dir)}")
+                logger.info(f"build_dir中的内容: {[e.name for e in entries]}")
                 return ""
-    except subprocess.CalledProcessError as e:
-        logger.error(f"解压连接器失败: {e}")
-        return ""
     except Exception as e:
         logger.error(f"处理连接器时发生未知错误: {e}")
         return ""
@@ -149,16 +132,29 @@ def get_nginx_compile_options(nginx_binary):
     Returns:
         dict: 编译选项字典
     """
-    options = {}
-    
-    if not os.path.exists(nginx_binary):
+    try:
+        mtime = os.path.getmtime(nginx_binary)
+    except OSError:
         logger.error(f"Nginx二进制文件不存在: {nginx_binary}")
-        return options
+        return {}
+    # 返回副本，调用方修改结果不影响缓存
+    return dict(_read_nginx_compile_options(nginx_binary, mtime))
+
+@lru_cache(maxsize=8)
+def _read_nginx_compile_options(nginx_binary, mtime):
+    """运行nginx -V解析编译选项，按二进制文件路径和修改时间缓存，Nginx被替换后重新读取
     
+    Args:
+        nginx_binary (str): Nginx二进制文件路径
+        mtime (float): 二进制文件的修改时间
+        
+    Returns:
+        dict: 编译选项字典
+    """
+    options = {}
     try:
         # 获取Nginx版本和编译选项
-        cmd = f"{nginx_binary} -V"
-        process = subprocess.run(cmd, shell=True, check=True, 
+        process = subprocess.run([nginx_binary, '-V'], check=True,
                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, 
                               universal_newlines=True)
         
@@ -166,35 +162,35 @@ def get_nginx_compile_options(nginx_binary):
         output = process.stderr if process.stderr else process.stdout
         
         # 提取配置参数
-        config_line = re.search(r'configure arguments:\s*(.*)', output)
+        config_line = _CONFIG_ARGS_RE.search(output)
         if config_line:
             config_args = config_line.group(1)
             
-            # 解析参数
-            for arg in config_args.split(' --'):
-                arg = arg.strip()
-                if not arg:
-                    continue
-                
-                # 处理无值参数
-                if '=' not in arg:
-                    options[arg] = True
-                    continue
-                
-                # 处理有值参数
-                key, value = arg.split('=', 1)
-                options[key] = value
+            # 按shell规则拆分整行参数，带空格的值(如--with-cc-opt='-O2 --param=...')保持为一个参数并去掉引号
+            try:
+                args = shlex.split(config_args)
+            except ValueError as e:
+                logger.warning(f"无法解析Nginx编译选项: {e}")
+                return {}
+            
+            for arg in args:
+                key, sep, value = arg.partition('=')
+                if key.startswith('--'):
+                    key = key[2:]
+                # 无值参数记为True
+                options[key] = value if sep else True
             
             logger.info(f"成功提取Nginx编译选项: {len(options)}个选项")
             return options
         else:
             logger.warning("无法提取Nginx编译选项")
             return {}
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, OSError) as e:
         logger.error(f"获取Nginx编译选项失败: {e}")
         return {}
 
-def build_nginx_module(build_dir, connector_dir, modsec_dir, verbose=False):
+def build_nginx_module(build_dir, connector_dir, modsec_dir, verbose=False, nginx_src_tar=None,
+                       use_cache=True, cache_dir=None):
     """构建Nginx模块
     
     Args:
@@ -202,6 +198,9 @@ def build_nginx_module(build_dir, connector_dir, modsec_dir, verbose=False):
         connector_dir (str): 连接器目录
         modsec_dir (str): ModSecurity目录
         verbose (bool): 是否输出详细信息
+        nginx_src_tar (str): 已下载的Nginx源码包，版本与已安装的Nginx一致时直接使用
+        use_cache (bool): 下载Nginx源码时是否使用缓存
+        cache_dir (str): 缓存目录路径，如为None则使用默认目录
         
     Returns:
         bool: 是否成功构建
@@ -257,7 +256,7 @@ def build_nginx_module(build_dir, connector_dir, modsec_dir, verbose=False):
     # 如果没有找到源码，尝试从官方网站下载
     if not nginx_src_dir:
         # 提取Nginx版本
-        match = re.search(r'(\d+\.\d+\.\d+)', nginx_version)
+        match = _NGINX_VERSION_RE.search(nginx_version)
         if not match:
             logger.error(f"无法解析Nginx版本: {nginx_version}")
             return False
@@ -269,60 +268,60 @@ def build_nginx_module(build_dir, connector_dir, modsec_dir, verbose=False):
         # 下载并解压Nginx源码
         if not os.path.exists(nginx_src_dir):
             nginx_src_url = f"http://nginx.org/download/{nginx_src_name}.tar.gz"
-            nginx_src_tar = os.path.join(build_dir, f"{nginx_src_name}.tar.gz")
-            
-            logger.info(f"下载Nginx源码: {nginx_src_url}")
-            try:
-                cmd = f"curl -L --connect-timeout 30 --retry 3 -o {nginx_src_tar} {nginx_src_url}"
-                subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                logger.info(f"解压Nginx源码到: {build_dir}")
-                cmd = f"tar -xzf {nginx_src_tar} -C {build_dir}"
-                subprocess.run(cmd, shell=True, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                if not os.path.exists(nginx_src_dir):
-                    logger.error(f"Nginx源码解压后目录不存在: {nginx_src_dir}")
+            # 下载模块时已经下载过同版本的源码包则直接使用，不再重复下载
+            candidates = [nginx_src_tar, os.path.join(build_dir, f"{nginx_src_name}.tar.gz")]
+            nginx_src_tar = next((path for path in candidates if path and os.path.isfile(path)
+                                  and os.path.basename(path) == f"{nginx_src_name}.tar.gz"), None)
+            if nginx_src_tar:
+                logger.info(f"使用已下载的Nginx源码: {nginx_src_tar}")
+            else:
+                nginx_src_tar = candidates[1]
+                logger.info(f"下载Nginx源码: {nginx_src_url}")
+                if not download_file(nginx_src_url, nginx_src_tar, retries=3, use_cache=use_cache,
+                                     cache_dir=cache_dir, version=nginx_ver):
+                    logger.error(f"下载Nginx源码失败: {nginx_src_url}")
                     return False
-            except subprocess.CalledProcessError as e:
-                logger.error(f"下载或解压Nginx源码失败: {e}")
+            
+            logger.info(f"解压Nginx源码到: {build_dir}")
+            if not extract_archive(nginx_src_tar, build_dir):
+                logger.error(f"解压Nginx源码失败: {nginx_src_tar}")
+                return False
+            
+            if not os.path.exists(nginx_src_dir):
+                logger.error(f"Nginx源码解压后目录不存在: {nginx_src_dir}")
                 return False
     
     # 构建ModSecurity-Nginx模块
     try:
         logger.info("开始构建ModSecurity-Nginx模块...")
         
-        # 切换到Nginx源码目录
-        os.chdir(nginx_src_dir)
-        
-        # 准备编译命令
-        configure_cmd = f"./configure --prefix={nginx_path}"
+        # 准备编译命令，以参数列表执行，不经过shell
+        configure_cmd = ['./configure', f"--prefix={nginx_path}"]
         
         # 添加Nginx原始编译选项
         # 特别处理 --add-dynamic-module 和 --add-module 选项，这些可能不应该出现在新的配置中
         for key, value in options.items():
             if key in ['add-dynamic-module', 'add-module']:
                 continue
+            option = f"--{key}"
             if value is True:
-                configure_cmd += f" --{key}"
+                configure_cmd.append(option)
             else:
-                if key.startswith("--"):
-                    configure_cmd += f" {key}={value}"
-                else:
-                    configure_cmd += f" --{key}={value}"
+                configure_cmd.append(f"{option}={value}")
         
         # 添加ModSecurity模块
-        configure_cmd += f" --add-dynamic-module={connector_dir}"
+        configure_cmd.append(f"--add-dynamic-module={connector_dir}")
         
         # 执行配置
-        logger.info(f"配置Nginx: {configure_cmd}")
-        process = subprocess.run(configure_cmd, shell=True, check=True, 
+        logger.info(f"配置Nginx: {' '.join(configure_cmd)}")
+        process = subprocess.run(configure_cmd, check=True, cwd=nginx_src_dir,
                               stdout=subprocess.PIPE if not verbose else None, 
                               stderr=subprocess.PIPE if not verbose else None)
         
         # 编译模块
-        logger.info("编译Nginx模块: make modules")
-        make_cmd = "make modules"
-        process = subprocess.run(make_cmd, shell=True, check=True, 
+        make_cmd = ['make', f"-j{get_build_jobs()}", 'modules']
+        logger.info(f"编译Nginx模块: {' '.join(make_cmd)}")
+        process = subprocess.run(make_cmd, check=True, cwd=nginx_src_dir,
                               stdout=subprocess.PIPE if not verbose else None, 
                               stderr=subprocess.PIPE if not verbose else None)
         
@@ -336,12 +335,13 @@ def build_nginx_module(build_dir, connector_dir, modsec_dir, verbose=False):
         if is_bt:
             module_install_dir = "/www/server/nginx/modules"
         else:
-            # 尝试查找标准模块路径
-            module_install_dir = "/usr/lib64/nginx/modules"  # CentOS/RHEL
-            if not os.path.exists(module_install_dir):
-                module_install_dir = "/usr/lib/nginx/modules"  # Debian/Ubuntu
-                if not os.path.exists(module_install_dir):
-                    module_install_dir = "/usr/local/nginx/modules"  # 自编译
+            # 尝试查找标准模块路径，同时检查各候选目录
+            candidates = [
+                "/usr/lib64/nginx/modules",  # CentOS/RHEL
+                "/usr/lib/nginx/modules",    # Debian/Ubuntu
+            ]
+            module_install_dir = next((path for path, exists in zip(candidates, paths_exist(candidates)) if exists),
+                                      "/usr/local/nginx/modules")  # 自编译
         
         # 创建模块目录
         os.makedirs(module_install_dir, exist_ok=True)
@@ -397,17 +397,14 @@ def configure_nginx_modsecurity(modsec_dir):
     
     # 将模块加载指令添加到动态模块配置中
     try:
-        # 检查是否已存在
+        # 检查是否已存在，一次打开完成读取和追加(文件不存在时创建)
         modules_load_path = os.path.join(nginx_conf_dir, "modules.conf")
-        if os.path.exists(modules_load_path):
-            with open(modules_load_path, 'r') as f:
-                content = f.read()
-            
+        with open(modules_load_path, 'a+') as f:
+            f.seek(0)
+            content = f.read()
             if 'ngx_http_modsecurity_module.so' not in content:
-                with open(modules_load_path, 'a') as f:
-                    f.write(module_load_content)
-        else:
-            with open(modules_load_path, 'w') as f:
+                if content and not content.endswith('\n'):
+                    f.write('\n')
                 f.write(module_load_content)
         
         logger.info(f"已将ModSecurity模块加载指令添加到: {modules_load_path}")
@@ -439,52 +436,40 @@ modsecurity_rules_file /etc/nginx/modsec/main.conf;
         with open(nginx_conf_path, 'r') as f:
             content = f.read()
         
-        # 检查是否已包含模块加载配置
-        if f'include modules.conf' not in content and include_line not in content:
-            # 将include语句添加到http块之前
-            with open(nginx_conf_path, 'r') as f:
-                lines = f.readlines()
-            
+        # 检查是否已包含模块加载配置和模块配置
+        need_load = 'include modules.conf' not in content and include_line not in content
+        need_modules = 'include modules/*.conf' not in content and modules_include_line not in content
+        
+        if need_load or need_modules:
+            # 一次遍历同时完成两处修改：在http块之前添加加载配置，在http块内添加模块配置
             new_lines = []
             http_block_start = False
-            
-            for line in lines:
+            for line in content.splitlines(keepends=True):
                 if not http_block_start and 'http {' in line:
-                    # 在http块之前添加include语句
-                    new_lines.append(f'include modules.conf;\n')
                     http_block_start = True
-                
-                new_lines.append(line)
-            
-            with open(nginx_conf_path, 'w') as f:
-                f.writelines(new_lines)
-            
-            logger.info(f"已将模块加载配置添加到: {nginx_conf_path}")
-        
-        # 检查是否已包含模块配置
-        with open(nginx_conf_path, 'r') as f:
-            content = f.read()
-        
-        if 'include modules/*.conf' not in content and modules_include_line not in content:
-            # 将include语句添加到http块内
-            with open(nginx_conf_path, 'r') as f:
-                lines = f.readlines()
-            
-            new_lines = []
-            http_block = False
-            
-            for line in lines:
+                    if need_load:
+                        new_lines.append('include modules.conf;\n')
+                    new_lines.append(line)
+                    if need_modules:
+                        new_lines.append('    include modules/*.conf;\n')
+                    continue
                 new_lines.append(line)
-                
-                if not http_block and 'http {' in line:
-                    # 在http块内添加include语句
-                    new_lines.append(f'    include modules/*.conf;\n')
-                    http_block = True
             
-            with open(nginx_conf_path, 'w') as f:
+            # 写入同目录下的临时文件后原子替换，避免写入中断时留下不完整的nginx.conf
+            with tempfile.NamedTemporaryFile('w', dir=nginx_conf_dir, prefix='.nginx.conf.', delete=False) as f:
                 f.writelines(new_lines)
+                tmp_path = f.name
+            try:
+                shutil.copymode(nginx_conf_path, tmp_path)
+                os.replace(tmp_path, nginx_conf_path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
             
-            logger.info(f"已将模块配置添加到: {nginx_conf_path}")
+            if need_load:
+                logger.info(f"已将模块加载配置添加到: {nginx_conf_path}")
+            if need_modules:
+                logger.info(f"已将模块配置添加到: {nginx_conf_path}")
         
         logger.info("Nginx ModSecurity配置完成")
         return True
@@ -492,13 +477,16 @@ modsecurity_rules_file /etc/nginx/modsec/main.conf;
         logger.error(f"修改Nginx配置文件失败: {e}")
         return False
 
-def install_nginx_modsecurity(build_dir, modsec_dir, verbose=False):
+def install_nginx_modsecurity(build_dir, modsec_dir, verbose=False, nginx_src_tar=None, use_cache=True, cache_dir=None):
     """安装ModSecurity-Nginx模块
     
     Args:
         build_dir (str): 构建目录
         modsec_dir (str): ModSecurity目录
         verbose (bool): 是否输出详细信息
+        nginx_src_tar (str): 已下载的Nginx源码包，可选
+        use_cache (bool): 下载Nginx源码时是否使用缓存
+        cache_dir (str): 缓存目录路径，如为None则使用默认目录
         
     Returns:
         bool: 是否成功安装
@@ -510,7 +498,8 @@ def install_nginx_modsecurity(build_dir, modsec_dir, verbose=False):
         return False
     
     # 构建模块
-    if not build_nginx_module(build_dir, connector_dir, modsec_dir, verbose):
+    if not build_nginx_module(build_dir, connector_dir, modsec_dir, verbose, nginx_src_tar=nginx_src_tar,
+                              use_cache=use_cache, cache_dir=cache_dir):
         logger.error("构建ModSecurity-Nginx模块失败")
         return False
     
@@ -12,48 +12,76 @@ import subprocess
 import logging
 import sys
 import time
+import functools
+import platform
+from functools import lru_cache
 from pathlib import Path
 
 # 导入相关模块
 try:
     from modules.system_detector import detect_os, is_centos_eol, get_centos_version
     from modules.constants import MIRRORS, CENTOS_EOL_VERSIONS
+    from modules._repo_common import (test_yum_repo, backup_repo_files, disable_fastmirror,
+                                      disable_all_repo_files, scan_repo_dir)
+    from modules.downloader import race_fetch, is_url_accessible
 except ImportError as e:
     logging.error(f"导入模块时出错: {e}")
     sys.exit(1)
 
 logger = logging.getLogger('modsecurity_installer')
 
-# 定义一个公共函数test_yum_repo用于导出，内部调用local_test_yum_repo实现
-def test_yum_repo():
-    """测试YUM软件源是否可用
+def _atomic_write(path, data):
+    """先写入临时文件再改名替换目标文件，中断时yum不会读到写了一半的配置
+    
+    临时文件以.tmp结尾，yum只读取.repo文件，不会加载它
+    
+    Args:
+        path (str): 目标文件路径
+        data (str): 文件内容
+    """
+    tmp_file = path + ".tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(data)
+    if os.path.exists(path):
+        shutil.copymode(path, tmp_file)
+    os.replace(tmp_file, path)
+
+# 软件源探测结果缓存，键为/etc/yum.repos.d中各配置文件的(文件名, 修改时间, 大小)，
+# 配置文件未变化时不再重复运行yum
+_REPO_PROBE_CACHE = {}
+
+def _repo_fingerprint(repo_dir="/etc/yum.repos.d"):
+    """计算软件源配置目录的指纹
+    
+    Args:
+        repo_dir (str): 软件源配置目录
+        
+    Returns:
+        tuple: 按文件名排序的(文件名, 修改时间, 大小)元组
+    """
+    entries = []
+    with os.scandir(repo_dir) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(entries))
+
+def _probe_yum_repo():
+    """测试YUM软件源是否可用，配置文件未变化时直接返回上次的结果
     
     Returns:
         bool: 如果YUM源正常返回True，否则返回False
     """
     try:
-        # 使用makecache测试仓库连接
-        process = subprocess.run("yum makecache", shell=True, stdout=subprocess.PIPE, 
-                            stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
-        output = process.stdout + process.stderr
-        
-        # 检查常见错误模式
-        if "Could not retrieve mirrorlist" in output or "Cannot find a valid baseurl" in output:
-            logger.warning("检测到YUM镜像源错误")
-            return False
-        
-        # 执行简单的搜索以确认仓库正常工作
-        process = subprocess.run("yum search gcc -q", shell=True, stdout=subprocess.PIPE, 
-                              stderr=subprocess.PIPE, universal_newlines=True, timeout=30)
-        
-        # 如果退出码为0，则说明源可用
-        return process.returncode == 0
-    except subprocess.TimeoutExpired:
-        logger.warning("YUM源测试超时，网络可能存在问题")
-        return False
-    except Exception as e:
-        logger.warning(f"测试YUM源时发生错误: {e}")
-        return False
+        fingerprint = _repo_fingerprint()
+    except OSError:
+        return test_yum_repo()
+    if fingerprint not in _REPO_PROBE_CACHE:
+        _REPO_PROBE_CACHE[fingerprint] = test_yum_repo()
+    else:
+        logger.info("软件源配置未变化，使用上次的测试结果")
+    return _REPO_PROBE_CACHE[fingerprint]
 
 def fix_centos_yum_mirrors():
     """修复CentOS的YUM镜像源配置
@@ -74,142 +102,99 @@ def fix_centos_yum_mirrors():
     # 使用检查和修复功能
     return check_and_fix_repo_config(os_version)
 
-def generate_tsinghua_eol_config(version, vault_version):
-    """生成清华EOL版本配置
+# 各CentOS版本的仓库布局：(仓库ID, 名称, vault/centos目录下的相对路径)
+_REPO_LAYOUT = {
+    "7": [("base", "Base", "os/$basearch/"),
+          ("updates", "Updates", "updates/$basearch/"),
+          ("extras", "Extras", "extras/$basearch/")],
+    "8": [("base", "Base", "BaseOS/$basearch/os/"),
+          ("appstream", "AppStream", "AppStream/$basearch/os/"),
+          ("extras", "Extras", "extras/$basearch/os/")],
+}
+
+# EPEL仓库在epel目录下的相对路径
+_EPEL_LAYOUT = {"7": "$basearch", "8": "Everything/$basearch"}
+
+def _build_repo_template(layout):
+    """按仓库布局生成配置模板，仓库ID和路径直接写入模板，只留下版本号和镜像地址作为占位符
     
     Args:
-        version (str): CentOS版本号
-        vault_version (str): vault归档版本号
+        layout (str): _REPO_LAYOUT中的布局名称
         
     Returns:
-        str: 配置内容
+        str: 可用format_map填充的模板
     """
-    if version == "7":
-        return f"""# CentOS {version} - 清华镜像
-[base]
-name=CentOS-{version} - Base
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos-vault/{vault_version}/os/$basearch/
-gpgcheck=0
-enabled=1
-
-[updates]
-name=CentOS-{version} - Updates
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos-vault/{vault_version}/updates/$basearch/
+    sections = ["# CentOS {version} - {mirror_name}镜像"]
+    sections += [f"""[{repo_id}]
+name=CentOS-{{version}} - {name}
+baseurl={{base_url}}/{path}
 gpgcheck=0
 enabled=1
-
-[extras]
-name=CentOS-{version} - Extras
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos-vault/{vault_version}/extras/$basearch/
-gpgcheck=0
-enabled=1
-
-# EPEL仓库
+""" for repo_id, name, path in _REPO_LAYOUT[layout]]
+    sections.append(f"""# EPEL仓库
 [epel]
-name=Extra Packages for Enterprise Linux {version}
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/epel/{version}/$basearch
-enabled=1
-gpgcheck=0
-"""
-    else:  # version == "8"
-        return f"""# CentOS {version} - 清华镜像
-[base]
-name=CentOS-{version} - Base
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos-vault/{vault_version}/BaseOS/$basearch/os/
-gpgcheck=0
+name=Extra Packages for Enterprise Linux {{version}}
+baseurl={{epel_url}}/{{version}}/{_EPEL_LAYOUT[layout]}
 enabled=1
-
-[appstream]
-name=CentOS-{version} - AppStream
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos-vault/{vault_version}/AppStream/$basearch/os/
 gpgcheck=0
-enabled=1
+""")
+    return "\n".join(sections)
 
-[extras]
-name=CentOS-{version} - Extras
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos-vault/{vault_version}/extras/$basearch/os/
-gpgcheck=0
-enabled=1
+# 各布局的配置模板，导入时生成一次
+_REPO_TEMPLATES = {layout: _build_repo_template(layout) for layout in _REPO_LAYOUT}
 
-# EPEL仓库
-[epel]
-name=Extra Packages for Enterprise Linux {version}
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/epel/{version}/Everything/$basearch
-enabled=1
-gpgcheck=0
-"""
-
-def generate_aliyun_standard_config(version):
-    """生成阿里云标准版本配置
+def _mirror_base_url(mirror, version, eol):
+    """获取镜像中CentOS仓库的根URL
     
     Args:
+        mirror (str): MIRRORS中的镜像名称
         version (str): CentOS版本号
+        eol (bool): 是否为EOL版本
         
     Returns:
-        str: 配置内容
+        str: 根URL，EOL版本指向vault归档目录
     """
-    return f"""# CentOS {version} - 阿里云镜像
-[base]
-name=CentOS-{version} - Base
-baseurl=https://mirrors.aliyun.com/centos/{version}/BaseOS/$basearch/os/
-gpgcheck=0
-enabled=1
-
-[appstream]
-name=CentOS-{version} - AppStream
-baseurl=https://mirrors.aliyun.com/centos/{version}/AppStream/$basearch/os/
-gpgcheck=0
-enabled=1
+    urls = MIRRORS[mirror]
+    if eol:
+        vault_version = CENTOS_EOL_VERSIONS.get(version, "7.9.2009")
+        return f"{urls['centos_vault']}/{vault_version}"
+    return f"{urls['centos']}/{version}"
 
-[extras]
-name=CentOS-{version} - Extras
-baseurl=https://mirrors.aliyun.com/centos/{version}/extras/$basearch/os/
-gpgcheck=0
-enabled=1
-
-# EPEL仓库
-[epel]
-name=Extra Packages for Enterprise Linux {version}
-baseurl=https://mirrors.aliyun.com/epel/{version}/Everything/$basearch
-enabled=1
-gpgcheck=0
-"""
+def _mirror_repomd_url(mirror, version, eol):
+    """获取镜像中base仓库的repomd.xml地址，用于不经过yum快速检查镜像是否可用
+    
+    Args:
+        mirror (str): MIRRORS中的镜像名称
+        version (str): CentOS版本号
+        eol (bool): 是否为EOL版本
+        
+    Returns:
+        str: repomd.xml的URL
+    """
+    layout = "7" if version == "7" else "8"
+    path = _REPO_LAYOUT[layout][0][2].replace("$basearch", platform.machine())
+    return f"{_mirror_base_url(mirror, version, eol)}/{path}repodata/repomd.xml"
 
-def generate_tsinghua_standard_config(version):
-    """生成清华标准版本配置
+@lru_cache(maxsize=16)
+def generate_repo_config(mirror, version, eol):
+    """生成镜像源配置
     
     Args:
+        mirror (str): MIRRORS中的镜像名称，如'aliyun'或'tsinghua'
         version (str): CentOS版本号
+        eol (bool): 是否为EOL版本，EOL版本使用vault归档镜像
         
     Returns:
         str: 配置内容
     """
-    return f"""# CentOS {version} - 清华镜像
-[base]
-name=CentOS-{version} - Base
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos/{version}/BaseOS/$basearch/os/
-gpgcheck=0
-enabled=1
-
-[appstream]
-name=CentOS-{version} - AppStream
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos/{version}/AppStream/$basearch/os/
-gpgcheck=0
-enabled=1
-
-[extras]
-name=CentOS-{version} - Extras
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/centos/{version}/extras/$basearch/os/
-gpgcheck=0
-enabled=1
-
-# EPEL仓库
-[epel]
-name=Extra Packages for Enterprise Linux {version}
-baseurl=https://mirrors.tuna.tsinghua.edu.cn/epel/{version}/Everything/$basearch
-enabled=1
-gpgcheck=0
-"""
+    urls = MIRRORS[mirror]
+    layout = "7" if version == "7" else "8"
+    return _REPO_TEMPLATES[layout].format_map({
+        'version': version,
+        'mirror_name': urls['name'],
+        'base_url': _mirror_base_url(mirror, version, eol),
+        'epel_url': urls['epel'],
+    })
 
 def check_and_fix_repo_config(os_version=None):
     """检查并修复软件源配置
@@ -237,38 +222,7 @@ def check_and_fix_repo_config(os_version=None):
             return False
     
     # 测试当前软件源是否可用
-    # 直接实现test_yum_repo功能，避免循环导入
-    def local_test_yum_repo():
-        """测试YUM软件源是否可用
-        
-        Returns:
-            bool: 如果YUM源正常返回True，否则返回False
-        """
-        try:
-            # 使用makecache测试仓库连接
-            process = subprocess.run("yum makecache", shell=True, stdout=subprocess.PIPE, 
-                                 stderr=subprocess.PIPE, universal_newlines=True, timeout=60)
-            output = process.stdout + process.stderr
-            
-            # 检查常见错误模式
-            if "Could not retrieve mirrorlist" in output or "Cannot find a valid baseurl" in output:
-                logger.warning("检测到YUM镜像源错误")
-                return False
-            
-            # 执行简单的搜索以确认仓库正常工作
-            process = subprocess.run("yum search gcc -q", shell=True, stdout=subprocess.PIPE, 
-                                  stderr=subprocess.PIPE, universal_newlines=True, timeout=30)
-            
-            # 如果退出码为0，则说明源可用
-            return process.returncode == 0
-        except subprocess.TimeoutExpired:
-            logger.warning("YUM源测试超时，网络可能存在问题")
-            return False
-        except Exception as e:
-            logger.warning(f"测试YUM源时发生错误: {e}")
-            return False
-    
-    if local_test_yum_repo():
+    if _probe_yum_repo():
         logger.info("当前软件源配置正常，无需修复")
         return True
     
@@ -279,92 +233,21 @@ def check_and_fix_repo_config(os_version=None):
     if eol_status:
         logger.info(f"检测到CentOS {os_version}是EOL版本，将使用vault归档镜像")
     
-    # 备份原始软件源配置
-    # 直接实现相关函数，避免循环导入
-    def local_backup_repo_files():
-        """备份所有YUM仓库配置文件
-        
-        Returns:
-            bool: 是否成功备份
-        """
-        backup_dir = "/etc/yum.repos.d/original_backup"
-        os.makedirs(backup_dir, exist_ok=True)
-        
-        logger.info(f"备份原始YUM仓库配置到 {backup_dir}")
-        
-        try:
-            for file in os.listdir("/etc/yum.repos.d"):
-                if file.endswith(".repo"):
-                    source = os.path.join("/etc/yum.repos.d", file)
-                    target = os.path.join(backup_dir, file)
-                    if not os.path.exists(target):
-                        shutil.copy2(source, target)
-            return True
-        except Exception as e:
-            logger.error(f"备份软件源配置文件失败: {e}")
-            return False
-    
-    def local_disable_fastmirror():
-        """禁用fastmirror插件以提高稳定性
-        
-        Returns:
-            bool: 是否成功禁用
-        """
-        fastmirror_conf = "/etc/yum/pluginconf.d/fastestmirror.conf"
-        if not os.path.exists(fastmirror_conf):
-            return True
-            
-        logger.info("检测到fastmirror插件，尝试禁用...")
-        try:
-            # 备份原配置
-            backup_file = f"{fastmirror_conf}.bak"
-            if not os.path.exists(backup_file):
-                shutil.copy2(fastmirror_conf, backup_file)
-            
-            # 读取并修改配置
-            with open(fastmirror_conf, 'r') as f:
-                content = f.read()
-            
-            # 替换enabled=1为enabled=0
-            content = re.sub(r'enabled\s*=\s*1', 'enabled=0', content)
-            
-            # 写回配置
-            with open(fastmirror_conf, 'w') as f:
-                f.write(content)
-                
-            logger.info("已成功禁用fastmirror插件")
-            return True
-        except Exception as e:
-            logger.warning(f"禁用fastmirror插件失败: {e}")
-            return False
-    
-    def local_disable_all_repo_files():
-        """禁用所有默认的YUM仓库配置文件
-        
-        Returns:
-            bool: 是否成功禁用所有仓库
-        """
-        logger.info("禁用所有原始YUM仓库配置文件")
-        
-        try:
-            for file in os.listdir("/etc/yum.repos.d"):
-                if file.endswith(".repo") and not file.startswith(("original_backup", "aliyun", "tsinghua")):
-                    source = os.path.join("/etc/yum.repos.d", file)
-                    disabled = os.path.join("/etc/yum.repos.d", f"{file}.disabled")
-                    shutil.move(source, disabled)
-            return True
-        except Exception as e:
-            logger.error(f"禁用原始仓库配置失败: {e}")
-            return False
+    # 备份和禁用共用同一次目录读取的结果
+    try:
+        repo_entries = scan_repo_dir()
+    except OSError as e:
+        logger.error(f"读取软件源配置目录失败: {e}")
+        return False
     
-    # 调用本地实现的函数
-    local_backup_repo_files()
+    # 备份原始软件源配置
+    backup_repo_files(repo_entries)
     
     # 禁用fastmirror插件
-    local_disable_fastmirror()
+    disable_fastmirror()
     
     # 禁用所有原有repo文件
-    local_disable_all_repo_files()
+    disable_all_repo_files(repo_entries)
     
     # 根据系统版本和EOL状态使用不同的镜像源配置
     success = False
@@ -374,17 +257,10 @@ def check_and_fix_repo_config(os_version=None):
         success = create_standard_mirror_config(os_version)
     
     # 清理并重建YUM缓存
-    try:
-        logger.info("清理并重建YUM缓存...")
-        subprocess.run("yum clean all", shell=True, check=True, 
-                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        subprocess.run("yum makecache", shell=True, check=True, 
-                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    except subprocess.CalledProcessError as e:
-        logger.warning(f"清理或重建YUM缓存失败: {e}")
+    refresh_yum_metadata()
     
     # 再次测试软件源
-    if success and local_test_yum_repo():
+    if success and _probe_yum_repo():
         logger.info("成功修复CentOS软件源配置")
         return True
     else:
@@ -393,6 +269,60 @@ def check_and_fix_repo_config(os_version=None):
         restore_original_repo_files()
         return False
 
+def set_yum_timeout(seconds=15, yum_conf="/etc/yum.conf"):
+    """设置yum.conf中的网络超时，避免镜像无响应时yum长时间挂起
+    
+    Args:
+        seconds (int): 超时时间(秒)
+        yum_conf (str): yum配置文件路径
+        
+    Returns:
+        bool: 是否成功设置
+    """
+    try:
+        with open(yum_conf, 'r') as f:
+            content = f.read()
+        
+        line = f"timeout={seconds}"
+        if re.search(r'^timeout\s*=', content, re.M):
+            new_content = re.sub(r'^timeout\s*=.*$', line, content, flags=re.M)
+        elif re.search(r'^\[main\]', content, re.M):
+            new_content = re.sub(r'^\[main\].*$', lambda m: f"{m.group(0)}\n{line}", content, count=1, flags=re.M)
+        else:
+            new_content = f"[main]\n{line}\n{content}"
+        
+        if new_content != content:
+            _atomic_write(yum_conf, new_content)
+        return True
+    except Exception as e:
+        logger.warning(f"设置YUM超时失败: {e}")
+        return False
+
+def refresh_yum_metadata():
+    """使YUM缓存过期并重新下载元数据，每一步都有超时限制
+    
+    使用clean expire-cache和check-update代替clean all和makecache，
+    只重新下载主元数据，镜像无响应时也不会一直等待
+    
+    Returns:
+        bool: 是否成功刷新
+    """
+    logger.info("清理并重建YUM缓存...")
+    set_yum_timeout()
+    try:
+        subprocess.run(['yum', 'clean', 'expire-cache'], check=False, timeout=30,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # check-update退出码100表示有可更新的包，同样说明元数据已下载
+        process = subprocess.run(['yum', '-q', 'check-update'], check=False, timeout=45,
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return process.returncode in (0, 100)
+    except subprocess.TimeoutExpired as e:
+        logger.warning(f"重建YUM缓存超时: {e}")
+        return False
+    except OSError as e:
+        logger.warning(f"清理或重建YUM缓存失败: {e}")
+        return False
+
 def restore_original_repo_files():
     """恢复原始的YUM仓库配置文件
     
@@ -408,20 +338,19 @@ def restore_original_repo_files():
     
     try:
         # 清除当前配置
-        for file in os.listdir("/etc/yum.repos.d"):
-            if file.endswith((".repo", ".disabled")) and not file.startswith(("original_backup")):
-                os.remove(os.path.join("/etc/yum.repos.d", file))
+        with os.scandir("/etc/yum.repos.d") as it:
+            for entry in it:
+                if entry.name.endswith((".repo", ".disabled")) and entry.is_file(follow_symlinks=False):
+                    os.remove(entry.path)
         
         # 恢复备份
-        for file in os.listdir(backup_dir):
-            if file.endswith(".repo"):
-                source = os.path.join(backup_dir, file)
-                target = os.path.join("/etc/yum.repos.d", file)
-                shutil.copy2(source, target)
+        with os.scandir(backup_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".repo") and entry.is_file(follow_symlinks=False):
+                    shutil.copy2(entry.path, os.path.join("/etc/yum.repos.d", entry.name))
         
         # 重建YUM缓存
-        subprocess.run("yum clean all", shell=True, check=False)
-        subprocess.run("yum makecache", shell=True, check=False)
+        refresh_yum_metadata()
         
         logger.info("成功恢复原始YUM仓库配置")
         return True
@@ -429,57 +358,57 @@ def restore_original_repo_files():
         logger.error(f"恢复YUM仓库配置失败: {e}")
         return False
 
-def create_eol_mirror_config(centos_version):
-    """为EOL版本的CentOS创建镜像源配置
+def _create_mirror_config(centos_version, eol):
+    """依次尝试各镜像，写入第一个可用镜像的配置
+    
+    先并行请求各镜像的repomd.xml，最先响应的镜像排在前面，
+    再逐个写入配置并用yum联网验证(不使用本地缓存)，不可用时删除配置换下一个镜像。
+    yum持有全局锁，无法并行验证，因此并行只用于HTTP探测
     
     Args:
         centos_version (str): CentOS版本号
+        eol (bool): 是否为EOL版本
         
     Returns:
         bool: 是否成功创建配置
     """
-    logger.info(f"检测到CentOS {centos_version} EOL版本，使用vault归档镜像")
-    
-    # 不同版本的CentOS使用不同的vault版本
-    vault_version = CENTOS_EOL_VERSIONS.get(centos_version, "7.9.2009")
-    
-    # 尝试使用阿里云镜像
-    mirror_config = generate_aliyun_eol_config(centos_version, vault_version)
-    
-    mirror_file = "/etc/yum.repos.d/aliyun-mirror.repo"
-    try:
-        with open(mirror_file, 'w') as f:
-            f.write(mirror_config)
-        logger.info("成功创建阿里云镜像源配置")
-        
-        # 测试镜像源是否可用
-        if local_test_yum_repo():
-            return True
-    except Exception as e:
-        logger.error(f"创建阿里云镜像源配置失败: {e}")
-    
-    # 如果阿里云镜像失败，尝试清华镜像
-    try:
-        # 删除阿里云配置
-        if os.path.exists(mirror_file):
+    mirrors = ["aliyun", "tsinghua"]
+    attempts = [(mirror, mirror, functools.partial(is_url_accessible, _mirror_repomd_url(mirror, centos_version, eol)))
+                for mirror in mirrors]
+    winner = race_fetch(attempts, discard=lambda _: None)
+    if winner:
+        logger.info(f"{MIRRORS[winner[0]]['name']}镜像响应最快，优先使用")
+        mirrors.sort(key=lambda mirror: mirror != winner[0])
+    
+    kind = "" if eol else "标准"
+    for mirror in mirrors:
+        name = MIRRORS[mirror]['name']
+        mirror_file = f"/etc/yum.repos.d/{mirror}-mirror.repo"
+        try:
+            _atomic_write(mirror_file, generate_repo_config(mirror, centos_version, eol))
+            logger.info(f"成功创建{name}{kind}镜像源配置")
+            
+            # 测试镜像源是否可用
+            if _probe_yum_repo():
+                return True
             os.remove(mirror_file)
-        
-        # 创建清华源配置
-        tsinghua_config = generate_tsinghua_eol_config(centos_version, vault_version)
-        tsinghua_file = "/etc/yum.repos.d/tsinghua-mirror.repo"
-        
-        with open(tsinghua_file, 'w') as f:
-            f.write(tsinghua_config)
-        logger.info("成功创建清华镜像源配置")
-        
-        # 测试镜像源是否可用
-        if local_test_yum_repo():
-            return True
-    except Exception as e:
-        logger.error(f"创建清华镜像源配置失败: {e}")
+        except Exception as e:
+            logger.error(f"创建{name}{kind}镜像源配置失败: {e}")
     
     return False
 
+def create_eol_mirror_config(centos_version):
+    """为EOL版本的CentOS创建镜像源配置
+    
+    Args:
+        centos_version (str): CentOS版本号
+        
+    Returns:
+        bool: 是否成功创建配置
+    """
+    logger.info(f"检测到CentOS {centos_version} EOL版本，使用vault归档镜像")
+    return _create_mirror_config(centos_version, True)
+
 def create_standard_mirror_config(centos_version):
     """为标准版本的CentOS创建镜像源配置
     
@@ -490,40 +419,4 @@ def create_standard_mirror_config(centos_version):
         bool: 是否成功创建配置
     """
     logger.info(f"为CentOS {centos_version}创建标准版本镜像源配置")
-    
-    # 尝试使用阿里云镜像
-    mirror_config = generate_aliyun_standard_config(centos_version)
-    
-    mirror_file = "/etc/yum.repos.d/aliyun-mirror.repo"
-    try:
-        with open(mirror_file, 'w') as f:
-            f.write(mirror_config)
-        logger.info("成功创建阿里云标准镜像源配置")
-        
-        # 测试镜像源是否可用
-        if local_test_yum_repo():
-            return True
-    except Exception as e:
-        logger.error(f"创建阿里云标准镜像源配置失败: {e}")
-    
-    # 如果阿里云镜像失败，尝试清华镜像
-    try:
-        # 删除阿里云配置
-        if os.path.exists(mirror_file):
-            os.remove(mirror_file)
-        
-        # 创建清华源配置
-        tsinghua_config = generate_tsinghua_standard_config(centos_version)
-        tsinghua_file = "/etc/yum.repos.d/tsinghua-mirror.repo"
-        
-        with open(tsinghua_file, 'w') as f:
-            f.write(tsinghua_config)
-        logger.info("成功创建清华标准镜像源配置")
-        
-        # 测试镜像源是否可用
-        if local_test_yum_repo():
-            return True
-    except Exception as e:
-        logger.error(f"创建清华标准镜像源配置失败: {e}")
-    
-    return False
+    return _create_mirror_config(centos_version, False)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+安装状态管理模块
+在缓存目录中记录已完成的安装步骤，重复运行安装脚本时跳过这些步骤
+"""
+
+import os
+import sys
+import json
+import logging
+
+try:
+    from modules.constants import INSTALLER_STATE_FILE
+except ImportError as e:
+    logging.error(f"导入模块时出错: {e}")
+    sys.exit(1)
+
+logger = logging.getLogger('modsecurity_installer')
+
+def load_state(state_file=INSTALLER_STATE_FILE):
+    """读取安装状态
+    
+    Args:
+        state_file (str): 状态文件路径
+        
+    Returns:
+        dict: 安装状态，文件不存在或损坏时返回空字典
+    """
+    try:
+        with open(state_file, 'r') as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (IOError, OSError, ValueError):
+        return {}
+
+def save_state(state, state_file=INSTALLER_STATE_FILE):
+    """保存安装状态
+    
+    Args:
+        state (dict): 安装状态
+        state_file (str): 状态文件路径
+        
+    Returns:
+        bool: 是否成功保存
+    """
+    try:
+        state_dir = os.path.dirname(state_file)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        tmp_file = state_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_file, state_file)
+        return True
+    except (IOError, OSError) as e:
+        logger.warning(f"保存安装状态失败: {e}")
+        return False
+
+def update_state(state_file=INSTALLER_STATE_FILE, **changes):
+    """更新安装状态中的若干字段
+    
+    Args:
+        state_file (str): 状态文件路径
+        **changes: 要更新的字段
+        
+    Returns:
+        bool: 是否成功保存
+    """
+    state = load_state(state_file)
+    state.update(changes)
+    return save_state(state, state_file)
+
+def reset_state(state_file=INSTALLER_STATE_FILE):
+    """清除安装状态，下次运行时重新执行所有步骤
+    
+    Args:
+        state_file (str): 状态文件路径
+        
+    Returns:
+        bool: 是否成功清除
+    """
+    try:
+        os.remove(state_file)
+        logger.info("已清除安装状态记录")
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"清除安装状态失败: {e}")
+        return False
+    return True
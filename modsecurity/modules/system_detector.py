@@ -7,11 +7,14 @@
 
 import os
 import re
+import shutil
 import subprocess
 import logging
 import sys
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
 
 # 导入常量模块
 try:
@@ -22,6 +25,16 @@ except ImportError as e:
 
 logger = logging.getLogger('modsecurity_installer')
 
+_RELEASE_RE = re.compile(r'release\s+(\d+)')
+_NGINX_VER_RE = re.compile(r'nginx/(\d+\.\d+\.\d+)')
+_GCC_VER_RE = re.compile(r'\s(\d+\.\d+\.\d+)')
+
+# CentOS 6于2020年11月EOL，CentOS 8于2021年12月EOL，
+# CentOS 7于2024年6月EOL，2024-07-01 00:00 UTC之后视为EOL
+_CENTOS_EOL_STATUS = {"6": True, "8": True}
+_CENTOS7_EOL_EPOCH = 1719792000
+
+@lru_cache(maxsize=1)
 def get_distro_family():
     """检测系统类型
     
@@ -35,56 +48,50 @@ def get_distro_family():
     else:
         return 'unknown'
 
+@lru_cache(maxsize=1)
 def get_centos_version():
     """获取CentOS/RHEL版本号
     
+    版本号在一次运行中不会变化，发行版文件只读取一次
+    
     Returns:
         str: 版本号，如'7'或'8'，默认为'7'
     """
     version = "7"  # 默认值
     
-    try:
-        if os.path.exists("/etc/centos-release"):
-            with open("/etc/centos-release", "r") as f:
-                version_line = f.read().strip()
-                match = re.search(r'release\s+(\d+)', version_line)
-                if match:
-                    version = match.group(1)
-                    logger.info(f"检测到CentOS版本: {version}")
-        elif os.path.exists("/etc/redhat-release"):
-            with open("/etc/redhat-release", "r") as f:
-                version_line = f.read().strip()
-                match = re.search(r'release\s+(\d+)', version_line)
-                if match:
-                    version = match.group(1)
-                    logger.info(f"检测到RHEL版本: {version}")
-    except Exception as e:
-        logger.warning(f"检测系统版本失败，将使用默认版本 {version}: {e}")
+    for release_file, distro in (("/etc/centos-release", "CentOS"), ("/etc/redhat-release", "RHEL")):
+        # 直接读取，文件不存在时跳过，不再单独检查是否存在
+        try:
+            match = _RELEASE_RE.search(Path(release_file).read_text())
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            logger.warning(f"检测系统版本失败，将使用默认版本 {version}: {e}")
+            break
+        if match:
+            version = match.group(1)
+            logger.info(f"检测到{distro}版本: {version}")
+            break
     
     return version
 
+@lru_cache(maxsize=4)
 def is_centos_eol(version):
     """检查指定的CentOS版本是否已经EOL
     
+    结果按版本号缓存
+    
     Args:
         version (str): CentOS版本号，如'7'或'8'
     
     Returns:
         bool: 如果版本已EOL返回True，否则返回False
     """
-    # CentOS 6于2020年11月EOL
-    # CentOS 7于2024年6月EOL
-    # CentOS 8于2021年12月EOL
-    if version == "6" or version == "8":
-        return True
-    elif version == "7":
-        # 检查当前日期，2024年6月之后CentOS 7也是EOL
-        current_date = datetime.now()
-        if current_date.year > 2024 or (current_date.year == 2024 and current_date.month > 6):
-            return True
-    
-    return False
+    if version == "7":
+        return time.time() >= _CENTOS7_EOL_EPOCH
+    return _CENTOS_EOL_STATUS.get(version, False)
 
+@lru_cache(maxsize=1)
 def detect_bt_panel():
     """检测是否为宝塔面板环境
     
@@ -96,6 +103,15 @@ def detect_bt_panel():
         return True
     return False
 
+@lru_cache(maxsize=1)
+def _which_nginx():
+    """在PATH中查找nginx可执行文件
+    
+    Returns:
+        str: nginx路径，找不到时返回空字符串
+    """
+    return shutil.which("nginx") or ""
+
 def get_nginx_info():
     """获取Nginx信息
     
@@ -111,16 +127,15 @@ def get_nginx_info():
     
     # 如果宝塔指定路径不存在，尝试在系统路径中查找
     if not os.path.exists(nginx_path):
-        try:
-            nginx_path = subprocess.check_output("which nginx", shell=True, stderr=subprocess.PIPE, universal_newlines=True).strip()
-        except subprocess.CalledProcessError:
+        nginx_path = _which_nginx()
+        if not nginx_path:
             return False, "", ""
     
     # 检查Nginx是否可执行并获取版本
     if os.path.exists(nginx_path) and os.access(nginx_path, os.X_OK):
         try:
-            version_output = subprocess.check_output(f"{nginx_path} -v", shell=True, stderr=subprocess.STDOUT, universal_newlines=True)
-            version_match = re.search(r'nginx/(\d+\.\d+\.\d+)', version_output)
+            version_output = subprocess.check_output([nginx_path, "-v"], stderr=subprocess.STDOUT, universal_newlines=True)
+            version_match = _NGINX_VER_RE.search(version_output)
             if version_match:
                 version = version_match.group(1)
                 logger.info(f"检测到Nginx版本: {version}")
@@ -130,15 +145,18 @@ def get_nginx_info():
     
     return False, "", ""
 
+@lru_cache(maxsize=1)
 def check_gcc_version():
     """检查GCC版本是否支持C++17
     
+    结果在进程内缓存；安装或切换GCC后需调用check_gcc_version.cache_clear()
+    
     Returns:
         bool: 如果GCC版本>=7返回True，否则返回False
     """
     try:
-        gcc_version_output = subprocess.check_output("gcc --version", shell=True, stderr=subprocess.STDOUT, universal_newlines=True)
-        version_match = re.search(r'\s(\d+\.\d+\.\d+)', gcc_version_output)
+        gcc_version_output = subprocess.check_output(["gcc", "--version"], stderr=subprocess.STDOUT, universal_newlines=True)
+        version_match = _GCC_VER_RE.search(gcc_version_output)
         if version_match:
             gcc_version = version_match.group(1)
             logger.info(f"检测到GCC版本: {gcc_version}")
@@ -158,9 +176,42 @@ def check_gcc_version():
         logger.warning("系统上可能未安装GCC")
         return False
 
+def get_build_jobs():
+    """获取make并行编译的任务数
+    
+    默认使用CPU核数，可通过环境变量MODSEC_BUILD_JOBS限制(如CI中内存较小时)
+    
+    Returns:
+        int: 并行任务数，至少为1
+    """
+    jobs = os.environ.get('MODSEC_BUILD_JOBS', '').strip()
+    if jobs.isdigit() and int(jobs) > 0:
+        return int(jobs)
+    return os.cpu_count() or 2
+
+def paths_exist(paths):
+    """同时检查多个路径是否存在
+    
+    在NFS等网络文件系统上每次stat都需要一次往返，并行检查可以重叠这些等待
+    
+    Args:
+        paths (list): 路径列表
+        
+    Returns:
+        list: 与paths一一对应的bool列表
+    """
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [os.path.exists(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as executor:
+        return list(executor.map(os.path.exists, paths))
+
+@lru_cache(maxsize=1)
 def detect_os():
     """检测操作系统类型和版本号
     
+    系统信息在一次运行中不会变化，结果只检测一次
+    
     Returns:
         tuple: (os_type, os_version)，os_type可能为'rhel'、'debian'或'unknown'，
                os_version为版本号，如'7'或'8'
@@ -179,16 +230,15 @@ def detect_os():
     
     return os_type, os_version
 
-def system_info_summary():
-    """生成系统信息摘要
+def os_info():
+    """获取操作系统信息，不启动任何子进程
+    
+    各项检测结果均已缓存，可以反复调用
     
     Returns:
-        dict: 包含系统信息的字典
+        dict: 包含os_type、os_version、is_bt_panel和is_eol的字典
     """
     os_type, os_version = detect_os()
-    is_bt = detect_bt_panel()
-    nginx_installed, nginx_version, nginx_path = get_nginx_info()
-    gcc_supported = check_gcc_version()
     
     # 检查CentOS是否为EOL版本
     is_eol = False
@@ -200,14 +250,34 @@ def system_info_summary():
     return {
         'os_type': os_type,
         'os_version': os_version,
-        'is_bt_panel': is_bt,
+        'is_bt_panel': detect_bt_panel(),
+        'is_eol': is_eol
+    }
+
+def tool_info():
+    """获取Nginx和GCC信息，需要运行nginx -v和gcc --version
+    
+    Returns:
+        dict: 包含nginx_installed、nginx_version、nginx_path和gcc_supports_cpp17的字典
+    """
+    nginx_installed, nginx_version, nginx_path = get_nginx_info()
+    return {
         'nginx_installed': nginx_installed,
         'nginx_version': nginx_version,
         'nginx_path': nginx_path,
-        'gcc_supports_cpp17': gcc_supported,
-        'is_eol': is_eol
+        'gcc_supports_cpp17': check_gcc_version()
     }
 
+def system_info_summary():
+    """生成系统信息摘要
+    
+    只需要系统类型和版本时应调用os_info()，避免检测Nginx和GCC
+    
+    Returns:
+        dict: 包含系统信息的字典
+    """
+    return {**os_info(), **tool_info()}
+
 # 如果直接运行此脚本，则输出系统信息
 if __name__ == "__main__":
     import json
@@ -5,32 +5,105 @@ import os
 import re
 import csv
 import argparse
+import array
+import bisect
+import functools
+import hashlib
 import json
+import mmap
+import sqlite3
 import sys
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import NamedTuple
+
+# 可选依赖：安装了hyperscan时先用它一次扫描整个文件，筛选出可能匹配的特征
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+# 可选依赖：安装了pyahocorasick时用一个自动机一次查找所有关键字
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 可选依赖：安装了google-re2时逐行用一个RE2::Set同时筛选所有特征(线性时间)，命中的行再用re确认
+try:
+    import re2
+except ImportError:
+    re2 = None
 
 # 存储用户选择的检测特征
 USER_SELECTED_PATTERNS = None
 
-def get_context_lines(lines, line_number, context=2):
+# 默认跳过超过该大小(MB)的文件，通常是打包或压缩后的代码
+DEFAULT_MAX_FILE_SIZE_MB = 5
+
+# 检查文件开头多少字节内是否有NUL字节，用于识别二进制文件
+BINARY_CHECK_SIZE = 4096
+
+# 默认不进入的目录，第三方依赖目录可通过--include-vendor扫描
+VENDOR_DIRS = ('vendor', 'node_modules')
+DEFAULT_EXCLUDED_DIRS = ('.git',) + VENDOR_DIRS
+
+# 默认的扫描结果缓存文件，文件未变化且特征相同时直接使用上次的结果
+DEFAULT_RESULT_CACHE = '.php_scan_cache.sqlite'
+
+# 扫描逻辑的版本，计入缓存键；修改会改变扫描结果的逻辑(预筛选、匹配方式等)时递增，使旧缓存失效
+SCANNER_VERSION = 2
+
+
+
+class Finding(NamedTuple):
+    """一条疑似问题记录，前五个字段依次对应CSV中序号之后的各列"""
+    file_path: str
+    line_number: int
+    issue_type: str
+    line_content: str
+    code_context: str
+    pattern_id: int
+
+
+# 按特征ID组合缓存的hyperscan数据库
+_HYPERSCAN_DATABASES = {}
+
+def get_line_offsets(content):
+    """返回content中每个换行符的位置，第N行为get_line(content, offsets, N)"""
+    return array.array('L', (match.start() for match in re.finditer('\n', content)))
+
+
+def get_line(content, line_offsets, line_number):
+    """按换行符位置切出第line_number行(从1开始)，不含换行符"""
+    start = line_offsets[line_number - 2] + 1 if line_number > 1 else 0
+    end = line_offsets[line_number - 1] if line_number <= len(line_offsets) else len(content)
+    return content[start:end]
+
+
+def get_context_lines(content, line_offsets, line_number, context=2):
     """获取代码上下文"""
     start = max(0, line_number - context - 1)
-    end = min(len(lines), line_number + context)
+    end = min(len(line_offsets) + 1, line_number + context)
     
     result = []
     for i in range(start, end):
         line_num = i + 1  # 行号从1开始
         prefix = '>' if line_num == line_number else ' '
-        result.append(f"{prefix} {line_num:4d}: {lines[i]}")
+        result.append(f"{prefix} {line_num:4d}: {get_line(content, line_offsets, line_num)}")
     
     return '\n'.join(result)
 
 # Define suspicious patterns that might indicate PHP file tampering
+# keywords: 特征匹配时必然包含其中至少一个的小写关键字，用于在正则之前快速排除文件；
+# None表示没有可用的关键字，总是需要正则检查
 SUSPICIOUS_PATTERNS = [
     # Base64 encoded payloads (common in web shells)
     {
         'id': 1,
         'pattern': r'(?:eval|assert|system)\s*\(\s*(?:base64_decode|str_rot13)\s*\(',
+        'keywords': ['base64_decode', 'str_rot13'],
         'type': 'Encoded Command Execution',
         'description': 'Potential execution of encoded/obfuscated code',
         'default': True
@@ -39,6 +112,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 2,
         'pattern': r'(?:exec|shell_exec|passthru|system)\s*\(\s*\$_(?:GET|POST|REQUEST|COOKIE)\s*\[',
+        'keywords': ['$_get', '$_post', '$_request', '$_cookie'],
         'type': 'Command Injection',
         'description': 'Direct execution of user-controlled input',
         'default': False
@@ -47,6 +121,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 3,
         'pattern': r'(?:file_get_contents|file_put_contents|fopen|readfile)\s*\(\s*\$_(?:GET|POST|REQUEST|COOKIE)',
+        'keywords': ['$_get', '$_post', '$_request', '$_cookie'],
         'type': 'Suspicious File Operation',
         'description': 'File operations with user input',
         'default': False
@@ -55,6 +130,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 4,
         'pattern': r'(?:create_function|ReflectionFunction)\s*\(\s*(?:\$|[\'\"])',
+        'keywords': ['create_function', 'reflectionfunction'],
         'type': 'Dynamic Function Creation',
         'description': 'Dynamic function creation (potential code injection)',
         'default': False
@@ -63,6 +139,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 5,
         'pattern': r'(?:mysql_query|mysqli_query)\s*\(.*?\$_(?:GET|POST|REQUEST|COOKIE)',
+        'keywords': ['$_get', '$_post', '$_request', '$_cookie'],
         'type': 'SQL Injection Vulnerability',
         'description': 'Unsafe SQL query with user input',
         'default': False
@@ -71,6 +148,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 6,
         'pattern': r'`\s*\$_(?:GET|POST|REQUEST|COOKIE)',
+        'keywords': ['$_get', '$_post', '$_request', '$_cookie'],
         'type': 'Command Execution',
         'description': 'Execution of shell commands via backticks',
         'default': False
@@ -79,6 +157,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 7,
         'pattern': r'preg_replace\s*\(\s*[\'\"]/.*/e[\'\"]',
+        'keywords': ['preg_replace'],
         'type': 'Code Execution',
         'description': 'Vulnerable preg_replace with /e modifier',
         'default': False
@@ -87,6 +166,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 8,
         'pattern': r'\$[a-zA-Z0-9_]{1,2}\s*=\s*[\'\"][a-zA-Z0-9+/=]+[\'\"]',
+        'keywords': ['$'],
         'type': 'Code Obfuscation',
         'description': 'Potentially obfuscated variable assignments',
         'default': False
@@ -95,6 +175,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 9,
         'pattern': r'<\?php.*?<iframe.*?src\s*=\s*[\'\"]http',
+        'keywords': ['<iframe'],
         'type': 'Malicious Content',
         'description': 'PHP code inserting iframe to external source',
         'default': False
@@ -103,6 +184,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 10,
         'pattern': r'(?:include|require|include_once|require_once)\s*\(\s*[\'\"](?:https?:|ftp:|php:|data:)',
+        'keywords': ['include', 'require'],
         'type': 'Remote File Inclusion',
         'description': 'Including content from remote URLs',
         'default': False
@@ -111,6 +193,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 11,
         'pattern': r'(?:eval|assert)\s*\(\s*\$_(?:GET|POST|REQUEST|COOKIE)',
+        'keywords': ['$_get', '$_post', '$_request', '$_cookie'],
         'type': 'Direct Code Injection',
         'description': 'Direct execution of user input',
         'default': False
@@ -119,6 +202,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 12,
         'pattern': r'extract\s*\(\s*\$_(?:GET|POST|REQUEST|COOKIE)',
+        'keywords': ['extract'],
         'type': 'Variable Manipulation',
         'description': 'Unsafe use of extract() with user input',
         'default': False
@@ -127,6 +211,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 13,
         'pattern': r'\$_FILES.*?[\'\"]tmp_name[\'\"].*?move_uploaded_file',
+        'keywords': ['move_uploaded_file'],
         'type': 'Unsafe File Upload',
         'description': 'Potential unsafe file upload handler',
         'default': False
@@ -135,6 +220,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 14,
         'pattern': r'<input.+?type\s*=\s*[\'\"]hidden[\'\"].+?value\s*=\s*[\'\"](?:http|eval|base64|PHNjcmlwdD|PHN2Zz|PHhtbD)',
+        'keywords': ['<input'],
         'type': 'Suspicious Hidden Input',
         'description': 'Hidden input with suspicious value',
         'default': False
@@ -143,22 +229,30 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 15,
         'pattern': r'^<\?php.{0,10}(?:eval|assert|base64_decode|str_rot13)\s*\(.{0,30}',
+        'keywords': ['<?php'],
         'type': 'Header Injection',
         'description': 'Suspicious code at file beginning',
-        'default': False
+        'default': False,
+        # 只在文件开头匹配：编译时去掉^，扫描时只用match()检查第一行
+        'anchored': True
     },
     # Content irregularities (large blocks of obfuscated code)
     {
         'id': 16,
         'pattern': r'[a-zA-Z0-9+/=]{100,}',
+        'keywords': None,
         'type': 'Encoded Data',
         'description': 'Large block of encoded data',
-        'default': False
+        'default': False,
+        # 匹配不会跨行，直接在整个文件上找出每段连续编码字符，再按位置定位行；
+        # 后行断言使每段只从开头尝试一次，避免在段内每个位置重新匹配
+        'finder': r'(?<![a-zA-Z0-9+/=])[a-zA-Z0-9+/=]{100,}'
     },
     # 输出编码内容 (可能是二阶注入或隐藏的JavaScript)
     {
         'id': 17,
         'pattern': r'(?:echo|print|<?=)\s*(?:base64_decode|str_rot13)\s*\(',
+        'keywords': ['base64_decode', 'str_rot13'],
         'type': 'Encoded Content Output',
         'description': 'Suspicious output of encoded/obfuscated content',
         'default': True
@@ -167,6 +261,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 18,
         'pattern': r'(?:base64_decode|str_rot13|gzinflate|gzuncompress|gzdecode)\s*\(\s*(?:base64_decode|str_rot13|gzinflate|gzuncompress|gzdecode)',
+        'keywords': ['base64_decode', 'str_rot13', 'gzinflate', 'gzuncompress', 'gzdecode'],
         'type': 'Multi-layer Encoding',
         'description': 'Multiple layers of encoding (common in obfuscated malware)',
         'default': True
@@ -175,6 +270,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 19,
         'pattern': r'function\s+[a-zA-Z0-9_]+\s*\([^)]*\)\s*{[^}]*(?:base64_decode|str_rot13|gzinflate)[^}]*}',
+        'keywords': ['function'],
         'type': 'Suspicious Function',
         'description': 'Function containing encoding/encryption operations',
         'default': True
@@ -183,6 +279,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 20,
         'pattern': r'\$[a-zA-Z0-9_]+\s*=\s*base64_decode\([^)]+\);\s*(?:echo|print)\s*\$[a-zA-Z0-9_]+',
+        'keywords': ['base64_decode'],
         'type': 'Indirect Encoded Output',
         'description': 'Decode to variable then output (obfuscation technique)',
         'default': True
@@ -191,6 +288,7 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 21,
         'pattern': r'eval\s*\([^)]*file_get_contents\s*\([^)]*base64_decode\s*\(',
+        'keywords': ['file_get_contents'],
         'type': 'Remote Code Execution',
         'description': 'Loading and executing code from encoded remote URL',
         'default': True
@@ -199,78 +297,475 @@ SUSPICIOUS_PATTERNS = [
     {
         'id': 22,
         'pattern': r'(?:ini_set|error_reporting)\s*\([^)]*display_errors[^)]*\)[^;]*;\s*(?:eval|assert|system)',
+        'keywords': ['display_errors'],
         'type': 'Error Hiding + Code Execution',
         'description': 'Disabling error display before executing suspicious code',
         'default': True
     }
 ]
 
+# 导入时预编译所有特征，扫描时不再经过re模块的缓存查找。
+# 逐行匹配时用search(content, 行首, 行尾)限定在一行内，MULTILINE使^在行首(而不只是文件开头)匹配，
+# 与对切分出的单行字符串匹配的结果相同
+for _pattern_info in SUSPICIOUS_PATTERNS:
+    _pattern_source = _pattern_info['pattern'][1:] if _pattern_info.get('anchored') else _pattern_info['pattern']
+    _pattern_info['compiled'] = re.compile(_pattern_source, re.IGNORECASE | re.MULTILINE)
+    if 'finder' in _pattern_info:
+        _pattern_info['compiled_finder'] = re.compile(_pattern_info['finder'], re.IGNORECASE)
+
+
+# Python的\s(str模式)包含的所有空白字符；hyperscan和RE2的\s都不含\x1c-\x1f等字符，
+# 交给它们的特征把\s替换成这个字符类
+_UNICODE_WHITESPACE = (r'[\t\n\x0b\f\r\x1c-\x1f \x{85}\x{a0}\x{1680}\x{2000}-\x{200a}'
+                       r'\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}]')
+
+# 忽略大小写时Python让i匹配这两个字符而hyperscan和RE2不会，文件中出现时只用re匹配
+_DOTTED_I_CHARS = ('\u0130', '\u0131')
+
+
+def to_external_pattern(pattern):
+    """把特征转换为hyperscan/RE2使用的写法，使\s与Python的\s匹配相同的字符"""
+    return pattern.replace(r'\s', _UNICODE_WHITESPACE)
+
+
+def get_hyperscan_database(patterns):
+    """为一组特征编译hyperscan数据库，未安装hyperscan或编译失败时返回None"""
+    if hyperscan is None:
+        return None
+    
+    key = tuple(pattern['id'] for pattern in patterns)
+    if key not in _HYPERSCAN_DATABASES:
+        # 每个特征只需知道文件中是否存在匹配，SINGLEMATCH让每个特征最多回调一次
+        flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH |
+                 hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP)
+        database = hyperscan.Database()
+        try:
+            database.compile(
+                expressions=[to_external_pattern(pattern['pattern']).encode('utf-8') for pattern in patterns],
+                ids=list(key),
+                elements=len(patterns),
+                flags=[flags] * len(patterns)
+            )
+        except hyperscan.error as e:
+            print(f"hyperscan编译特征失败，将使用re逐个匹配: {e}")
+            database = None
+        _HYPERSCAN_DATABASES[key] = database
+    return _HYPERSCAN_DATABASES[key]
+
+
+def fold_for_keywords(content):
+    """把文件内容转换为用于查找关键字的小写形式
+    
+    re的IGNORECASE还会把ſ、K(开尔文符号)、ı和İ当作ASCII字母匹配，
+    非ASCII内容用casefold并把后两者还原为i，保证不漏掉正则可能匹配的文件
+    """
+    if content.isascii():
+        return content.lower()
+    return content.casefold().replace('\u0131', 'i').replace('i\u0307', 'i')
+
+
+# 按特征ID组合缓存的关键字索引
+_KEYWORD_INDEXES = {}
+
+def get_keyword_index(patterns):
+    """建立关键字到特征ID的索引
+    
+    返回(关键字查找器, 没有关键字的特征ID集合)。安装了pyahocorasick时查找器为自动机，
+    否则为关键字到特征ID集合的字典
+    """
+    key = tuple(pattern['id'] for pattern in patterns)
+    if key not in _KEYWORD_INDEXES:
+        keyword_ids = {}
+        always_ids = set()
+        for pattern_info in patterns:
+            if not pattern_info['keywords']:
+                always_ids.add(pattern_info['id'])
+                continue
+            for keyword in pattern_info['keywords']:
+                keyword_ids.setdefault(keyword, set()).add(pattern_info['id'])
+        
+        finder = keyword_ids
+        if ahocorasick is not None and keyword_ids:
+            finder = ahocorasick.Automaton()
+            for keyword, ids in keyword_ids.items():
+                finder.add_word(keyword, frozenset(ids))
+            finder.make_automaton()
+        _KEYWORD_INDEXES[key] = (finder, frozenset(always_ids))
+    return _KEYWORD_INDEXES[key]
+
+
+def find_keyword_pattern_ids(patterns, content):
+    """根据关键字找出文件中可能匹配的特征ID"""
+    finder, always_ids = get_keyword_index(patterns)
+    candidate_ids = set(always_ids)
+    if not finder:
+        return candidate_ids
+    
+    folded = fold_for_keywords(content)
+    if isinstance(finder, dict):
+        for keyword, ids in finder.items():
+            if keyword in folded:
+                candidate_ids.update(ids)
+    else:
+        for _, ids in finder.iter(folded):
+            candidate_ids.update(ids)
+    return candidate_ids
+
+
+def get_leading_chars(pattern_info):
+    """返回特征可能的首字符(小写)，无法确定或需要单独检查的特征返回None"""
+    pattern = pattern_info['pattern']
+    if pattern_info.get('anchored'):
+        return None
+    if pattern.startswith('(?:'):
+        alternatives = pattern[3:pattern.index(')')].split('|')
+        if any(not alternative or alternative[0] in '\\[(.^' for alternative in alternatives):
+            return None
+        return frozenset(alternative[0].lower() for alternative in alternatives)
+    if pattern.startswith('\\'):
+        return frozenset(pattern[1])
+    if pattern[0] in '[(.^':
+        return None
+    return frozenset(pattern[0].lower())
+
+
+# 按特征ID组合缓存的分组预检正则
+_PATTERN_BUCKETS = {}
+
+def get_pattern_buckets(patterns):
+    """按可能的首字符把特征分组，每组合并成一个交替正则，用于在整个文件上预检
+    
+    返回(预检正则, 特征ID列表)的列表。预检只判断组内是否有特征可能匹配，
+    组内特征仍各自逐行匹配，避免交替正则中先匹配的特征遮住其他特征
+    """
+    key = tuple(pattern['id'] for pattern in patterns)
+    if key not in _PATTERN_BUCKETS:
+        groups = {}
+        for pattern_info in patterns:
+            leading = get_leading_chars(pattern_info)
+            # 首字符不确定的特征单独成组
+            group_key = leading if leading is not None else ('id', pattern_info['id'])
+            groups.setdefault(group_key, []).append(pattern_info)
+        _PATTERN_BUCKETS[key] = [
+            (re.compile('|'.join(f"(?:{pattern_info['pattern']})" for pattern_info in group), re.IGNORECASE),
+             [pattern_info['id'] for pattern_info in group])
+            for group in groups.values()
+        ]
+    return _PATTERN_BUCKETS[key]
+
+
+def find_matching_pattern_ids(database, content):
+    """用hyperscan扫描一次文件内容，返回在文件中存在匹配的特征ID集合"""
+    matched_ids = set()
+    
+    def on_match(pattern_id, start, end, flags, context):
+        matched_ids.add(pattern_id)
+    
+    database.scan(content.encode('utf-8'), match_event_handler=on_match)
+    return matched_ids
+
+
+# 按特征ID组合缓存的RE2::Set，编译失败时为None
+_RE2_SETS = {}
+
+def get_re2_set(patterns):
+    """把一组特征编译成RE2::Set，Match()返回一行中匹配的特征在patterns中的下标；不可用时返回None"""
+    if re2 is None:
+        return None
+    key = tuple(pattern['id'] for pattern in patterns)
+    if key not in _RE2_SETS:
+        options = re2.Options()
+        options.case_sensitive = False
+        # DFA内存不足时Set.Match()只会返回没有匹配，给足内存避免漏报
+        options.max_mem = 64 << 20
+        pattern_set = re2.Set.SearchSet(options)
+        try:
+            for pattern_info in patterns:
+                pattern_set.Add(to_external_pattern(pattern_info['pattern']))
+            pattern_set.Compile()
+        except re2.error:
+            pattern_set = None
+        _RE2_SETS[key] = pattern_set
+    return _RE2_SETS[key]
+
+
+def read_php_source(file_path, max_size=None):
+    """读取PHP文件内容
+    
+    通过mmap直接解码文件，不经过文本模式的逐块读取和解码；
+    与文本模式一样把\r\n和\r统一为\n，无法解码的字节替换为U+FFFD。
+    超过max_size字节或开头包含NUL字节(二进制文件)时返回None
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return ''
+        if max_size is not None and size > max_size:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm.find(b'\x00', 0, BINARY_CHECK_SIZE) != -1:
+                return None
+            content = str(mm, 'utf-8', 'replace')
+    if '\r' in content:
+        content = content.replace('\r\n', '\n').replace('\r', '\n')
+    return content
 
-def scan_php_file(file_path):
-    """Scan a PHP file for suspicious patterns."""
+
+def make_finding(file_path, content, line_offsets, line_number, pattern_info):
+    """生成一条疑似问题记录"""
+    return Finding(
+        file_path,
+        line_number,
+        pattern_info['type'],
+        get_line(content, line_offsets, line_number).strip(),
+        # 获取代码上下文
+        get_context_lines(content, line_offsets, line_number),
+        pattern_info['id']
+    )
+
+
+def scan_php_file(file_path, patterns, max_size=None):
+    """Scan a PHP file for the given suspicious patterns; returns None if the file could not be scanned."""
     suspicious_lines = []
     try:
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
-            lines = content.split('\n')
-            
-            # Check each defined pattern that user selected
-            for pattern_info in USER_SELECTED_PATTERNS:
-                pattern = pattern_info['pattern']
-                issue_type = pattern_info['type']
-                pattern_id = pattern_info['id']
-                
-                # First check the whole content for patterns that might span multiple lines
-                if re.search(pattern, content, re.IGNORECASE):
-                    # If found, identify the specific lines
-                    for i, line in enumerate(lines, 1):
-                        if re.search(pattern, line, re.IGNORECASE):
-                            # 获取代码上下文
-                            code_context = get_context_lines(lines, i)
-                            
-                            suspicious_lines.append({
-                                'file_path': file_path,
-                                'line_number': i,
-                                'issue_type': issue_type,
-                                'line_content': line.strip(),
-                                'code_context': code_context,
-                                'pattern_id': pattern_id
-                            })
+        content = read_php_source(file_path, max_size)
+        if content is None:
+            return suspicious_lines
+
+        # 先在整个文件上筛选出可能匹配的特征，其余特征不必再逐行匹配：
+        # 有hyperscan时一次扫描即可，否则按首字符分组，每组用一个合并的正则预检
+        # 含有ı或İ的文件不用hyperscan和RE2，它们忽略大小写时不会把这两个字符当作i
+        external_safe = not any(char in content for char in _DOTTED_I_CHARS)
+        database = get_hyperscan_database(patterns) if external_safe else None
+        if database:
+            matched_ids = find_matching_pattern_ids(database, content)
+        else:
+            # 先按关键字排除不可能匹配的特征，只对剩下的分组运行预检正则
+            candidate_ids = find_keyword_pattern_ids(patterns, content)
+            matched_ids = set()
+            for bucket, bucket_ids in get_pattern_buckets(patterns):
+                if not candidate_ids.isdisjoint(bucket_ids) and bucket.search(content):
+                    matched_ids.update(candidate_ids.intersection(bucket_ids))
+        
+        # 没有可能匹配的特征时不必定位行
+        if not matched_ids:
+            return suspicious_lines
+        line_offsets = get_line_offsets(content)
+        
+        # 某一行匹配时整个文件必然匹配，预检未通过的特征直接跳过；
+        # 只在文件开头匹配的特征(anchored)单独成组，预检即是对它自身的检查
+        active_patterns = [pattern_info for pattern_info in patterns
+                           if pattern_info['id'] in matched_ids]
+        
+        findings = [[] for _ in active_patterns]
+        line_patterns = []
+        for pattern_info, pattern_findings in zip(active_patterns, findings):
+            if pattern_info.get('anchored'):
+                # 只从文件第一行的开头尝试匹配，不参与逐行检查
+                first_line_end = line_offsets[0] if line_offsets else len(content)
+                if pattern_info['compiled'].match(content, 0, first_line_end):
+                    pattern_findings.append(make_finding(file_path, content, line_offsets, 1, pattern_info))
+                continue
+            finder = pattern_info.get('compiled_finder')
+            if finder is None:
+                line_patterns.append((pattern_info, pattern_findings))
+                continue
+            # 在整个文件上查找，匹配位置之前的换行符个数即所在行之前的行数
+            last_line = 0
+            for match in finder.finditer(content):
+                i = bisect.bisect_left(line_offsets, match.start()) + 1
+                if i != last_line:
+                    pattern_findings.append(make_finding(file_path, content, line_offsets, i, pattern_info))
+                    last_line = i
+        
+        # 逐行检查其余特征，每行只遍历一次；结果按特征分别收集，保持按特征、再按行号的输出顺序。
+        # 有RE2时每行只做一次RE2::Set匹配，命中的特征再用re确认，保证结果与re一致
+        pattern_set = get_re2_set([pattern_info for pattern_info, _ in line_patterns]) if line_patterns else None
+        if pattern_set is not None and external_safe:
+            start = 0
+            for i, end in enumerate(chain(line_offsets, (len(content),)), 1):
+                hits = pattern_set.Match(content[start:end])
+                if hits:
+                    for index in sorted(hits):
+                        pattern_info, pattern_findings = line_patterns[index]
+                        if pattern_info['compiled'].search(content, start, end):
+                            pattern_findings.append(make_finding(file_path, content, line_offsets, i, pattern_info))
+                start = end + 1
+        # 直接在content的行范围内匹配，只有命中的行和它的上下文才切出字符串
+        elif line_patterns:
+            start = 0
+            for i, end in enumerate(chain(line_offsets, (len(content),)), 1):
+                for pattern_info, pattern_findings in line_patterns:
+                    if pattern_info['compiled'].search(content, start, end):
+                        pattern_findings.append(make_finding(file_path, content, line_offsets, i, pattern_info))
+                start = end + 1
+        
+        for pattern_findings in findings:
+            suspicious_lines.extend(pattern_findings)
     except Exception as e:
         print(f"Error scanning {file_path}: {str(e)}")
+        # 与“没有发现问题”区分开，出错的结果不写入缓存
+        return None
     
     return suspicious_lines
 
 
-def scan_directory(directory_path):
-    """Recursively scan a directory for PHP files."""
-    all_suspicious_lines = []
+# 工作进程中要检测的特征，由init_scan_worker在进程启动时设置一次
+_WORKER_PATTERNS = None
+
+def init_scan_worker(pattern_ids):
+    """进程池初始化函数，在每个工作进程中设置要检测的特征"""
+    global _WORKER_PATTERNS
+    _WORKER_PATTERNS = [pattern for pattern in SUSPICIOUS_PATTERNS if pattern['id'] in pattern_ids]
+
+
+def scan_php_file_in_worker(file_path, max_size=None):
+    """在工作进程中扫描文件，特征来自进程初始化时的设置，不随每个任务传递"""
+    return scan_php_file(file_path, _WORKER_PATTERNS, max_size)
+
+
+def get_result_cache_key(patterns, max_size):
+    """Key cached results by scanner version, the selected patterns' ids and regexes, and the size limit."""
+    selection = [(pattern['id'], pattern['pattern']) for pattern in patterns]
+    # 记录的字段变化时旧缓存自动失效
+    digest = hashlib.sha1(json.dumps([SCANNER_VERSION, selection, max_size, Finding._fields]).encode('utf-8')).hexdigest()
+    return digest
+
+
+def open_result_cache(cache_path):
+    """打开扫描结果缓存，失败时返回None(不使用缓存)"""
+    try:
+        connection = sqlite3.connect(cache_path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS scan_results ('
+            'path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, pattern_key TEXT, result_json TEXT)')
+        return connection
+    except sqlite3.Error as e:
+        print(f"无法打开结果缓存 {cache_path}: {e}")
+        return None
+
+
+def iter_php_files(directory_path, excluded=frozenset()):
+    """逐个返回目录下PHP文件的DirEntry，顺序与os.walk相同(先当前目录的文件，再依次进入子目录)
     
-    for root, _, files in os.walk(directory_path):
-        for file in files:
-            if file.endswith('.php'):
-                file_path = os.path.join(root, file)
-                suspicious_lines = scan_php_file(file_path)
-                all_suspicious_lines.extend(suspicious_lines)
+    excluded中的目录名不会进入；与os.walk一样不进入指向目录的符号链接，无法读取的目录直接跳过
+    """
+    try:
+        with os.scandir(directory_path) as it:
+            entries = list(it)
+    except OSError:
+        return
     
-    return all_suspicious_lines
+    subdirs = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+        except OSError:
+            is_dir = False
+        if is_dir:
+            if entry.name not in excluded and not entry.is_symlink():
+                subdirs.append(entry.path)
+        elif entry.name.endswith('.php'):
+            yield entry
+    
+    for subdir in subdirs:
+        yield from iter_php_files(subdir, excluded)
+
+
+def scan_files(file_paths, patterns, jobs, max_size):
+    """Scan files and yield one findings list per file, in the given order.
+    
+    file_paths可以是生成器，并行扫描时边遍历目录边分发给工作进程
+    """
+    file_paths = iter(file_paths)
+    # 只有一个文件时不必启动进程池
+    head = list(islice(file_paths, 2))
+    if jobs <= 1 or len(head) <= 1:
+        for file_path in chain(head, file_paths):
+            yield scan_php_file(file_path, patterns, max_size)
+        return
+    
+    pattern_ids = [pattern['id'] for pattern in patterns]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_scan_worker, initargs=(pattern_ids,)) as executor:
+        scan = functools.partial(scan_php_file_in_worker, max_size=max_size)
+        yield from executor.map(scan, chain(head, file_paths), chunksize=32)
+
+
+def scan_directory(directory_path, patterns, jobs=None, max_size=None, exclude_dirs=DEFAULT_EXCLUDED_DIRS, cache=None):
+    """Recursively scan a directory for PHP files matching the given patterns.
+    
+    jobs为并行扫描的进程数，默认使用CPU核数；结果顺序与单进程扫描相同。
+    max_size为单个文件的最大字节数，为None时不限制；exclude_dirs中的目录名不会进入。
+    cache为open_result_cache()返回的连接，修改时间和大小都未变化的文件直接使用缓存的结果。
+    返回(疑似问题列表, 扫描的PHP文件数)
+    """
+    php_files = iter_php_files(directory_path, frozenset(exclude_dirs))
+    
+    jobs = jobs or os.cpu_count() or 1
+    if cache is None:
+        file_count = 0
+        
+        def file_paths():
+            # 在分发文件的同时计数，不必为统计文件数再遍历一次目录
+            nonlocal file_count
+            for entry in php_files:
+                file_count += 1
+                yield entry.path
+        
+        results = scan_files(file_paths(), patterns, jobs, max_size)
+        all_suspicious_lines = [finding for suspicious_lines in results for finding in suspicious_lines or ()]
+        return all_suspicious_lines, file_count
+    
+    pattern_key = get_result_cache_key(patterns, max_size)
+    cached = {path: (mtime, size, result_json) for path, mtime, size, result_json in cache.execute(
+        'SELECT path, mtime, size, result_json FROM scan_results WHERE pattern_key = ?', (pattern_key,))}
+    
+    file_paths = []
+    results = []
+    misses = []
+    for index, entry in enumerate(php_files):
+        file_path = entry.path
+        file_paths.append(file_path)
+        results.append(None)
+        try:
+            st = entry.stat()
+        except OSError:
+            misses.append((index, None, None))
+            continue
+        abs_path = os.path.abspath(file_path)
+        row = cached.get(abs_path)
+        if row is not None and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            # 缓存以绝对路径为键，结果中的路径与本次扫描的写法保持一致
+            results[index] = [Finding(file_path, *fields[1:]) for fields in json.loads(row[2])]
+        else:
+            misses.append((index, abs_path, st))
+    
+    scanned = scan_files([file_paths[index] for index, _, _ in misses], patterns, jobs, max_size)
+    rows = []
+    for (index, abs_path, st), suspicious_lines in zip(misses, scanned):
+        results[index] = suspicious_lines
+        # 扫描出错(None)的文件不缓存，下次重新扫描
+        if st is not None and suspicious_lines is not None:
+            rows.append((abs_path, st.st_mtime_ns, st.st_size, pattern_key, json.dumps(suspicious_lines)))
+    
+    try:
+        with cache:
+            cache.executemany('INSERT OR REPLACE INTO scan_results VALUES (?, ?, ?, ?, ?)', rows)
+    except sqlite3.Error as e:
+        print(f"无法更新结果缓存: {e}")
+    
+    return [finding for suspicious_lines in results for finding in suspicious_lines or ()], len(file_paths)
 
 
 def save_to_csv(suspicious_lines, output_file):
     """Save scan results to a CSV file."""
-    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+    # 大缓冲区减少写入次数，所有行交给writerows在C代码中逐行写出
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
         writer = csv.writer(f)
         writer.writerow(['序号', '疑似文件路径', '行号', '问题类型', '问题代码内容', '代码片段'])
-        
-        for i, item in enumerate(suspicious_lines, 1):
-            writer.writerow([
-                i,
-                item['file_path'],
-                item['line_number'],
-                item['issue_type'],
-                item['line_content'],
-                item['code_context']
-            ])
+        writer.writerows(
+            (i, *item[:5]) for i, item in enumerate(suspicious_lines, 1)
+        )
 
 
 def print_results(suspicious_lines):
@@ -286,12 +781,12 @@ def print_results(suspicious_lines):
     for i, item in enumerate(suspicious_lines, 1):
         print("{:<5} {:<50} {:<8} {:<25}".format(
             i, 
-            item['file_path'] if len(item['file_path']) <= 50 else f"...{item['file_path'][-47:]}", 
-            item['line_number'], 
-            item['issue_type']
+            item.file_path if len(item.file_path) <= 50 else f"...{item.file_path[-47:]}", 
+            item.line_number, 
+            item.issue_type
         ))
         print("\n代码片段:")
-        print(item['code_context'])
+        print(item.code_context)
         print("\n" + "-" * 90)
 
 
@@ -369,6 +864,15 @@ def main():
     parser.add_argument('-p', '--patterns', help='使用特定的特征ID（逗号分隔，例如 "1,3,5"）')
     parser.add_argument('--load', action='store_true', help='加载上次保存的特征选择')
     parser.add_argument('--non-interactive', action='store_true', help='非交互模式，使用默认特征')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='并行扫描的进程数 (默认: CPU核数)')
+    parser.add_argument('--max-size', type=float, default=DEFAULT_MAX_FILE_SIZE_MB,
+                        help=f'跳过超过该大小(MB)的文件 (默认: {DEFAULT_MAX_FILE_SIZE_MB})')
+    parser.add_argument('--deep', action='store_true', help='扫描所有文件，不限制文件大小')
+    parser.add_argument('--exclude-dir', action='append', default=[], help='额外跳过的目录名，可多次指定')
+    parser.add_argument('--include-vendor', action='store_true', help='同时扫描vendor和node_modules目录')
+    parser.add_argument('--cache', default=DEFAULT_RESULT_CACHE,
+                        help=f'扫描结果缓存文件，未变化的文件不再重复扫描 (默认: {DEFAULT_RESULT_CACHE})')
+    parser.add_argument('--no-cache', action='store_true', help='不使用扫描结果缓存')
     args = parser.parse_args()
     
     # 确定使用哪些检测特征
@@ -398,8 +902,17 @@ def main():
     print(f"开始扫描目录: {args.directory}")
     print(f"使用 {len(USER_SELECTED_PATTERNS)} 个特征进行检测")
     
-    suspicious_lines = scan_directory(args.directory)
-    print(f"扫描完成，共处理{sum(1 for _ in os.walk(args.directory) for f in _[2] if f.endswith('.php'))}个PHP文件")
+    max_size = None if args.deep else int(args.max_size * 1024 * 1024)
+    exclude_dirs = [name for name in DEFAULT_EXCLUDED_DIRS if not (args.include_vendor and name in VENDOR_DIRS)]
+    exclude_dirs += args.exclude_dir
+    cache = None if args.no_cache else open_result_cache(args.cache)
+    try:
+        suspicious_lines, file_count = scan_directory(args.directory, USER_SELECTED_PATTERNS, args.jobs, max_size,
+                                                      exclude_dirs, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+    print(f"扫描完成，共处理{file_count}个PHP文件")
     
     print_results(suspicious_lines)
     save_to_csv(suspicious_lines, args.output)
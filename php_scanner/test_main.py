@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+
+import main
+
+
+class OptionalEngineConsistencyTest(unittest.TestCase):
+    """hyperscan/RE2预筛选的结果必须与只用re时相同"""
+
+    def scan(self, file_path, pattern_ids, use_extensions=True):
+        saved = main.hyperscan, main.re2
+        if not use_extensions:
+            main.hyperscan = main.re2 = None
+        try:
+            patterns = [pattern for pattern in main.SUSPICIOUS_PATTERNS if pattern['id'] in pattern_ids]
+            return main.scan_php_file(file_path, patterns)
+        finally:
+            main.hyperscan, main.re2 = saved
+
+    def assert_same_findings(self, source, pattern_ids, expected):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'sample.php')
+            with open(file_path, 'w', encoding='utf-8', newline='') as f:
+                f.write(source)
+            with_extensions = self.scan(file_path, pattern_ids)
+            without_extensions = self.scan(file_path, pattern_ids, use_extensions=False)
+        self.assertEqual(len(without_extensions), expected)
+        self.assertEqual(with_extensions, without_extensions)
+
+    def test_information_separator_whitespace(self):
+        # Python的\s匹配\x1c-\x1f，hyperscan和RE2的\s不匹配
+        for char in '\x1c\x1d\x1e\x1f':
+            with self.subTest(char=hex(ord(char))):
+                self.assert_same_findings(f'<?php\neval{char}(base64_decode($a));\n', [1], 1)
+
+    def test_dotless_and_dotted_i(self):
+        # 忽略大小写时Python让i匹配ı和İ，hyperscan和RE2不会
+        for char in '\u0131\u0130':
+            with self.subTest(char=hex(ord(char))):
+                self.assert_same_findings(f'<?php\neval($_COOK{char}E["x"]);\n', [11], 1)
+
+
+class ResultCacheTest(unittest.TestCase):
+    """扫描出错的文件不能被缓存成“没有发现问题”"""
+
+    def test_failed_scan_is_not_cached(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = os.path.join(directory, 'sample.php')
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write('<?php\neval(base64_decode($a));\n')
+            patterns = main.SUSPICIOUS_PATTERNS
+            cache = main.open_result_cache(os.path.join(directory, 'cache.sqlite'))
+            try:
+                saved = main.read_php_source
+                main.read_php_source = lambda *args: 1 / 0
+                try:
+                    findings, _ = main.scan_directory(directory, patterns, jobs=1, cache=cache)
+                finally:
+                    main.read_php_source = saved
+                self.assertEqual(findings, [])
+                findings, _ = main.scan_directory(directory, patterns, jobs=1, cache=cache)
+                self.assertEqual(len([finding for finding in findings if finding.pattern_id == 1]), 1)
+            finally:
+                cache.close()
+
+
+if __name__ == '__main__':
+    unittest.main()